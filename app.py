@@ -2,578 +2,111 @@
 import streamlit as st
 import pandas as pd
 import time
-import random
-import re
 import io
-import zipfile
-from bs4 import BeautifulSoup
-from selenium import webdriver
-# from selenium.webdriver.chrome.service import Service # <-- Streamlit Cloud用に削除
-# from webdriver_manager.chrome import ChromeDriverManager # <-- Streamlit Cloud用に削除
-from selenium.webdriver.chrome.options import Options
-from urllib.parse import urljoin, quote_plus
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException, NoSuchElementException, InvalidSessionIdException
-import sys
-
-# --- ▼▼▼ 基本設定 ▼▼▼ ---
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
-]
-DECOY_URLS = ['https://www.yahoo.co.jp/', 'https://www.wikipedia.org/', 'https://www.nikkei.com/']
-
-COMPANY_LINK_XPATH = " | ".join([
-    "//a[contains(., '会社概要')]",
-    "//a[contains(., '企業情報')]",
-    "//a[contains(., '会社案内')]",
-    "//a[contains(., '私たちについて')]",
-    "//a[contains(@href, 'company')]",
-    "//a[contains(@href, 'about')]",
-    "//a[contains(@href, 'corporate')]",
-    "//a[contains(@href, 'profile')]",
-    "//a[contains(@href, 'gaiyou')]",
-])
-
-SUB_COMPANY_LINK_XPATH = " | ".join([
-    "//a[contains(., '概要')]",
-    "//a[contains(., '沿革')]",
-    "//a[contains(., '拠点')]",
-    "//a[contains(., '事業所')]",
-    "//a[contains(., 'アクセス')]",
-    "//a[contains(@href, 'outline')]",
-    "//a[contains(@href, 'access')]",
-    "//a[contains(@href, 'location')]",
-    "//a[contains(@href, 'base')]",
-])
-
-# --- プロキシ設定用関数 ---
-def create_proxy_extension(proxy_host, proxy_port, proxy_user, proxy_pass):
-    manifest_json = """{"version": "1.0.0","manifest_version": 2,"name": "Chrome Proxy","permissions": ["proxy","tabs","unlimitedStorage","storage","<all_urls>","webRequest","webRequestBlocking"],"background": {"scripts": ["background.js"]}}"""
-    background_js = f"""var config = {{mode: "fixed_servers",rules: {{singleProxy: {{scheme: "http",host: "{proxy_host}",port: parseInt({proxy_port})}},bypassList: ["localhost"]}}}};chrome.proxy.settings.set({{value: config, scope: "regular"}}, function() {{}});function callbackFn(details) {{return {{authCredentials: {{username: "{proxy_user}",password: "{proxy_pass}"}}}};}}chrome.webRequest.onAuthRequired.addListener(callbackFn,{{urls: ["<all_urls>"]}},['blocking']);"""
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zf:
-        zf.writestr("manifest.json", manifest_json)
-        zf.writestr("background.js", background_js)
-    return zip_buffer.getvalue()
-
-# --- ★★★ 電話番号抽出関連関数 ★★★ ---
-def extract_phone_number(soup, area_codes_set, sorted_area_codes):
-    """HTML(soup)から電話番号を抽出"""
-    try:
-        def validate_and_add_internal(phone_digits, phones_list):
-            if not phone_digits or (phone_digits in phones_list): return False
-            if phone_digits.startswith(('0120', '0800')): return False
-            if phone_digits.startswith(('050', '070', '080', '090')):
-                phones_list.append(phone_digits); return True
-            is_valid_area_code = False
-            for code in sorted_area_codes:
-                if phone_digits.startswith(code): is_valid_area_code = True; break
-            if is_valid_area_code: phones_list.append(phone_digits); return True
-            return False
-
-        for tag in soup(['script', 'style', 'header', 'nav', 'aside']):
-            tag.decompose()
-        full_text = soup.get_text()
-        translation_table = str.maketrans('０１２３４５６７８９（）－‐　', '0123456789()-- ')
-        normalized_text = full_text.translate(translation_table)
-        found_phones = []
-
-        pattern1 = r'(?:TEL|電話番号|電話)\s*[.:：]?\s*(0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4})'
-        matches1 = re.finditer(pattern1, normalized_text, re.IGNORECASE)
-        for m in matches1:
-            phone_digits = re.sub(r'[^0-9]', '', m.group(1))
-            if len(phone_digits) == 10 or len(phone_digits) == 11:
-                validate_and_add_internal(phone_digits, found_phones)
-
-        pattern2 = r'0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4}'
-        matches2 = re.findall(pattern2, normalized_text)
-        for candidate in matches2:
-            phone_digits = re.sub(r'[^0-9]', '', candidate)
-            if len(phone_digits) == 10 or len(phone_digits) == 11:
-                validate_and_add_internal(phone_digits, found_phones)
-
-        pattern3 = r'(?<!\d)(0\d{9,10})(?!\d)'
-        matches3 = set(re.findall(pattern3, normalized_text))
-        for phone_digits in matches3:
-            validate_and_add_internal(phone_digits, found_phones)
-
-        if found_phones:
-            mobile_phones = [p for p in found_phones if p.startswith(('070', '080', '090'))]
-            if mobile_phones: return mobile_phones[0]
-            else: return found_phones[0]
-        return None
-    except Exception as e:
-        print(f"電話番号抽出中にエラー: {e}"); return None
-
-# --- ★★★ Yahoo検索(検索結果ページ)から電話番号を探す関数 ★★★ ---
-def search_yahoo_search_phone(driver, facility_name, address, status_container):
-    """Yahoo検索結果ページから施設名と住所で電話番号を探す"""
-    phone_number = 'N/A'
-    if not facility_name or facility_name.lower() in ['n/a', 'アクセスエラー', '抽出エラー', 'nan', ''] or \
-       not address or address.lower() in ['n/a', 'アクセスエラー', '抽出エラー', 'nan', '']:
-        status_container.info(f" -> 屋号/住所が無効なためYahoo検索(ダイレクト)スキップ。(屋号: {facility_name}, 住所: {address})")
-        return phone_number
-
-    clean_facility_name = re.sub(r'【.*?】|\(.*?\)|（.*?）|の.*?求人.*', '', facility_name).strip()
-    if not clean_facility_name:
-        clean_facility_name = facility_name
-
-    search_query = f'"{clean_facility_name}" "{address}"'
-    status_container.info(f" -> Yahoo検索(ダイレクト)開始: '{search_query}'")
-
-    try:
-        search_url = f"https://search.yahoo.co.jp/search?p={quote_plus(search_query)}"
-        status_container.info(f" -> Yahoo検索ページに移動します: {search_url}")
-        driver.set_page_load_timeout(30)
-        driver.get(search_url)
-        time.sleep(random.uniform(1.0, 2.0))
-
-        phone_xpath = "//span[contains(@class, 'AnswerLocalSpot__subInfoSpotDetail') and text()='電話：']/following-sibling::span[1]"
-
-        try:
-            status_container.info(f" -> 電話番号要素 ({phone_xpath}) を検索...")
-            phone_element = driver.find_element(By.XPATH, phone_xpath)
-            phone_text = phone_element.text.strip()
-
-            if phone_text and re.fullmatch(r'[\d-]+', phone_text):
-                phone_number = phone_text
-                status_container.success(f" ----> 電話番号候補 (Yahoo検索結果): {phone_number}")
-            else:
-                status_container.warning(f" ----> 電話番号要素のテキストが不正または空: '{phone_text}'")
-
-        except NoSuchElementException:
-            status_container.warning(f" ----> 電話番号要素 ({phone_xpath}) が見つかりませんでした。")
-        except Exception as e_phone:
-            status_container.error(f" ----> 電話番号抽出(Yahoo検索結果)エラー: {e_phone}")
-
-    except InvalidSessionIdException as e_sid:
-        status_container.error(f" -> Yahoo検索中にセッション無効: {e_sid}"); raise
-    except TimeoutException:
-        status_container.warning(f" -> Yahoo検索ページ ({search_url}) の読み込みタイムアウト。")
-    except Exception as e:
-        status_container.error(f" -> Yahoo検索中に予期せぬエラー: {e}")
-
-    return phone_number
-
-# --- ★★★ (従来の)Yahoo検索(検索結果一覧)で電話番号を探す関数 ★★★ ---
-def search_yahoo_for_phone(query, driver, area_codes_set, sorted_area_codes, status_container):
-    """(従来)Yahoo検索結果一覧から電話番号を抽出する"""
-    try:
-        status_container.info(f"(予備) Yahoo検索(一覧)を実行: {query}")
-        search_url = f"https://search.yahoo.co.jp/search?p={quote_plus(query)}"
-        driver.set_page_load_timeout(30)
-        driver.get(search_url)
-        time.sleep(random.uniform(2.0, 3.0))
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        result_blocks = soup.select('div.sw-CardBase, div.Algo, section.Algo')
-
-        found_phones_yahoo = []
-
-        def validate_and_add_yahoo(phone_digits, phones_list):
-            if not phone_digits or (phone_digits in phones_list): return False
-            if phone_digits.startswith(('0120', '0800')): return False
-            if phone_digits.startswith(('050', '070', '080', '090')):
-                phones_list.append(phone_digits); return True
-            is_valid_area_code = False
-            for code in sorted_area_codes:
-                if phone_digits.startswith(code): is_valid_area_code = True; break
-            if is_valid_area_code: phones_list.append(phone_digits); return True
-            return False
-
-        for block in result_blocks[:5]:
-            block_text = block.get_text()
-            translation_table = str.maketrans('０１２３４５６７８９（）－‐S', '0123456789()-- ')
-            normalized_text = block_text.translate(translation_table)
-
-            pattern1 = r'(?:電話番号|電話|TEL)\s*[.:：]?\s*(0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4})'
-            matches1 = re.finditer(pattern1, normalized_text, re.IGNORECASE)
-            for m in matches1:
-                phone_digits = re.sub(r'[^0-9]', '', m.group(1))
-                if len(phone_digits) == 10 or len(phone_digits) == 11:
-                    validate_and_add_yahoo(phone_digits, found_phones_yahoo)
-
-            pattern2 = r'0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4}'
-            matches2 = re.findall(pattern2, normalized_text)
-            for candidate in matches2:
-                phone_digits = re.sub(r'[^0-9]', '', candidate)
-                if len(phone_digits) == 10 or len(phone_digits) == 11:
-                    validate_and_add_yahoo(phone_digits, found_phones_yahoo)
-
-            pattern3 = r'(?<!\d)(0\d{9,10})(?!\d)'
-            matches3 = set(re.findall(pattern3, normalized_text))
-            for phone_digits in matches3:
-                    validate_and_add_yahoo(phone_digits, found_phones_yahoo)
-
-            if found_phones_yahoo:
-                break
-
-        if found_phones_yahoo:
-            mobile_phones = [p for p in found_phones_yahoo if p.startswith(('070', '080', '090'))]
-            if mobile_phones: return mobile_phones[0]
-            else: return found_phones_yahoo[0]
-
-        return None
-
-    except (TimeoutException, WebDriverException) as e:
-        status_container.warning(f"(予備) Yahoo検索(一覧)中にタイムアウトまたはエラー: {e}")
-        return None
-    except InvalidSessionIdException as e_sid:
-        status_container.error(f" -> Yahoo検索(一覧)中にセッション無効: {e_sid}"); raise
-    except Exception as e:
-        status_container.error(f"(予備) Yahoo検索(一覧)中に予期せぬエラー: {e}")
-        return None
-
-# --- ★★★ (新) ブラウザ起動関数 ★★★ ---
-# 元の処理からブラウザ起動ロジックを分離
-def initialize_driver(status_container, proxy_settings, disable_headless):
-    """WebDriverインスタンスを初期化して返す"""
-    try:
-        status_container.info("ブラウザを起動しています...");
-        options = Options()
-        options.add_argument(f'user-agent={random.choice(USER_AGENTS)}')
-        options.add_argument('--blink-settings=imagesEnabled=false')
-        options.add_argument(f'--window-size=1920,1980')
-        options.add_argument('--disable-gpu'); options.add_argument('--lang=ja-JP,ja;q=0.9')
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"]); options.add_experimental_option('useAutomationExtension', False)
-
-        proxy_values = {k: v for k, v in proxy_settings.items() if v}
-        if all(k in proxy_values for k in ['proxy_host', 'proxy_port', 'proxy_user', 'proxy_pass']):
-            try:
-                options.add_extension(io.BytesIO(create_proxy_extension(**proxy_values)))
-                status_container.info("プロキシ設定を適用しました。")
-            except Exception as e:
-                st.error(f"プロキシ設定エラー: {e}")
-
-        # --- Streamlit Cloud デプロイ用設定 ---
-        options.add_argument('--headless=new') # ヘッドレスモードを強制
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-
-        if not disable_headless:
-            st.info("（デプロイ環境ではヘッドレスモードが強制されます）")
-        
-        # システムパスの driver を使う
-        driver = webdriver.Chrome(options=options)
-        driver.set_page_load_timeout(30)
-        status_container.success("ブラウザの起動が完了しました。")
-        return driver
-    
-    except Exception as e_setup:
-        st.error(f"WebDriverの起動に失敗しました: {e_setup}")
-        return None
-
-
-# --- ★★★ メイン処理: run_scraping_process (バッチ処理対応版) ★★★ ---
-def run_scraping_process(df, status_container, proxy_settings, disable_headless, area_codes_set):
-
-    phone_column_name = '電話番号'
-    hp_column_name = 'HP'
-    company_name_cols = ['屋号']
-    address_cols = ['住所', '所在地']
-
-    actual_company_col = next((col for col in company_name_cols if col in df.columns), None)
-    actual_address_col = next((col for col in address_cols if col in df.columns), None)
-
-    if phone_column_name not in df.columns:
-         st.error(f"エラー: CSVに '{phone_column_name}' 列が見つかりません。")
-         yield 1.0, "列名エラー(電話番号)", df
-         return
-    
-    sleep_times = {"visit": (1.5, 2.5), "decoy": (1, 2), "loop": (1, 2)}
-    
-    # ▼▼▼ バッチ処理（メモリ対策）設定 ▼▼▼
-    # BATCH_SIZE件処理するごとにブラウザを再起動する
-    # (調整可能: 30〜100程度で試してください)
-    BATCH_SIZE = 50 
-    # ▲▲▲ ここまで追加 ▲▲▲
-    
-    driver = None # driver変数を初期化
-
-    target_indices = df[
-        (df[phone_column_name].isnull() | (df[phone_column_name] == ''))
-    ].index
-
-    total_jobs = len(target_indices)
-    if total_jobs == 0:
-        st.warning(f"処理対象（'{phone_column_name}'が空の行）が0件です。")
-        yield 1.0, "処理対象なし", df
-        return
-
-    sorted_area_codes = sorted(area_codes_set, key=len, reverse=True)
-    df_copy = df.copy()
-    processed_count = 0
-    processed_in_batch = 0 # バッチ内で何件処理したか
-
-    try:
-        # 最初に一度だけブラウザを起動
-        driver = initialize_driver(status_container, proxy_settings, disable_headless)
-        if driver is None:
-            yield 1.0, "ブラウザ起動エラー", df
-            return
-
-        # target_indices のリストに対してループ
-        for index in target_indices:
-            processed_count += 1
-            processed_in_batch += 1
-            progress_rate = processed_count / total_jobs
-            yield progress_rate, f"{processed_count}/{total_jobs}件目 処理中", None
-
-            # --- ▼▼▼ メモリ対策：バッチサイズに達したらブラウザを再起動 ▼▼▼ ---
-            if processed_in_batch > BATCH_SIZE:
-                status_container.warning(f"--- {BATCH_SIZE}件処理完了。メモリ解放のためブラウザを再起動します ---")
-                if driver:
-                    driver.quit()
-                    driver = None
-                    time.sleep(3) # 安定化のため待機
-                
-                driver = initialize_driver(status_container, proxy_settings, disable_headless)
-                if driver is None:
-                    st.error("ブラウザの再起動に失敗しました。処理を中断します。")
-                    yield progress_rate, "ブラウザ再起動エラー", df_copy # 途中までの結果を返す
-                    return
-                
-                processed_in_batch = 1 # カウンターをリセット
-                status_container.success("--- ブラウザを再起動しました。処理を再開します ---")
-            # --- ▲▲▲ メモリ対策ここまで ▲▲▲ ---
-
-
-            row = df_copy.loc[index]
-            company_hp_url = str(row.get(hp_column_name, '')).strip()
-            
-            company_name_raw = row.get(actual_company_col) if actual_company_col else None
-            address_raw = row.get(actual_address_col) if actual_address_col else None
-            
-            company_name = str(company_name_raw).strip() if pd.notna(company_name_raw) and str(company_name_raw).strip() else ""
-            address = str(address_raw).strip() if pd.notna(address_raw) and str(address_raw).strip() else ""
-            
-            yahoo_search_possible_for_this_row = bool(company_name) and bool(address) 
-            if not yahoo_search_possible_for_this_row:
-                 status_container.info(f" -> 屋号/住所が空欄または無効なため、Yahoo検索はスキップします。 (屋号: '{company_name}', 住所: '{address}')")
-
-            found_phone = None
-            current_search_step = ""
-
-            try:
-                # --- HP URLがある場合のみサイト訪問 ---
-                if company_hp_url and company_hp_url.startswith('http'):
-                    current_search_step = "HP"
-                    status_container.info(f"アクセス中: {company_hp_url}")
-                    try:
-                        driver.set_page_load_timeout(30)
-                        driver.get(company_hp_url)
-                        time.sleep(3)
-                        soup = BeautifulSoup(driver.page_source, 'html.parser')
-                        found_phone = extract_phone_number(soup, area_codes_set, sorted_area_codes)
-                        if found_phone: status_container.success(f"HPトップで番号抽出成功: {found_phone}")
-                    except (TimeoutException, WebDriverException) as e:
-                        status_container.warning(f"ページロードエラー({current_search_step})。下層ページ検索へ移行: {e}")
-                        found_phone = None
-                    # InvalidSessionIdException は外側の try...except でキャッチ
-
-                    # --- 概要ページ1 ---
-                    if not found_phone:
-                        status_container.info("トップページに番号なし。概要ページを探します...")
-                        overview_url_l1 = None
-                        base_url = driver.current_url if driver.current_url else company_hp_url
-
-                        try:
-                            wait = WebDriverWait(driver, 7)
-                            link_element = wait.until(EC.presence_of_element_located((By.XPATH, f"({COMPANY_LINK_XPATH})[1]")))
-                            link_href = link_element.get_attribute('href')
-                            if link_href and not link_href.startswith(('javascript:', 'tel:', 'mailto:')) and '#' not in link_href.split('/')[-1]:
-                                overview_url_l1 = urljoin(base_url, link_href)
-                                base_domain_match = re.search(r"https://?([^/]+)", base_url)
-                                if base_domain_match:
-                                    base_domain = base_domain_match.group(1)
-                                    if base_domain not in overview_url_l1: overview_url_l1 = None
-                                    else: status_container.success(f"概要ページを発見！ -> {overview_url_l1}")
-                                else: overview_url_l1 = None
-                            else: overview_url_l1 = None
-                        except Exception: pass
-
-                        if overview_url_l1:
-                            current_search_step = "概要1"
-                            status_container.info(f"アクセス中: {overview_url_l1}")
-                            try:
-                                driver.set_page_load_timeout(30)
-                                driver.get(overview_url_l1)
-                                time.sleep(3)
-                                soup_l1 = BeautifulSoup(driver.page_source, 'html.parser')
-                                found_phone = extract_phone_number(soup_l1, area_codes_set, sorted_area_codes)
-                                if found_phone: status_container.success(f"概要1で番号抽出成功: {found_phone}")
-                            except (TimeoutException, WebDriverException) as e:
-                                status_container.warning(f"ページロードエラー({current_search_step})。下層ページ検索へ移行: {e}")
-                                found_phone = None
-                            # InvalidSessionIdException は外側の try...except でキャッチ
-
-                            # --- 概要ページ2 ---
-                            if not found_phone:
-                                status_container.info("概要1に番号なし。さらに詳細ページを探します...")
-                                overview_url_l2 = None
-                                base_url_l1 = driver.current_url if driver.current_url else overview_url_l1
-                                current_url_no_hash = overview_url_l1.split('#')[0] if overview_url_l1 else ""
-
-                                try:
-                                    wait = WebDriverWait(driver, 3)
-                                    link_element = wait.until(EC.presence_of_element_located((By.XPATH, f"({SUB_COMPANY_LINK_XPATH})[1]")))
-                                    link_href = link_element.get_attribute('href')
-                                    if link_href and not link_href.startswith(('javascript:', 'tel:', 'mailto:')) and '#' not in link_href.split('/')[-1]:
-                                        overview_url_l2_candidate = urljoin(base_url_l1, link_href)
-                                        if overview_url_l2_candidate.split('#')[0] != current_url_no_hash:
-                                            overview_url_l2 = overview_url_l2_candidate
-                                            base_domain_match_l1 = re.search(r"https://?([^/]+)", base_url)
-                                            if base_domain_match_l1:
-                                                base_domain = base_domain_match_l1.group(1)
-                                                if base_domain not in overview_url_l2: overview_url_l2 = None
-                                                else: status_container.success(f"詳細ページを発見！ -> {overview_url_l2}")
-                                            else: overview_url_l2 = None
-                                        else: overview_url_l2 = None
-                                    else: overview_url_l2 = None
-                                except Exception: pass
-
-                                if overview_url_l2:
-                                    current_search_step = "概要2"
-                                    status_container.info(f"アクセス中: {overview_url_l2}")
-                                    try:
-                                        driver.set_page_load_timeout(30)
-                                        driver.get(overview_url_l2)
-                                        time.sleep(3)
-                                        soup_l2 = BeautifulSoup(driver.page_source, 'html.parser')
-                                        found_phone = extract_phone_number(soup_l2, area_codes_set, sorted_area_codes)
-                                        if found_phone: status_container.success(f"概要2で番号抽出成功: {found_phone}")
-                                    except (TimeoutException, WebDriverException) as e:
-                                        status_container.warning(f"ページロードエラー({current_search_step})。Yahoo検索へ移行: {e}")
-                                        found_phone = None
-                                    # InvalidSessionIdException は外側の try...except でキャッチ
-                else:
-                    status_container.info("「HP」のURLが無効または空です。Yahoo検索を試みます。")
-
-                # --- Yahoo検索 (HPで見つからない or HPがない場合) ---
-                if not found_phone:
-                    if yahoo_search_possible_for_this_row:
-                        status_container.info("企業HPから番号が見つからなかったか「HP」がありません。Yahoo検索(ダイレクト)で補完します...")
-                        found_phone_direct = search_yahoo_search_phone(driver, company_name, address, status_container)
-                        if found_phone_direct and found_phone_direct != 'N/A':
-                            found_phone = found_phone_direct
-                            status_container.success(f"Yahoo検索(ダイレクト)で番号抽出成功: {found_phone}")
-                        else:
-                            found_phone = None
-                    else:
-                        status_container.warning("会社名(屋号)/住所が無効なため、Yahoo検索(ダイレクト)はスキップします。")
-
-                if not found_phone:
-                    if yahoo_search_possible_for_this_row:
-                        status_container.info("Yahoo検索(ダイレクト)でも見つかりません。(予備)Yahoo検索(一覧)で補完します...")
-                        search_company_name = re.sub(r'[（\(][株有合][）\)]', '', company_name).strip()
-                        address_match = re.match(r'(東京都|北海道|(?:京都|大阪)府|.{2,3}県)([^市]+市|[^区]+区|[^郡]+郡[^町]+町|[^郡]+郡[^村]+村|[^町]+町|[^村]+村)', address)
-                        search_address = address_match.group(0) if address_match else address
-                        query = f'"{search_company_name}" "{search_address}" 電話番号'
-                        found_phone_list = search_yahoo_for_phone(query, driver, area_codes_set, sorted_area_codes, status_container)
-                        if found_phone_list:
-                            found_phone = found_phone_list
-                            status_container.success(f"(予備)Yahoo検索(一覧)で電話番号を抽出: {found_phone}")
-                        else:
-                            status_container.warning("(予備)Yahoo検索(一覧)でも電話番号は見つかりませんでした。")
-                    else:
-                        status_container.warning("会社名(屋号)/住所が無効なため、(予備)Yahoo検索(一覧)はスキップします。")
-                
-                # --- 抽出結果の記録 ---
-                if found_phone:
-                    df_copy.loc[index, phone_column_name] = found_phone
-                else:
-                    df_copy.loc[index, phone_column_name] = '見つかりません'
-
-            except InvalidSessionIdException as e_sid:
-                # --- ▼▼▼ (修正) セッションエラー時の再起動処理 ▼▼▼ ---
-                st.error(f"処理中にセッションが無効になりました: {e_sid}")
-                st.warning("ブラウザを再起動して次の処理を試みます。")
-                
-                if driver:
-                    driver.quit()
-                    driver = None
-                    time.sleep(3)
-                
-                driver = initialize_driver(status_container, proxy_settings, disable_headless)
-                if driver is None:
-                    st.error("ブラウザの再起動に失敗しました。処理を中断します。")
-                    yield progress_rate, "セッションエラー(再起動失敗)", df_copy
-                    return # 関数を終了
-                
-                df_copy.loc[index, phone_column_name] = 'エラー(セッション)'
-                processed_in_batch = 1 # カウンターリセット
-                # --- ▲▲▲ (修正) ここまで ▲▲▲ ---
-
-            except Exception as e:
-                st.error(f"URL処理({current_search_step})中に予期せぬエラー ({company_hp_url}): {e}")
-                df_copy.loc[index, phone_column_name] = f'エラー({current_search_step})'
-
-                # --- ▼▼▼ (追加) WebDriver関連エラーでも再起動を試みる ▼▼▼ ---
-                if "driver" in str(e).lower() or isinstance(e, WebDriverException):
-                    st.warning("WebDriverエラー検出。ブラウザを再起動します。")
-                    try:
-                        if driver:
-                            driver.quit()
-                            driver = None
-                            time.sleep(3)
-                        driver = initialize_driver(status_container, proxy_settings, disable_headless)
-                        if driver is None:
-                            st.error("ブラウザの再起動に失敗しました。処理を中断します。")
-                            yield progress_rate, "WebDriverエラー(再起動失敗)", df_copy
-                            return # 関数を終了
-                        processed_in_batch = 1 # カウンターリセット
-                    except Exception as e_restart:
-                        st.error(f"再起動中に致命的エラー: {e_restart}。処理を中断します。")
-                        yield progress_rate, "WebDriverエラー(再起動失敗)", df_copy
-                        return # 関数を終了
-                # --- ▲▲▲ (追加) ここまで ▲▲▲ ---
-
-
-            # --- (デコイ処理) ---
-            if processed_count % 5 == 0 and processed_count > 0:
-                try:
-                    decoy_url = random.choice(DECOY_URLS)
-                    status_container.info(f"パターン偽装のため、無関係なサイトにアクセスします: {decoy_url}")
-                    try:
-                        driver.set_page_load_timeout(15)
-                        driver.get(decoy_url)
-                        time.sleep(random.uniform(*sleep_times["decoy"]))
-                    except (TimeoutException, WebDriverException) as e:
-                        status_container.warning(f"デコイアクセスでエラー（タイムアウト等）: {e}")
-                    # InvalidSessionIdException は外側の try...except でキャッチ
-                    except Exception as e_decoy:
-                        status_container.warning(f"デコイアクセスで予期せぬエラー: {e_decoy}")
-                except Exception as e_outer:
-                    status_container.warning(f"デコイ処理全体でエラー: {e_outer}")
-
-
-            time.sleep(random.uniform(*sleep_times["loop"]))
-        
-        # --- ループ正常終了 ---
-        yield 1.0, "完了！", df_copy
-
-    except Exception as e_main:
-        # メインループの外側での予期せぬエラー
-        st.error(f"処理全体で致命的なエラーが発生しました: {e_main}")
-        yield 1.0, "致命的エラー", df_copy # 途中までの結果を返す
-        
-    finally:
-        if driver:
-            driver.quit()
-            status_container.info("最終処理完了。ブラウザを終了しました。")
-
-
-# --- ▼▼▼ Streamlit UI部分 (変更なし) ▼▼▼ ---
+import os
+from html_text import available_backends
+from page_cache import PageCache
+from checkpoint import RunCheckpoint, file_digest
+from resource_policy import (
+    ResourcePolicy, RESOURCE_TYPE_LABELS, DEFAULT_BLOCKED_TYPES, THIRD_PARTY_BLOCKED_HOSTS, PAGE_LOAD_STRATEGIES,
+)
+from driver_pool import RecyclePolicy, WarmDriverPool, DEFAULT_MAX_BROWSER_RSS_MB, DEFAULT_MAX_PAGES_PER_DRIVER
+from stage_metrics import StageMetrics
+from log_view import RingBufferLog
+from parse_pool import default_parse_workers, MAX_DEFAULT_PARSE_WORKERS
+from stage_scheduler import StageScheduler, SCHEDULE_POLICIES, SCHEDULE_POLICY_LABELS, DEFAULT_SCHEDULE_POLICY
+from job_queue import DEFAULT_QUEUE_PATH, open_job_queue
+from phone_extractor import AreaCodeIndex
+from time_budget import DEFAULT_ROW_BUDGET_SECONDS, ROW_TIMEOUT_VALUE, Deadline
+from cli import deadline_options, queue_worker_metrics_path, spawn_queue_workers
+from scraper_engine import (
+    DEFAULT_WORKER_COUNT, MAX_WORKER_COUNT, MAX_CONCURRENT_PER_HOST, PAGE_CACHE_PATH, CHECKPOINT_PATH, STAGE_METRICS_PATH, STAGE_ESTIMATES_PATH,
+    AREA_CODE_CSV_PATH,
+    load_area_codes, read_input_table, run_scraping_process, run_queue_coordinator,
+)
+# 処理本体は scraper_engine.py (コマンドラインからは cli.py で実行できる)
+
+STAGE_TABLE_INTERVAL = 2.0 # ステージ別の計測表を更新する間隔 (秒)
+PROGRESS_INTERVAL = 0.25 # 進捗バー・予想処理時間を更新する最短間隔 (秒)
+RUN_LOG_DIR = "logs" # 詳細ログの全件の出力先 (実行ごとに1ファイル)
+
+
+# --- 再実行 (ボタンのクリック等) の間で共有するもの ---
+@st.cache_resource(show_spinner=False)
+def cached_area_code_index(path, modified_at):
+    """市外局番リストの (AreaCodeIndex, 読み込んだ文字コード)。ファイルの更新時刻 modified_at が変わるまで読み込み直さない"""
+    area_codes_set, encoding = load_area_codes(path)
+    return AreaCodeIndex(area_codes_set), encoding
+
+
+@st.cache_resource(show_spinner=False)
+def shared_warm_driver_pool():
+    """実行の終わったブラウザを起動したまま預かり、次の実行で使う (全セッションで共有する)"""
+    return WarmDriverPool()
+
+# --- ▼▼▼ Streamlit UI部分 ▼▼▼ ---
 st.set_page_config(page_title="電話番号 補完アプリ", layout="centered")
 st.title('🤖 電話番号 自動補完アプリ')
 st.markdown("CSVまたはExcelの「HP」「屋号」「住所/所在地」を元に、空欄の「電話番号」列を自動で補完します。")
 st.sidebar.title("⚙️ 動作設定")
 disable_headless = st.sidebar.checkbox("ヘッドレスモードを無効化（デバッグ用）")
+use_http_fetch = st.sidebar.checkbox("軽量HTTP取得を先に試す（推奨）", value=True,
+                                     help="静的なHTMLのページはブラウザを使わずに取得します。JavaScriptで描画されるページのみブラウザで読み込みます。")
+html_backend_name = st.sidebar.selectbox("HTML解析エンジン", available_backends(),
+                                         help="lexbor (selectolax) / lxml が未インストールの場合は BeautifulSoup を使用します。")
+parse_workers = st.sidebar.number_input("HTML解析のプロセス数", min_value=0, max_value=MAX_DEFAULT_PARSE_WORKERS * 2, value=default_parse_workers(), step=1,
+                                        help="ページの解析と電話番号の抽出を別プロセスで行い、ブラウザの操作と並行して処理します。0 で使いません。")
+use_sitemap = st.sidebar.checkbox("サイトマップから会社概要ページを探す", value=True,
+                                  help="ドメインごとに robots.txt / sitemap.xml を1回だけ読み、会社概要ページを直接候補にします。")
+schedule_policy = st.sidebar.selectbox("検索ステージの実行順", SCHEDULE_POLICIES, index=SCHEDULE_POLICIES.index(DEFAULT_SCHEDULE_POLICY),
+                                       format_func=SCHEDULE_POLICY_LABELS.get,
+                                       help=f"ステージごとの所要時間と発見率を {STAGE_ESTIMATES_PATH} に記録し、番号が早く見つかる見込みの順に検索します。")
+with st.sidebar.expander("ページキャッシュ", expanded=False):
+    use_page_cache = st.checkbox("取得したページをキャッシュする", value=True,
+                                 help=f"HP・概要ページ・Yahoo検索ページを {PAGE_CACHE_PATH} に保存し、再実行時に再取得しません。")
+    cache_ttl_days = st.number_input("有効期限（日）", min_value=1, max_value=365, value=7, step=1)
+    cache_max_mb = st.number_input("最大サイズ（MB）", min_value=10, max_value=10000, value=500, step=10)
+    offline_mode = st.checkbox("オフライン再抽出モード（キャッシュのみ使用）",
+                               help="ネットワークにアクセスせず、キャッシュ済みのページから抽出をやり直します。有効期限切れのページも使用します。")
+    if st.button("キャッシュを削除"):
+        PageCache(PAGE_CACHE_PATH).clear()
+        st.success("ページキャッシュを削除しました。")
+with st.sidebar.expander("リソース制限（ブラウザ高速化）", expanded=False):
+    blocked_types = st.multiselect("読み込まないリソース", list(RESOURCE_TYPE_LABELS), default=list(DEFAULT_BLOCKED_TYPES),
+                                   format_func=RESOURCE_TYPE_LABELS.get)
+    block_third_party = st.checkbox("広告・アクセス解析などの外部スクリプトをブロック", value=True)
+    page_load_strategy = st.selectbox("ページ読み込み完了の判定", PAGE_LOAD_STRATEGIES,
+                                      help="eager: HTMLの解析が終わった時点で次の処理に進みます (画像等の読み込みを待たない)。normal: 従来どおり全て読み込むまで待ちます。")
+resource_policy = ResourcePolicy(blocked_types, THIRD_PARTY_BLOCKED_HOSTS if block_third_party else (), page_load_strategy)
+with st.sidebar.expander("ブラウザの入れ替え（メモリ対策）", expanded=False):
+    max_browser_mb = st.number_input("メモリ使用量の上限（MB / ブラウザ1台）", min_value=256, max_value=16384, value=DEFAULT_MAX_BROWSER_RSS_MB, step=128,
+                                     help="Chrome の全プロセスの合計メモリ使用量がこの値を超えたらブラウザを入れ替えます。")
+    max_pages_per_browser = st.number_input("ページ数の上限（ブラウザ1台）", min_value=10, max_value=10000, value=DEFAULT_MAX_PAGES_PER_DRIVER, step=10)
+    use_standby_browser = st.checkbox("入れ替え用のブラウザを裏で起動しておく", value=True,
+                                      help="入れ替え時の起動待ちがなくなります。ブラウザ1台分のメモリを余分に使用します。")
+    keep_browsers_warm = st.checkbox("実行後もブラウザを起動したままにする", value=True,
+                                     help="次の実行でブラウザの起動待ちがなくなります。使われないまま10分経ったブラウザは終了します。")
+recycle_policy = RecyclePolicy(max_browser_mb, max_pages_per_browser, use_standby_browser)
+warm_driver_pool = shared_warm_driver_pool() if keep_browsers_warm else None
+if warm_driver_pool is None:
+    shared_warm_driver_pool().clear() # 起動したままのブラウザがあれば終了する
+resume_from_checkpoint = st.sidebar.checkbox("中断した処理を続きから再開する", value=True,
+                                             help=f"処理結果を1行ずつ {CHECKPOINT_PATH} に記録し、同じファイルを再度アップロードした場合は未処理の行から再開します。")
+worker_count = st.sidebar.number_input("同時に動かすブラウザ数", min_value=1, max_value=MAX_WORKER_COUNT, value=DEFAULT_WORKER_COUNT, step=1,
+                                       help=f"ブラウザ1台につき数百MBのメモリを使用します。同一サイトへの同時アクセスは最大{MAX_CONCURRENT_PER_HOST}件に制限されます。")
+with st.sidebar.expander("処理時間の上限", expanded=False):
+    row_budget_seconds = st.number_input("1件あたりの上限（秒）", min_value=0, max_value=600, value=DEFAULT_ROW_BUDGET_SECONDS, step=10,
+                                         help=f"HP・概要ページ・Yahoo検索の各段階に配分し、超えた行は残りの検索を打ち切って「{ROW_TIMEOUT_VALUE}」と記録します。0 で無制限。")
+    run_deadline_minutes = st.number_input("全体の締め切り（分）", min_value=0, max_value=24 * 60, value=0, step=10,
+                                           help="処理開始から指定時間が過ぎたら、それまでの結果で終了します (未処理の行は空欄のまま。再開できます)。0 で無制限。")
+with st.sidebar.expander("分散処理（複数プロセス・複数マシン）", expanded=False):
+    use_job_queue = st.checkbox("ジョブキューで分担して処理する",
+                                help="空欄の行を作業単位に分けてジョブキューに登録し、ワーカーのプロセスが分担して処理します。応答のなくなったワーカーの分は他のワーカーに割り当て直します。")
+    queue_url = st.text_input("ジョブキュー", value=DEFAULT_QUEUE_PATH,
+                              help="SQLite のファイルパス (同じマシン / 共有ディスク) または redis://ホスト:ポート/DB番号 (複数マシン)")
+    queue_worker_processes = st.number_input("このマシンで起動するワーカー数", min_value=0, max_value=8, value=2, step=1,
+                                             help="ワーカー1つにつき「同時に動かすブラウザ数」のブラウザを起動します。0 の場合は他のマシンのワーカー "
+                                                  "(python cli.py --queue-worker --queue <ジョブキュー> --job <ジョブID>) の結果を待ちます。")
 with st.sidebar.expander("プロキシ設定（上級者向け）", expanded=False):
     proxy_settings = {
         "proxy_host": st.text_input("ホスト"),
@@ -582,35 +115,26 @@ with st.sidebar.expander("プロキシ設定（上級者向け）", expanded=Fal
         "proxy_pass": st.text_input("パスワード", type="password")
     }
 progress_text, p_bar, time_info = st.empty(), st.empty(), st.empty()
-results_placeholder, download_placeholder = st.empty(), st.empty()
-
-AREA_CODE_CSV_PATH = "市外局番リスト.csv"
+results_placeholder, download_placeholder, metrics_download_placeholder, log_download_placeholder = st.empty(), st.empty(), st.empty(), st.empty()
+st.sidebar.markdown("#### ステージ別の計測")
+stage_table = st.sidebar.empty()
 
 if uploaded_file := st.file_uploader("処理対象ファイル (電話番号, [HP], [屋号], [住所/所在地] 列を含む) をアップロード", type=["csv", "xlsx", "xls"]):
 
     if st.button('処理開始'):
+        clicked_at = time.time() # クリックから最初の1件の処理完了までの時間を表示する
 
         try:
-            try:
-                area_codes_df = pd.read_csv(AREA_CODE_CSV_PATH, dtype=str, encoding="utf-8-sig")
-            except UnicodeDecodeError:
-                try:
-                    area_codes_df = pd.read_csv(AREA_CODE_CSV_PATH, dtype=str, encoding="cp932")
-                    st.info("市外局番リストを cp932 (Shift-JIS) で読み込みました。")
-                except Exception:
-                    area_codes_df = pd.read_csv(AREA_CODE_CSV_PATH, dtype=str, encoding="utf-8")
-                    st.info("市外局番リストを utf-8 で読み込みました。")
-
-            area_codes_df.columns = area_codes_df.columns.str.strip()
-
-            if '市外局番' not in area_codes_df.columns:
-                st.error(f"エラー: '{AREA_CODE_CSV_PATH}' に '市外局番' という列が見つかりません。")
-                st.stop()
-
-            area_codes_df['市外局番'] = area_codes_df['市外局番'].str.strip()
-            area_codes_set = set(area_codes_df['市外局番'].astype(str).str.zfill(2))
-            st.info(f"✅ 市外局番リスト ({AREA_CODE_CSV_PATH}) を読み込みました。 (件数: {len(area_codes_set)})")
-
+            area_code_index, area_code_encoding = cached_area_code_index(AREA_CODE_CSV_PATH, os.path.getmtime(AREA_CODE_CSV_PATH))
+            if area_code_encoding == "cp932":
+                st.info("市外局番リストを cp932 (Shift-JIS) で読み込みました。")
+            elif area_code_encoding == "utf-8":
+                st.info("市外局番リストを utf-8 で読み込みました。")
+            st.info(f"✅ 市外局番リスト ({AREA_CODE_CSV_PATH}) を読み込みました。 (件数: {len(area_code_index)})")
+
+        except ValueError as e:
+            st.error(f"エラー: {e}")
+            st.stop()
         except FileNotFoundError:
             st.error(f"エラー: '{AREA_CODE_CSV_PATH}' が見つかりません。スクリプトと同じ場所に配置してください。")
             st.stop()
@@ -623,33 +147,44 @@ if uploaded_file := st.file_uploader("処理対象ファイル (電話番号, [H
             
             if original_filename.lower().endswith('.csv'):
                 st.info(f"CSVファイル ({original_filename}) を読み込んでいます...")
-                try:
-                    df = pd.read_csv(uploaded_file, dtype=str, encoding="utf-8-sig")
-                except UnicodeDecodeError:
-                    try:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, dtype=str, encoding="utf-8")
-                        st.info("CSVを utf-8 で読み込みました。")
-                    except UnicodeDecodeError:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, dtype=str, encoding="cp932")
-                        st.info("CSVを cp932 (Shift-JIS) で読み込みました。")
-            
             elif original_filename.lower().endswith(('.xlsx', '.xls')):
                 st.info(f"Excelファイル ({original_filename}) を読み込んでいます...")
-                df = pd.read_excel(uploaded_file, dtype=str)
-            
             else:
                 st.error("サポートされていないファイル形式です。CSV, XLSX, XLS ファイルをアップロードしてください。")
                 st.stop()
 
-            df.columns = df.columns.str.strip()
+            df, csv_encoding = read_input_table(uploaded_file, original_filename)
+            if csv_encoding == "utf-8":
+                st.info("CSVを utf-8 で読み込みました。")
+            elif csv_encoding == "cp932":
+                st.info("CSVを cp932 (Shift-JIS) で読み込みました。")
         
         except Exception as e:
             st.error(f"ファイル ({original_filename}) の読み込みに失敗しました: {e}")
             st.stop()
 
-        p_bar.progress(0); status_container = st.expander("詳細ログ", expanded=True)
+        page_cache = None
+        if use_page_cache or offline_mode:
+            page_cache = PageCache(PAGE_CACHE_PATH, ttl_seconds=None if offline_mode else cache_ttl_days * 24 * 3600,
+                                   max_bytes=cache_max_mb * 1024 * 1024)
+
+        if use_job_queue and offline_mode:
+            st.warning("オフライン再抽出モードではジョブキューを使わずに処理します。")
+            use_job_queue = False
+
+        # --- 同じファイルの途中結果があれば続きから再開する (オフライン再抽出の結果は別に記録する) ---
+        # ジョブキューを使う場合は、キューに記録済みの結果が途中結果になる
+        checkpoint = RunCheckpoint(file_digest(uploaded_file.getvalue()) + (':offline' if offline_mode else ''), CHECKPOINT_PATH)
+        checkpoint_count = 0
+        if not resume_from_checkpoint:
+            checkpoint.clear()
+        elif not use_job_queue and (checkpoint_count := checkpoint.count()):
+            st.info(f"このファイルの途中結果 ({checkpoint_count} 件) が見つかりました。未処理の行から再開します。")
+
+        # 詳細ログは直近の行だけを1つの枠に表示し、全件はファイルに書き出す (要素が増え続けて画面が重くなるのを防ぐ)
+        p_bar.progress(0)
+        status_container = RingBufferLog(os.path.join(RUN_LOG_DIR, f"run_{time.strftime('%Y%m%d_%H%M%S')}.log"),
+                                         st.expander("詳細ログ (直近の行のみ表示)", expanded=True).empty())
         start_time = time.time()
         final_df = None
 
@@ -667,28 +202,106 @@ if uploaded_file := st.file_uploader("処理対象ファイル (電話番号, [H
         if phone_col in df.columns:
             total_jobs_for_eta = len(df[
                 (df[phone_col].isnull() | (df[phone_col] == ''))
-            ])
+            ]) - checkpoint_count
 
 
         processed_count_for_eta = 0
-        for prog, msg, df_result in run_scraping_process(df, status_container, proxy_settings, disable_headless, area_codes_set):
-            p_bar.progress(prog); progress_text.text(msg); status_container.info(msg)
-
-            if df_result is None and total_jobs_for_eta > 0:
+        stage_metrics = StageMetrics()
+        stage_scheduler = StageScheduler(schedule_policy, stage_metrics, None if offline_mode else STAGE_ESTIMATES_PATH) # オフライン再抽出の所要時間は記録しない
+        stage_table_updated = progress_updated = 0.0
+        run_deadline = Deadline.after(run_deadline_minutes * 60)
+        job_queue, queue_workers = None, []
+        if use_job_queue:
+            # --- 分散処理: 作業単位をジョブキューに登録し、ワーカーのプロセス (cli.py --queue-worker) の結果を集める ---
+            # ステージ別の計測値・実行順の見積もりはワーカーごとに記録する (計測値はワーカーの終了後にそのファイルから集める)
+            try:
+                job_queue = open_job_queue(queue_url)
+            except Exception as e:
+                st.error(f"ジョブキューを開けませんでした: {e}")
+                st.stop()
+            job_id = file_digest(uploaded_file.getvalue())
+            if not resume_from_checkpoint:
+                job_queue.clear(job_id)
+            st.info(f"ジョブID: {job_id} (他のマシンからは python cli.py --queue-worker --queue {queue_url} --job {job_id} で参加できます)")
+            worker_options = ['--workers', str(worker_count), '--parse-workers', str(parse_workers), '--html-backend', html_backend_name,
+                              '--schedule', schedule_policy, '--block-resources', ','.join(blocked_types) or 'none',
+                              '--page-load-strategy', page_load_strategy, '--max-browser-mb', str(max_browser_mb),
+                              '--max-pages-per-browser', str(max_pages_per_browser), '--cache-ttl-days', str(cache_ttl_days),
+                              '--cache-max-mb', str(cache_max_mb), '--row-budget', str(row_budget_seconds), '--quiet']
+            for flag, enabled in (('--no-http-fetch', not use_http_fetch), ('--no-sitemap', not use_sitemap), ('--no-cache', not use_page_cache),
+                                  ('--allow-third-party', not block_third_party), ('--no-standby', not use_standby_browser),
+                                  ('--disable-headless', disable_headless)):
+                if enabled:
+                    worker_options.append(flag)
+            # プロキシのパスワードはコマンドラインに載せず、環境変数で渡す (spawn_queue_workers の proxy_pass)
+            for flag, value in (('--proxy-host', 'proxy_host'), ('--proxy-port', 'proxy_port'), ('--proxy-user', 'proxy_user')):
+                if proxy_settings[value]:
+                    worker_options += [flag, proxy_settings[value]]
+            scraping_run = run_queue_coordinator(
+                df, job_queue, job_id, status_container, st,
+                (lambda: sum(process.poll() is None for process in queue_workers)) if queue_worker_processes else None,
+                lambda: queue_workers.extend(spawn_queue_workers(queue_url, job_id, queue_worker_processes, worker_options + deadline_options(run_deadline),
+                                                                 proxy_pass=proxy_settings['proxy_pass'] or None)),
+                run_deadline=run_deadline)
+        else:
+            scraping_run = run_scraping_process(df, status_container, proxy_settings, disable_headless, area_code_index, worker_count, use_http_fetch, html_backend_name,
+                                                page_cache, offline_mode, checkpoint, st, None, resource_policy, recycle_policy,
+                                                use_sitemap, stage_metrics=stage_metrics, stage_scheduler=stage_scheduler,
+                                                parse_workers=parse_workers, row_budget_seconds=row_budget_seconds, run_deadline=run_deadline,
+                                                warm_driver_pool=warm_driver_pool)
+        first_row_seconds = None
+        for prog, msg, df_result in scraping_run:
+            status_container.info(msg)
+            if use_job_queue:
+                processed_count_for_eta = prog * total_jobs_for_eta # 結果はまとめて届くため、件数は進捗率から求める
+            elif df_result is None and total_jobs_for_eta > 0:
                 processed_count_for_eta += 1
-                elapsed = time.time() - start_time
+            if first_row_seconds is None and processed_count_for_eta > 0:
+                first_row_seconds = time.time() - clicked_at
+
+            # --- 画面の更新は間隔をあけてまとめる (最後の1回は必ず描画する) ---
+            now = time.time()
+            if now - progress_updated >= PROGRESS_INTERVAL or df_result is not None:
+                p_bar.progress(prog); progress_text.text(msg)
                 if processed_count_for_eta > 1:
-                    eta_total = elapsed / (processed_count_for_eta / total_jobs_for_eta)
+                    eta_total = (now - start_time) / (processed_count_for_eta / total_jobs_for_eta)
                     eta_finish_time = start_time + eta_total
                     time_info.info(f"予想処理時間: 約{int(eta_total//60)}分 (完了予定: {time.strftime('%H:%M頃', time.localtime(eta_finish_time))})")
+                progress_updated = now
+            if not use_job_queue and (now - stage_table_updated >= STAGE_TABLE_INTERVAL or df_result is not None):
+                stage_table.dataframe(pd.DataFrame(stage_metrics.summary_table()), hide_index=True)
+                stage_table_updated = now
+            status_container.render()
 
             if df_result is not None:
                 final_df = df_result
 
+        if page_cache:
+            page_cache.close()
+        checkpoint.close()
+        if job_queue:
+            for process in queue_workers:
+                if not msg.startswith("完了") and process.poll() is None:
+                    process.terminate() # 締め切り等で途中で終了した場合 (借りていた作業単位はリースの期限後に再処理できる)
+                process.wait() # 完了時はワーカーも終了している
+            job_queue.close()
+            # このマシンで起動したワーカーの計測値を合算して表示する (他のマシンのワーカーの分は含まない)
+            for number in range(1, len(queue_workers) + 1):
+                worker_metrics_path = queue_worker_metrics_path(STAGE_METRICS_PATH, number)
+                try:
+                    if os.path.getmtime(worker_metrics_path) >= start_time: # 前回の実行で書き出したファイルは除く
+                        stage_metrics.merge_file(worker_metrics_path)
+                except (OSError, ValueError, KeyError) as e:
+                    status_container.warning(f"ワーカーの計測値を読み込めませんでした ({worker_metrics_path}): {e}")
+            stage_table.dataframe(pd.DataFrame(stage_metrics.summary_table()), hide_index=True)
+        status_container.close()
+
         if msg.startswith("完了") or msg.startswith("列名エラー") or msg.startswith("処理対象なし") or msg.startswith("ブラウザ起動エラー"):
             st.success(f"🎉 {msg}");
         else:
              st.warning(f"処理が完了前に終了しました: {msg}")
+        if first_row_seconds is not None:
+            st.caption(f"処理開始のクリックから最初の1件の処理完了まで: {first_row_seconds:.1f}秒")
 
         results_placeholder.dataframe(final_df)
 
@@ -700,3 +313,14 @@ if uploaded_file := st.file_uploader("処理対象ファイル (電話番号, [H
         base_filename = original_filename.rsplit('.', 1)[0] if '.' in original_filename else original_filename
         download_filename = f"{base_filename}_番号抽出完了.xlsx"
         download_placeholder.download_button("結果をExcelダウンロード", excel_data, download_filename, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+        if not use_job_queue: # ジョブキューではワーカーが計測値・見積もりを保存済み (ここで保存すると読み込み時の古い値で上書きする)
+            try:
+                stage_metrics.write(STAGE_METRICS_PATH)
+                stage_scheduler.save()
+            except OSError as e:
+                st.warning(f"ステージ別の計測値を保存できませんでした: {e}")
+        metrics_download_placeholder.download_button("ステージ別の計測値をダウンロード (JSON)", stage_metrics.to_json(),
+                                                     f"{base_filename}_stage_metrics.json", 'application/json')
+        log_download_placeholder.download_button(f"詳細ログ (全{sum(status_container.counts.values())}行) をダウンロード", status_container.read_full(),
+                                                 f"{base_filename}_log.txt", 'text/plain')
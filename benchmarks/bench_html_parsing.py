@@ -0,0 +1,124 @@
+# benchmarks/bench_html_parsing.py
+# HTML解析バックエンド (lexbor / lxml / bs4) のベンチマーク
+# ページごとの解析時間 (不要タグ除去 + テキスト抽出) とピークメモリを比較する
+#   実行: python benchmarks/bench_html_parsing.py [--corpus 保存ページのフォルダ] [--pages 50] [--repeat 3]
+# ピークメモリは各バックエンドを別プロセスで動かし、ページごとに以下を測る
+#   peak_rss : /proc/self/clear_refs でリセットした VmHWM の増分 (C拡張の確保分も含む, Linuxのみ)
+#   py_peak  : tracemalloc のピーク (Pythonオブジェクトの確保分のみ)
+#   proc     : 全ページ処理中のプロセス全体のピークRSSの増分 (解放済みメモリの再利用で per-page の値が 0 になる場合の目安)
+import argparse
+import gc
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import load_area_codes, load_saved_pages, make_company_pages
+from html_text import available_backends, get_backend
+from phone_extractor import AreaCodeIndex, extract_phone_from_text
+
+
+def _read_status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure_backend(name, pages, repeat):
+    """(別プロセスで実行) ページごとの (解析時間[秒], peak_rss[KB], py_peak[KB], 抽出テキスト) と、
+    プロセス全体のピークRSSの増分[KB] を返す"""
+    backend = get_backend(name)
+    backend.page_text('<html><body>warm up</body></html>')
+    gc.collect()
+    process_base_rss = _read_status_kb('VmRSS')
+    process_peak_rss = 0
+    results = []
+    for html in pages:
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = backend.page_text(html)
+            elapsed.append(time.perf_counter() - start)
+
+        gc.collect()
+        peak_rss = None
+        if _reset_peak_rss():
+            base_rss = _read_status_kb('VmRSS')
+            backend.page_text(html)
+            peak_rss = max(0, _read_status_kb('VmHWM') - base_rss)
+            process_peak_rss = max(process_peak_rss, _read_status_kb('VmHWM') - process_base_rss)
+        tracemalloc.start()
+        backend.page_text(html)
+        py_peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        results.append((min(elapsed), peak_rss, py_peak, text))
+    return results, (process_peak_rss if process_base_rss is not None else None)
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML解析バックエンドのベンチマーク')
+    parser.add_argument('--corpus', help='保存済みページ (*.html) のフォルダ。省略時は合成ページを使う')
+    parser.add_argument('--pages', type=int, default=50, help='合成ページ数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    area_codes = load_area_codes()
+    pages = load_saved_pages(args.corpus) if args.corpus else make_company_pages(args.pages, args.seed, area_codes)
+    if not pages:
+        sys.exit(f"ページが見つかりません: {args.corpus}")
+    htmls = [page.html for page in pages]
+    total_kb = sum(len(html.encode('utf-8')) for html in htmls) / 1024
+    print(f"pages={len(pages)} total={total_kb:.0f}KB avg={total_kb / len(pages):.1f}KB backends={available_backends()}")
+
+    area_code_index = AreaCodeIndex(area_codes)
+    baseline_phones = None
+    context = multiprocessing.get_context('spawn')
+    print(f"{'backend':>8} | {'mean ms':>8} {'p95 ms':>8} {'MB/s':>7} | {'peak_rss KB (mean/max)':>22} | {'py_peak KB (mean/max)':>22} | {'proc KB':>7} | phones")
+    for name in available_backends():
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results, process_peak_rss = executor.submit(measure_backend, name, htmls, args.repeat).result()
+        times = [r[0] for r in results]
+        rss = [r[1] for r in results if r[1] is not None]
+        py_peaks = [r[2] for r in results]
+        phones = [extract_phone_from_text(r[3], area_code_index) for r in results]
+        if baseline_phones is None:
+            baseline_phones = phones
+        same = sum(1 for a, b in zip(phones, baseline_phones) if a == b)
+        correct = sum(1 for page, phone in zip(pages, phones) if page.expected_phone is not None and page.expected_phone == phone)
+        labelled = sum(1 for page in pages if page.expected_phone is not None)
+        rss_text = f"{statistics.mean(rss):9.0f} / {max(rss):9.0f}" if rss else f"{'n/a':>21}"
+        print(f"{name:>8} | {statistics.mean(times) * 1000:8.2f} {percentile(times, 0.95) * 1000:8.2f} "
+              f"{total_kb / 1024 / sum(times):7.1f} | {rss_text:>22} | "
+              f"{statistics.mean(py_peaks):9.0f} / {max(py_peaks):9.0f}  | "
+              f"{process_peak_rss if process_peak_rss is not None else 'n/a':>7} | "
+              f"same={same}/{len(pages)}" + (f" correct={correct}/{labelled}" if labelled else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_phone_extraction.py
+# 電話番号抽出エンジンのマイクロベンチマーク
+# 従来の実装 (呼び出しごとに正規表現・変換テーブルを作る版) と結果が一致することを確認し、処理時間を比較する
+#   実行: python benchmarks/bench_phone_extraction.py [--texts 2000] [--repeat 5] [--seed 0]
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pandas as pd
+from phone_extractor import (HP_TRANSLATION_TABLE, YAHOO_TRANSLATION_TABLE, AreaCodeIndex,
+                             extract_phone_from_text, extract_phones_batch, is_valid_phone)
+
+
+# --- 従来の実装 (app.py の extract_phone_number / search_yahoo_for_phone から抜き出したもの) ---
+# 区切りなしの番号は従来 set で重複除去していたため順序が不定だった。比較できるよう出現順で重複除去している
+# numbering_plan=True で、現在のエンジンと同じ番号計画上の桁数チェックを加える
+def legacy_extract(text, sorted_area_codes, yahoo=False, numbering_plan=True):
+    def validate_and_add_internal(phone_digits, phones_list):
+        if not phone_digits or (phone_digits in phones_list): return False
+        if phone_digits.startswith(('0120', '0800')): return False
+        if phone_digits.startswith(('050', '070', '080', '090')):
+            if numbering_plan and len(phone_digits) != 11: return False
+            phones_list.append(phone_digits); return True
+        if numbering_plan and len(phone_digits) != 10: return False
+        is_valid_area_code = False
+        for code in sorted_area_codes:
+            if phone_digits.startswith(code): is_valid_area_code = True; break
+        if is_valid_area_code: phones_list.append(phone_digits); return True
+        return False
+
+    if yahoo:
+        translation_table = str.maketrans('０１２３４５６７８９（）－‐S', '0123456789()-- ')
+    else:
+        translation_table = str.maketrans('０１２３４５６７８９（）－‐　', '0123456789()-- ')
+    normalized_text = text.translate(translation_table)
+    found_phones = []
+
+    pattern1 = r'(?:TEL|電話番号|電話)\s*[.:：]?\s*(0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4})'
+    for m in re.finditer(pattern1, normalized_text, re.IGNORECASE):
+        phone_digits = re.sub(r'[^0-9]', '', m.group(1))
+        if len(phone_digits) == 10 or len(phone_digits) == 11:
+            validate_and_add_internal(phone_digits, found_phones)
+
+    pattern2 = r'0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4}'
+    for candidate in re.findall(pattern2, normalized_text):
+        phone_digits = re.sub(r'[^0-9]', '', candidate)
+        if len(phone_digits) == 10 or len(phone_digits) == 11:
+            validate_and_add_internal(phone_digits, found_phones)
+
+    pattern3 = r'(?<!\d)(0\d{9,10})(?!\d)'
+    for phone_digits in dict.fromkeys(re.findall(pattern3, normalized_text)):
+        validate_and_add_internal(phone_digits, found_phones)
+
+    if found_phones:
+        mobile_phones = [p for p in found_phones if p.startswith(('070', '080', '090'))]
+        if mobile_phones: return mobile_phones[0]
+        else: return found_phones[0]
+    return None
+
+
+# --- テストデータ生成 ---
+FILLER = ['株式会社サンプル', '本社', '所在地', '東京都千代田区1-2-3', 'お問い合わせ', '営業時間 9:00〜18:00',
+          '設立 2001年', '資本金 1,000万円', 'FAX', 'Copyright 2024', 'SERVICE', 'ＳＨＯＰ', '〒100-0001', '\n', '　']
+LABELS = ['TEL', 'Tel.', 'tel:', '電話', '電話番号：', 'TEL ', '電話番号 : ', 'FAX ']
+TO_FULL_WIDTH = str.maketrans('0123456789()-', '０１２３４５６７８９（）－')
+
+
+def random_number(rng, area_codes):
+    kind = rng.random()
+    if kind < 0.45:
+        code = rng.choice(area_codes)
+        rest = ''.join(rng.choice('0123456789') for _ in range(10 - len(code)))
+        digits = code + rest
+    elif kind < 0.6:
+        digits = rng.choice(['090', '080', '070', '050']) + ''.join(rng.choice('0123456789') for _ in range(8))
+    elif kind < 0.7:
+        digits = rng.choice(['0120', '0800']) + ''.join(rng.choice('0123456789') for _ in range(6))
+    else:
+        digits = '0' + ''.join(rng.choice('0123456789') for _ in range(rng.randint(6, 12)))
+    style = rng.random()
+    if style < 0.3:
+        return digits
+    cut1 = rng.randint(2, min(5, len(digits) - 4))
+    cut2 = rng.randint(cut1 + 1, min(cut1 + 4, len(digits) - 3))
+    seps = [rng.choice(['-', '‐', '－', ' ', '(', ')', '（', '）', '  ', ' - ', 'S']) for _ in range(2)]
+    number = digits[:cut1] + seps[0] + digits[cut1:cut2] + seps[1] + digits[cut2:]
+    return number.translate(TO_FULL_WIDTH) if style > 0.85 else number
+
+
+def make_text(rng, area_codes, size):
+    parts = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.15:
+            parts.append(rng.choice(LABELS) + random_number(rng, area_codes))
+        elif roll < 0.3:
+            parts.append(random_number(rng, area_codes))
+        elif roll < 0.33:
+            parts.append(str(rng.randint(0, 99999)))
+        else:
+            parts.append(rng.choice(FILLER))
+    return rng.choice(['', ' ', '\n']).join(parts)
+
+
+def load_area_codes():
+    area_codes_df = pd.read_csv(os.path.join(ROOT_DIR, '市外局番リスト.csv'), dtype=str, encoding='utf-8-sig')
+    area_codes_set = set(area_codes_df['市外局番'].str.strip().astype(str).str.zfill(2))
+    return tuple(sorted(area_codes_set, key=len, reverse=True))
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='電話番号抽出エンジンのマイクロベンチマーク')
+    parser.add_argument('--texts', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sorted_area_codes = load_area_codes()
+    area_code_index = AreaCodeIndex(sorted_area_codes)
+    texts = [make_text(rng, list(sorted_area_codes), rng.randint(5, 300)) for _ in range(args.texts)]
+
+    # --- 結果の一致確認 ---
+    mismatches = 0
+    for yahoo, table in ((False, HP_TRANSLATION_TABLE), (True, YAHOO_TRANSLATION_TABLE)):
+        for text in texts:
+            if legacy_extract(text, sorted_area_codes, yahoo) != extract_phone_from_text(text, area_code_index, table):
+                mismatches += 1
+    hits = sum(1 for result in extract_phones_batch(texts, area_code_index) if result)
+    rejected_by_plan = sum(1 for text in texts
+                           if legacy_extract(text, sorted_area_codes, numbering_plan=False) != legacy_extract(text, sorted_area_codes))
+    print(f"texts={len(texts)} chars={sum(map(len, texts))} hits={hits} mismatches={mismatches} "
+          f"changed_by_numbering_plan={rejected_by_plan}")
+    if mismatches:
+        sys.exit(1)
+
+    # --- 処理時間 (テキスト全体) ---
+    legacy_time = timed(lambda: [legacy_extract(text, sorted_area_codes) for text in texts], args.repeat)
+    engine_time = timed(lambda: [extract_phone_from_text(text, area_code_index) for text in texts], args.repeat)
+    batch_time = timed(lambda: extract_phones_batch(texts, area_code_index), args.repeat)
+    for name, elapsed in (('legacy', legacy_time), ('engine', engine_time), ('engine(batch)', batch_time)):
+        print(f"{name:>14}: {elapsed * 1000:8.1f} ms  ({elapsed / len(texts) * 1e6:7.1f} us/text, x{legacy_time / elapsed:.2f})")
+
+    # --- 処理時間 (市外局番の判定のみ) ---
+    candidates = [f"0{rng.randrange(10 ** 9):09d}" for _ in range(20000)]
+    def linear_validate():
+        for phone_digits in candidates:
+            for code in sorted_area_codes:
+                if phone_digits.startswith(code): break
+    linear_time = timed(linear_validate, args.repeat)
+    index_time = timed(lambda: [is_valid_phone(phone_digits, area_code_index) for phone_digits in candidates], args.repeat)
+    for name, elapsed in (('linear loop', linear_time), ('prefix index', index_time)):
+        print(f"{name:>14}: {elapsed * 1000:8.1f} ms  ({elapsed / len(candidates) * 1e6:7.2f} us/number, x{linear_time / elapsed:.2f})")
+
+
+if __name__ == '__main__':
+    main()
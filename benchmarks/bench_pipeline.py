@@ -0,0 +1,358 @@
+# benchmarks/bench_pipeline.py
+# 処理全体 (run_scraping_process) のベンチマーク: 実サイトにアクセスせずにスループットと抽出精度を測る
+# ローカルのHTTPサーバーで合成会社サイト (corpus.make_company_sites) と Yahoo検索結果の代替ページ
+# (AnswerLocalSpot__subInfoSpotDetail のスポット情報 / div.Algo の一覧) を配信し、本物の処理をそのサーバーに向けて実行する
+#   実行: python benchmarks/bench_pipeline.py [--sites 200] [--workers 4] [--json 結果.json] [--baseline 前回の結果.json]
+# 出力: 行数/秒, 行ごとの所要時間 p50/p95, ピークRSS (このプロセス + ブラウザのプロセスツリー), 適合率/再現率
+# ブラウザは既定では代替ブラウザ (HTTPで取得するだけ・JavaScriptは実行しない) を使う。--browser chrome で本物の Chrome を使う
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from corpus import ROOT_DIR, load_saved_pages, make_company_sites, yahoo_results_page, yahoo_spot_page
+from driver_pool import MB, process_tree_rss
+from html_text import YAHOO_SPOT_DETAIL_CLASS, available_backends, find_yahoo_spot_phone_text
+import scraper_engine
+from stage_metrics import StageMetrics
+from stage_scheduler import SCHEDULE_POLICIES, StageScheduler
+from scraper_engine import AREA_CODE_CSV_PATH, PHONE_LIKE_JS_PATTERN, HostConcurrencyLimiter, load_area_codes, run_scraping_process
+
+# 比較に使う指標: (名前, 大きいほど良いか)
+METRICS = (('rows_per_second', True), ('row_p50_seconds', False), ('row_p95_seconds', False), ('peak_rss_mb', False),
+           ('precision', True), ('recall', True))
+
+
+# --- ★★★ ローカルの代替Webサーバー ★★★ ---
+class BenchmarkServer:
+    """合成サイト・robots.txt・サイトマップ・Yahoo検索の代替ページを配信する (latency 秒の応答遅延付き)"""
+    def __init__(self, sites, saved_pages=(), latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._sites_by_name = {site.name: site for site in sites}
+        for site in sites:
+            if site.kind == 'no_hp':
+                continue
+            for path, html in site.pages.items():
+                self._routes[site.path + path] = ('text/html; charset=utf-8', html.encode('utf-8'))
+        for number, page in enumerate(saved_pages):
+            self._routes[f'/saved{number:04d}/'] = ('text/html; charset=utf-8', page.html.encode('utf-8'))
+        self._routes['/decoy/'] = ('text/html; charset=utf-8', '<html><body><p>decoy</p></body></html>'.encode('utf-8'))
+        self._sites = sites
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                route = server.route(self.path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                content_type, body = route
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self._routes['/robots.txt'] = ('text/plain; charset=utf-8', f'User-agent: *\nSitemap: {self.base_url}/sitemap.xml\n'.encode('utf-8'))
+        locations = ''.join(f'<url><loc>{self.base_url}{site.path}{path}</loc></url>'
+                            for site in sites if site.kind != 'no_hp' for path in site.sitemap_paths)
+        self._routes['/sitemap.xml'] = ('application/xml', f'<?xml version="1.0" encoding="UTF-8"?><urlset>{locations}</urlset>'.encode('utf-8'))
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def route(self, path):
+        parts = urlsplit(path)
+        if parts.path == '/search':
+            return 'text/html; charset=utf-8', self.search_page(parse_qs(parts.query).get('p', [''])[0]).encode('utf-8')
+        return self._routes.get(parts.path)
+
+    def search_page(self, query):
+        """Yahoo検索の代替: 先頭の "..." の屋号でサイトを引き、ダイレクト検索 / 一覧検索 (「電話番号」付き) の結果を返す"""
+        match = re.match(r'"([^"]+)"', query)
+        site = self._sites_by_name.get(match.group(1)) if match else None
+        list_search = '電話番号' in query
+        if site is None or site.yahoo_kind is None or site.yahoo_kind == 'none':
+            return yahoo_results_page(['該当する情報は見つかりませんでした。'] * 3)
+        if site.yahoo_kind == 'spot' and not list_search:
+            return yahoo_spot_page(site.name, site.formatted_phone)
+        if site.yahoo_kind == 'algo' and list_search:
+            return yahoo_results_page([f'{site.name} {site.address}', f'{site.name} 電話 {site.formatted_phone} 営業時間 9:00〜18:00',
+                                       '関連する企業の一覧'])
+        return yahoo_results_page([f'{site.name}の公式サイトです。'] * 3)
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+# --- ★★★ 代替ブラウザ (HTTPで取得するだけ) ★★★ ---
+class _StandInElement:
+    def __init__(self, text):
+        self.text = text
+
+
+class StandInDriver:
+    """ローカルサーバーのページだけを取得する、Selenium の WebDriver の代わり (それ以外のURLは空のページ)
+    処理本体が使う get / page_source / current_url / execute_script / find_element だけを持つ"""
+    window_handles = ['stand-in']
+
+    def __init__(self, allowed_origin, timeout=30):
+        self.allowed_origin = allowed_origin
+        self.timeout = timeout
+        self.current_url = ''
+        self.page_source = '<html><head></head><body></body></html>'
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def get(self, url):
+        self.current_url = url
+        self.page_source = '<html><head></head><body></body></html>'
+        if not url.startswith(self.allowed_origin):
+            return
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                self.current_url = response.url
+                self.page_source = response.read().decode('utf-8', errors='replace')
+        except urllib.error.HTTPError as e:
+            self.page_source = f'<html><body><p>{e.code}</p></body></html>'
+        except OSError as e:
+            raise TimeoutException(str(e))
+
+    def execute_script(self, script):
+        """ページの準備待ち (PAGE_STATE_SCRIPT) の代わり: 読み込み済み・リソースなし・番号らしい文字列の有無"""
+        return ['complete', 0, bool(re.search(PHONE_LIKE_JS_PATTERN, self.page_source))]
+
+    def find_element(self, by, value):
+        if YAHOO_SPOT_DETAIL_CLASS in value:
+            phone_text = find_yahoo_spot_phone_text(self.page_source)
+            if phone_text is not None:
+                return _StandInElement(phone_text)
+        raise NoSuchElementException(value)
+
+    def quit(self):
+        pass
+
+
+# --- ★★★ 計測 ★★★ ---
+class PeakRssSampler:
+    """このプロセスと子プロセス (chromedriver / Chrome) の合計RSSのピークを一定間隔で測る"""
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss(os.getpid()) or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        # /proc・psutil が使えない環境では、このプロセスの最大RSS (Linux では KB 単位)
+        self.peak = self.peak or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class CountingStatus:
+    """処理本体のログ出力先 (警告・エラーの件数だけ数え、--verbose では表示する)"""
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.counts = {'warning': 0, 'error': 0}
+
+    def _log(self, level, message):
+        if level in self.counts:
+            self.counts[level] += 1
+        if self.verbose:
+            print(f"[{level}] {message}", file=sys.stderr)
+
+    def info(self, message): self._log('info', message)
+    def success(self, message): self._log('success', message)
+    def warning(self, message): self._log('warning', message)
+    def error(self, message): self._log('error', message)
+
+
+def build_input(sites, saved_count, base_url, duplicate_ratio, seed):
+    """入力の表 (電話番号は空欄) と、行ごとの正解 (数字のみ / None / 正解不明は False)"""
+    rows, expected = [], []
+    for site in sites:
+        rows.append({'電話番号': '', 'HP': '' if site.kind == 'no_hp' else base_url + site.path, '屋号': site.name, '住所': site.address})
+        expected.append(site.expected_phone)
+    for number in range(saved_count): # 保存済みページ (正解不明: 精度の集計には含めない)
+        rows.append({'電話番号': '', 'HP': f'{base_url}/saved{number:04d}/', '屋号': '', '住所': ''})
+        expected.append(False)
+    rng = random.Random(seed)
+    for position in rng.sample(range(len(sites)), int(len(sites) * duplicate_ratio)): # 重複行 (同じHP・屋号+住所)
+        rows.append(dict(rows[position]))
+        expected.append(expected[position])
+    order = list(range(len(rows)))
+    rng.shuffle(order)
+    return pd.DataFrame([rows[i] for i in order]), [expected[i] for i in order]
+
+
+def accuracy(values, expected):
+    """(適合率, 再現率, 正解, 誤り, 見逃し)。正解不明の行は除く"""
+    true_positive = false_positive = false_negative = 0
+    for value, answer in zip(values, expected):
+        if answer is False:
+            continue
+        found = re.sub(r'\D', '', str(value)) if pd.notna(value) else ''
+        if found and found == answer:
+            true_positive += 1
+            continue
+        if found:
+            false_positive += 1
+        if answer:
+            false_negative += 1
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else 0.0
+    recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else 0.0
+    return precision, recall, true_positive, false_positive, false_negative
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args):
+    area_codes_set, _ = load_area_codes(os.path.join(ROOT_DIR, AREA_CODE_CSV_PATH))
+    sites = make_company_sites(args.sites, args.seed, sorted(area_codes_set, key=len, reverse=True))
+    saved_pages = load_saved_pages(args.corpus) if args.corpus else []
+    server = BenchmarkServer(sites, saved_pages, args.latency_ms / 1000)
+    # Yahoo検索・デコイのアクセス先をローカルサーバーに向ける
+    scraper_engine.YAHOO_SEARCH_URL = f'{server.base_url}/search'
+    scraper_engine.DECOY_URLS = [f'{server.base_url}/decoy/']
+
+    df, expected = build_input(sites, len(saved_pages), server.base_url, args.duplicate_ratio, args.seed)
+    status = CountingStatus(args.verbose)
+    host_limiter = HostConcurrencyLimiter(max(1, args.per_host), politeness_delay=args.politeness, host_delays={}, jitter=0)
+    driver_factory = None if args.browser == 'chrome' else (lambda: StandInDriver(server.base_url))
+    stats = {}
+    stage_metrics = StageMetrics()
+    result_df, message = None, ''
+    try:
+        with PeakRssSampler() as rss:
+            start = time.perf_counter()
+            for _, message, df_result in run_scraping_process(
+                    df, status, {}, False, area_codes_set, args.workers, not args.no_http_fetch, args.html_backend,
+                    on_stats=stats.update, use_sitemap=not args.no_sitemap, host_limiter=host_limiter, driver_factory=driver_factory,
+                    stage_metrics=stage_metrics, stage_scheduler=StageScheduler(args.schedule, stage_metrics), parse_workers=args.parse_workers):
+                if df_result is not None:
+                    result_df = df_result
+            elapsed = time.perf_counter() - start
+    finally:
+        server.close()
+    if result_df is None:
+        sys.exit(f"処理が完了しませんでした: {message}")
+
+    precision, recall, true_positive, false_positive, false_negative = accuracy(result_df['電話番号'], expected)
+    metrics = {
+        'rows': len(df), 'elapsed_seconds': round(elapsed, 3), 'rows_per_second': round(len(df) / elapsed, 3),
+        'row_p50_seconds': stats.get('row_p50_seconds', 0.0), 'row_p95_seconds': stats.get('row_p95_seconds', 0.0),
+        'peak_rss_mb': round(rss.peak / MB, 1), 'precision': round(precision, 4), 'recall': round(recall, 4),
+        'true_positive': true_positive, 'false_positive': false_positive, 'false_negative': false_negative,
+        'server_requests': server.requests, 'server_kb': round(server.bytes_sent / 1024, 1),
+        'warnings': status.counts['warning'], 'errors': status.counts['error'], 'message': message,
+    }
+    config = {key: getattr(args, key) for key in ('sites', 'seed', 'workers', 'browser', 'latency_ms', 'politeness', 'per_host',
+                                                  'duplicate_ratio', 'no_http_fetch', 'no_sitemap', 'html_backend', 'schedule',
+                                                  'parse_workers')}
+    config['saved_pages'] = len(saved_pages)
+    return {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': config, 'metrics': metrics, 'engine_stats': stats,
+            'stages': stage_metrics.snapshot()}
+
+
+def print_report(result, baseline=None):
+    metrics = result['metrics']
+    print(f"commit={result['commit']} rows={metrics['rows']} workers={result['config']['workers']} browser={result['config']['browser']} "
+          f"({metrics['message']}, {metrics['elapsed_seconds']:.1f}秒)")
+    print(f"  正解 {metrics['true_positive']} / 誤り {metrics['false_positive']} / 見逃し {metrics['false_negative']} | "
+          f"リクエスト {metrics['server_requests']} 件 ({metrics['server_kb']:.0f}KB) | 警告 {metrics['warnings']} / エラー {metrics['errors']}")
+    print(f"  {'metric':>16} | {'value':>10}" + (f" | {'baseline':>10} | {'change':>8}" if baseline else ''))
+    for name, higher_is_better in METRICS:
+        line = f"  {name:>16} | {metrics[name]:>10}"
+        if baseline and name in baseline['metrics']:
+            before = baseline['metrics'][name]
+            change = (metrics[name] - before) / before * 100 if before else 0.0
+            worse = change < 0 if higher_is_better else change > 0
+            line += f" | {before:>10} | {change:+7.1f}%" + (' (悪化)' if worse and abs(change) >= 5 else '')
+        print(line)
+    for values in result.get('stages', {}).values():
+        if values['count']:
+            print(f"  {values['label']:>14}: {values['count']}回 発見率 {values['hit_rate']:.0%} 平均 {values['seconds_mean']}秒 "
+                  f"タイムアウト {values['timeouts']} / {values['bytes'] / 1024:.0f}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='処理全体のベンチマーク (ローカルの代替サーバーに対して実行)')
+    parser.add_argument('--sites', type=int, default=200, help='合成サイトの数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', help='保存済みページ (*.html) のフォルダ。各ページをHPとして追加する (正解不明のため精度の集計からは除く)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--browser', choices=('stand-in', 'chrome'), default='stand-in')
+    parser.add_argument('--latency-ms', type=float, default=10.0, help='サーバーの応答遅延 (ミリ秒)')
+    parser.add_argument('--politeness', type=float, default=0.0, help='同一ホストへのアクセス間隔 (秒)。全サイトが同じホストのため既定では 0')
+    parser.add_argument('--per-host', type=int, default=8, help='同一ホストへの同時アクセス数の上限')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='重複行の割合')
+    parser.add_argument('--no-http-fetch', action='store_true')
+    parser.add_argument('--no-sitemap', action='store_true')
+    parser.add_argument('--html-backend', choices=available_backends())
+    parser.add_argument('--parse-workers', type=int, default=0, help='HTML解析・電話番号抽出を行う別プロセスの数 (0 で使わない)')
+    parser.add_argument('--schedule', choices=SCHEDULE_POLICIES, default='fixed', help='検索ステージの実行順 (前回の実測値は使わない)')
+    parser.add_argument('--json', help='結果をJSONで保存する (--baseline で比較に使う)')
+    parser.add_argument('--baseline', help='比較する前回の結果 (JSON)')
+    parser.add_argument('--verbose', action='store_true', help='処理本体のログを標準エラー出力に表示する')
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
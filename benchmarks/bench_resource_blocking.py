@@ -0,0 +1,167 @@
+# benchmarks/bench_resource_blocking.py
+# ブラウザのリソース制限 (resource_policy.py) のベンチマーク
+# ローカルのテストページ (合成会社ページ + CSS / フォント / 画像 / 動画 / 外部の解析スクリプト) を
+# 制限なし・制限ありのブラウザで読み込み、転送バイト数・リクエスト数・読み込み時間を比較する
+#   実行: python benchmarks/bench_resource_blocking.py [--pages 20] [--seed 0]  (Chrome / chromedriver が必要)
+# 外部スクリプトは別ポートの "localhost" から配信し、127.0.0.1 のページから見てサードパーティになるようにしている
+import argparse
+import http.server
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import load_area_codes, make_company_pages
+from phone_extractor import AreaCodeIndex, extract_phone_from_text
+from html_text import get_backend
+from resource_policy import ResourcePolicy, NO_RESOURCE_POLICY, DEFAULT_BLOCKED_TYPES, THIRD_PARTY_BLOCKED_HOSTS
+from scraper_engine import initialize_driver, wait_for_page_ready
+
+KB = 1024
+STATIC_ASSETS = { # パス: (Content-Type, サイズ)
+    '/static/site.css': ('text/css', 150 * KB),
+    '/static/font.woff2': ('font/woff2', 250 * KB),
+    '/static/bg.jpg': ('image/jpeg', 300 * KB),
+    '/static/hero.jpg': ('image/jpeg', 500 * KB),
+    '/static/intro.mp4': ('video/mp4', 2048 * KB),
+    '/static/app.js': ('application/javascript', 50 * KB),
+}
+THIRD_PARTY_ASSETS = {'/analytics.js': ('application/javascript', 100 * KB)}
+
+
+def asset_body(path, content_type, size):
+    if path.endswith('.css'):
+        head = "@font-face{font-family:f;src:url(/static/font.woff2)}body{font-family:f;background:url(/static/bg.jpg)}\n"
+        return (head + '/*' + 'x' * (size - len(head) - 4) + '*/').encode()
+    if content_type.endswith('javascript'):
+        return ('var pad = "' + 'x' * (size - 16) + '";\n').encode()
+    return random.Random(path).randbytes(size)
+
+
+class CountingServer:
+    """配信したバイト数・リクエスト数を数えるHTTPサーバー"""
+    def __init__(self, host, routes):
+        self.routes = routes # パス: (Content-Type, 本文)
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = server.routes.get(self.path.split('?')[0])
+                if route is None:
+                    self.send_response(404); self.end_headers(); return
+                content_type, body = route
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                sent = 0
+                try:
+                    for start in range(0, len(body), 64 * KB):
+                        self.wfile.write(body[start:start + 64 * KB])
+                        sent += len(body[start:start + 64 * KB])
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                with server._lock:
+                    server.bytes_sent += sent
+                    server.requests += 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer((host, 0), Handler)
+        self.port = self.httpd.server_port
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.bytes_sent = self.requests = 0
+
+
+def heavy_page(html, third_party_port):
+    """合成会社ページに重いリソースを追加する"""
+    head = ('<link rel="stylesheet" href="/static/site.css?v=1">'
+            f'<script async src="http://localhost:{third_party_port}/analytics.js"></script>')
+    body = ('<img src="/static/hero.jpg" alt="">'
+            '<video src="/static/intro.mp4" preload="auto" autoplay muted></video>'
+            '<script src="/static/app.js"></script>')
+    return html.replace('</head>', head + '</head>', 1).replace('<main>', '<main>' + body, 1)
+
+
+class PrintStatus:
+    def info(self, message): pass
+    def success(self, message): pass
+    def warning(self, message): print(f"warning: {message}", file=sys.stderr)
+    def error(self, message): print(f"error: {message}", file=sys.stderr)
+
+
+def measure(policy, urls, servers, expected_phones, area_code_index):
+    """1つの設定で全ページを読み込み、ページごとの (get秒, 準備完了までの秒, 転送バイト, リクエスト数, 正解したか) を返す"""
+    driver = initialize_driver(PrintStatus(), {}, False, resource_policy=policy)
+    if driver is None:
+        sys.exit("ブラウザを起動できませんでした (Chrome / chromedriver が必要です)。")
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': True})
+        backend = get_backend()
+        results = []
+        for url, expected in zip(urls, expected_phones):
+            for server in servers:
+                server.reset()
+            start = time.perf_counter()
+            driver.get(url)
+            get_seconds = time.perf_counter() - start
+            wait_for_page_ready(driver)
+            ready_seconds = time.perf_counter() - start
+            phone = extract_phone_from_text(backend.page_text(driver.page_source), area_code_index)
+            time.sleep(0.2) # 読み込み途中のリソースの転送分も数える
+            results.append((get_seconds, ready_seconds, sum(s.bytes_sent for s in servers), sum(s.requests for s in servers),
+                            expected is None or phone == expected))
+        return results
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ブラウザのリソース制限のベンチマーク')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    area_codes = load_area_codes()
+    pages = make_company_pages(args.pages, args.seed, area_codes)
+    third_party = CountingServer('127.0.0.1', {path: (ctype, asset_body(path, ctype, size)) for path, (ctype, size) in THIRD_PARTY_ASSETS.items()})
+    first_party_routes = {path: (ctype, asset_body(path, ctype, size)) for path, (ctype, size) in STATIC_ASSETS.items()}
+    for page in pages:
+        first_party_routes[f'/{page.name}'] = ('text/html; charset=utf-8', heavy_page(page.html, third_party.port).encode('utf-8'))
+    first_party = CountingServer('127.0.0.1', first_party_routes)
+    urls = [f'http://127.0.0.1:{first_party.port}/{page.name}' for page in pages]
+    expected_phones = [page.expected_phone for page in pages]
+
+    policies = {
+        'none': NO_RESOURCE_POLICY,
+        'default': ResourcePolicy(DEFAULT_BLOCKED_TYPES, THIRD_PARTY_BLOCKED_HOSTS + ('localhost',), 'eager'),
+    }
+    area_code_index = AreaCodeIndex(area_codes)
+    asset_kb = sum(size for _, size in list(STATIC_ASSETS.values()) + list(THIRD_PARTY_ASSETS.values())) // KB
+    print(f"pages={len(pages)} assets/page={asset_kb}KB (+HTML)")
+    print(f"{'policy':>8} | {'get ms':>8} {'ready ms':>9} {'p95 ms':>8} | {'KB/page':>8} {'req/page':>8} | correct")
+    for name, policy in policies.items():
+        results = measure(policy, urls, [first_party, third_party], expected_phones, area_code_index)
+        ready = [r[1] for r in results]
+        print(f"{name:>8} | {statistics.mean(r[0] for r in results) * 1000:8.0f} {statistics.mean(ready) * 1000:9.0f} "
+              f"{sorted(ready)[min(len(ready) - 1, int(len(ready) * 0.95))] * 1000:8.0f} | "
+              f"{statistics.mean(r[2] for r in results) / KB:8.0f} {statistics.mean(r[3] for r in results):8.1f} | "
+              f"{sum(r[4] for r in results)}/{len(results)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+# benchmarks/corpus.py
+# ベンチマーク用のページコーパス
+# 保存済みのページ (*.html) を読み込むか、会社HPを模した合成ページを決まった乱数で生成する
+import glob
+import os
+import random
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TO_FULL_WIDTH = str.maketrans('0123456789-', '０１２３４５６７８９－')
+PARAGRAPHS = [
+    '私たちは地域に根ざしたサービスを通じて、お客様の暮らしを支えています。',
+    '創業以来、品質と信頼を第一に事業を展開してまいりました。',
+    '詳しくはお問い合わせフォームよりご連絡ください。受付時間は平日9:00〜18:00です。',
+    '新着情報 2024.04.01 ホームページをリニューアルしました。',
+    '採用情報 正社員・アルバイトを募集しています。',
+]
+
+
+class CorpusPage:
+    """ベンチマーク用の1ページ (expected_phone は合成ページの場合のみ)"""
+    __slots__ = ('name', 'html', 'expected_phone')
+
+    def __init__(self, name, html, expected_phone=None):
+        self.name = name
+        self.html = html
+        self.expected_phone = expected_phone
+
+
+def load_area_codes():
+    """市外局番リストの市外局番 (長い順)"""
+    import pandas as pd
+    area_codes_df = pd.read_csv(os.path.join(ROOT_DIR, '市外局番リスト.csv'), dtype=str, encoding='utf-8-sig')
+    area_codes_set = set(area_codes_df['市外局番'].str.strip().astype(str).str.zfill(2))
+    return tuple(sorted(area_codes_set, key=len, reverse=True))
+
+
+def load_saved_pages(directory):
+    """保存済みページ (*.html / *.htm) を読み込む"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.htm*'))):
+        with open(path, 'rb') as f:
+            content = f.read()
+        for encoding in ('utf-8', 'cp932'):
+            try:
+                html = content.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            html = content.decode('utf-8', errors='replace')
+        pages.append(CorpusPage(os.path.basename(path), html))
+    return pages
+
+
+def random_phone(rng, area_codes, mobile=False):
+    """番号計画に沿った電話番号 (数字のみ)"""
+    if mobile:
+        return rng.choice(['090', '080', '070']) + ''.join(rng.choice('0123456789') for _ in range(8))
+    code = rng.choice(area_codes)
+    return code + ''.join(rng.choice('0123456789') for _ in range(10 - len(code)))
+
+
+def format_phone(rng, digits):
+    """ハイフン区切り・全角などの表記揺れを付ける"""
+    if digits.startswith(('070', '080', '090')):
+        formatted = f"{digits[:3]}-{digits[3:7]}-{digits[7:]}"
+    else:
+        cut = 2 if digits.startswith(('03', '06')) else 4 if len(digits) > 3 and rng.random() < 0.5 else 3
+        formatted = f"{digits[:cut]}-{digits[cut:6]}-{digits[6:]}"
+    if rng.random() < 0.15:
+        formatted = formatted.translate(TO_FULL_WIDTH)
+    return formatted
+
+
+def company_page(rng, site_id, area_codes, placement, paragraph_count, links=''):
+    """会社HPを模したページ。placement で番号の位置 (table / footer / text / none) を指定する"""
+    phone = random_phone(rng, area_codes, mobile=rng.random() < 0.1)
+    formatted = format_phone(rng, phone)
+    # header / nav / script の中の番号は抽出対象外 (抽出されたら誤り)
+    decoy = format_phone(rng, random_phone(rng, area_codes))
+    script = 'var config = {"items": [' + ','.join(f'{{"id": {i}, "name": "item{i}"}}' for i in range(rng.randint(20, 400))) + ']};'
+    body = ''.join(f'<p>{rng.choice(PARAGRAPHS)}</p>' for _ in range(paragraph_count))
+    table = footer = text = ''
+    if placement == 'table':
+        table = f'<table class="company"><tr><th>会社名</th><td>株式会社サンプル{site_id}</td></tr><tr><th>電話番号</th><td>{formatted}</td></tr></table>'
+    elif placement == 'footer':
+        footer = f'<address>〒100-0001 東京都千代田区1-1 TEL: {formatted}</address>'
+    elif placement == 'text':
+        text = f'<p>お電話でのお問い合わせは {formatted} までお願いいたします。</p>'
+    html = (
+        f'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>株式会社サンプル{site_id}</title>'
+        f'<style>body{{margin:0}} .c{site_id}{{color:#333}}</style><script>{script}</script></head><body>'
+        f'<header><div class="logo">株式会社サンプル{site_id}</div><div class="tel">代表 {decoy}</div></header>'
+        f'<nav><ul><li><a href="/">ホーム</a></li><li><a href="/company/">会社概要</a></li><li><a href="/recruit/">採用</a></li></ul></nav>'
+        f'<main><h1>株式会社サンプル{site_id}</h1>{body}{text}{table}{links}</main>'
+        f'<aside><a href="/news/">お知らせ</a></aside>'
+        f'<footer>{footer}<p>Copyright 株式会社サンプル{site_id}</p></footer></body></html>'
+    )
+    return CorpusPage(f'company_{site_id:04d}.html', html, phone if placement != 'none' else None)
+
+
+def make_company_pages(count=50, seed=0, area_codes=None):
+    """大小さまざまな合成会社ページを生成する"""
+    rng = random.Random(seed)
+    area_codes = list(area_codes or load_area_codes())
+    placements = ['table', 'footer', 'text', 'none']
+    return [
+        company_page(rng, site_id, area_codes, rng.choice(placements), rng.choice([5, 20, 80, 300, 1200]))
+        for site_id in range(count)
+    ]
+
+
+# --- ★★★ パイプライン全体のベンチマーク用: 複数ページの合成サイトと Yahoo検索結果ページ ★★★ ---
+# サイトの種類 (電話番号の置き場所): top=トップ / overview=会社概要 / detail=会社概要の下のアクセス /
+# sitemap=サイトマップにだけ載っているページ / yahoo=HPに番号なし (Yahoo検索で見つかるかどうかは yahoo_kind) / no_hp=HPなし
+SITE_KINDS = ('top', 'overview', 'detail', 'sitemap', 'yahoo', 'no_hp')
+SITE_KIND_WEIGHTS = (30, 20, 10, 10, 15, 15)
+YAHOO_KINDS = ('spot', 'algo', 'none') # spot=ダイレクト検索のスポット情報 / algo=検索結果一覧 / none=見つからない
+YAHOO_KIND_WEIGHTS = (50, 30, 20)
+
+
+class CompanySite:
+    """合成サイト1件 (pages はサイトのディレクトリからの相対パス: HTML)"""
+    __slots__ = ('site_id', 'name', 'address', 'kind', 'yahoo_kind', 'phone', 'formatted_phone', 'pages', 'sitemap_paths')
+
+    def __init__(self, site_id, name, address, kind, yahoo_kind, phone, formatted_phone, pages, sitemap_paths):
+        self.site_id = site_id
+        self.name = name
+        self.address = address
+        self.kind = kind
+        self.yahoo_kind = yahoo_kind
+        self.phone = phone
+        self.formatted_phone = formatted_phone
+        self.pages = pages
+        self.sitemap_paths = sitemap_paths
+
+    @property
+    def path(self):
+        return f'/s{self.site_id:04d}/'
+
+    @property
+    def expected_phone(self):
+        """正解の電話番号 (数字のみ。見つからないのが正解の場合は None)"""
+        return None if self.kind in ('yahoo', 'no_hp') and self.yahoo_kind == 'none' else self.phone
+
+
+def _site_html(rng, name, decoy, body, nav_links, footer=''):
+    nav = ''.join(f'<li><a href="{href}">{text}</a></li>' for href, text in nav_links)
+    paragraphs = ''.join(f'<p>{rng.choice(PARAGRAPHS)}</p>' for _ in range(rng.choice([8, 20, 60])))
+    return (
+        f'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>{name}</title></head><body>'
+        f'<header><div class="logo">{name}</div><div class="tel">代表 {decoy}</div></header>'
+        f'<nav><ul>{nav}</ul></nav><main><h1>{name}</h1>{paragraphs}{body}</main>'
+        f'<footer>{footer}<p>Copyright {name}</p></footer></body></html>'
+    )
+
+
+def make_company_sites(count=200, seed=0, area_codes=None):
+    """種類の異なる合成サイトを決まった乱数で生成する"""
+    rng = random.Random(seed)
+    area_codes = list(area_codes or load_area_codes())
+    sites = []
+    for site_id in range(count):
+        kind = rng.choices(SITE_KINDS, SITE_KIND_WEIGHTS)[0]
+        yahoo_kind = rng.choices(YAHOO_KINDS, YAHOO_KIND_WEIGHTS)[0] if kind in ('yahoo', 'no_hp') else None
+        phone = random_phone(rng, area_codes, mobile=rng.random() < 0.1)
+        formatted = format_phone(rng, phone)
+        decoy = format_phone(rng, random_phone(rng, area_codes))
+        name = f'株式会社ベンチ{site_id:04d}'
+        address = f'東京都千代田区丸の内{site_id // 100 + 1}-{site_id % 100 + 1}'
+        table = f'<table><tr><th>会社名</th><td>{name}</td></tr><tr><th>電話番号</th><td>{formatted}</td></tr></table>'
+        nav = [('./', 'ホーム'), ('recruit/', '採用情報')]
+        pages = {'recruit/': _site_html(rng, name, decoy, '<p>採用情報</p>', nav)}
+        sitemap_paths = ['', 'recruit/']
+        if kind == 'top':
+            pages[''] = _site_html(rng, name, decoy, '', nav + [('company/', '会社概要')], f'<address>{address} TEL: {formatted}</address>')
+            pages['company/'] = _site_html(rng, name, decoy, table, nav)
+        elif kind in ('overview', 'detail', 'yahoo'):
+            pages[''] = _site_html(rng, name, decoy, '', nav + [('company/', '会社概要')])
+            overview_body = table if kind == 'overview' else '<p><a href="access/">アクセス</a></p>'
+            pages['company/'] = _site_html(rng, name, decoy, overview_body, nav)
+            pages['company/access/'] = _site_html(rng, name, decoy, table if kind == 'detail' else f'<p>{address}</p>', nav)
+            sitemap_paths += ['company/', 'company/access/']
+        elif kind == 'sitemap':
+            pages[''] = _site_html(rng, name, decoy, '', nav)
+            pages['gaiyou/'] = _site_html(rng, name, decoy, table, nav)
+            sitemap_paths.append('gaiyou/')
+        sites.append(CompanySite(site_id, name, address, kind, yahoo_kind, phone, formatted, pages, sitemap_paths))
+    return sites
+
+
+def yahoo_spot_page(name, formatted_phone):
+    """Yahoo検索(ダイレクト)のスポット情報付きの結果ページ"""
+    digits = formatted_phone.translate(str.maketrans('０１２３４５６７８９－', '0123456789-'))
+    return (
+        '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>検索結果</title></head><body>'
+        f'<div class="AnswerLocalSpot"><h2>{name}</h2>'
+        '<p><span class="AnswerLocalSpot__subInfoSpotDetail">住所：</span><span>東京都千代田区</span></p>'
+        f'<p><span class="AnswerLocalSpot__subInfoSpotDetail">電話：</span><span>{digits}</span></p></div>'
+        + yahoo_algo_blocks([f'{name}の公式サイトです。'] * 3) + '</body></html>'
+    )
+
+
+def yahoo_algo_blocks(texts):
+    return ''.join(f'<div class="Algo"><a href="#">検索結果</a><p>{text}</p></div>' for text in texts)
+
+
+def yahoo_results_page(texts):
+    """Yahoo検索(一覧)の結果ページ (div.Algo が並ぶ)"""
+    return ('<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>検索結果</title></head><body>'
+            + yahoo_algo_blocks(texts) + '</body></html>')
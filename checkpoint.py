@@ -0,0 +1,85 @@
+# checkpoint.py
+# 処理結果のチェックポイント (SQLite, 追記のみ)
+# 入力ファイルのハッシュと行インデックスをキーに1行ずつ記録し、同じファイルを再アップロードした時に続きから再開する
+import hashlib
+import sqlite3
+import threading
+import time
+from time_budget import ROW_TIMEOUT_VALUE
+
+DEFAULT_CHECKPOINT_PATH = "checkpoint.sqlite3"
+# 結果ではない値 (再開時にもう一度処理する): タイムアウト / エラー(...)
+TRANSIENT_VALUES = (ROW_TIMEOUT_VALUE,)
+TRANSIENT_VALUE_PREFIX = 'エラー('
+_FINAL_VALUE_CONDITION = f"value NOT IN ({', '.join('?' * len(TRANSIENT_VALUES))}) AND value NOT LIKE ?"
+
+
+def is_final_value(value):
+    """チェックポイントに記録する (再開時に処理済みとする) 値か"""
+    return value not in TRANSIENT_VALUES and not str(value).startswith(TRANSIENT_VALUE_PREFIX)
+
+
+def file_digest(content):
+    """入力ファイル(バイト列)のハッシュ (チェックポイントのキー)"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def path_digest(path, block_size=1024 * 1024):
+    """入力ファイル(パス)のハッシュ。file_digest と同じ値を、ファイル全体をメモリに読み込まずに計算する"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """1つの入力ファイルの処理結果を行ごとに記録する (スレッド間で共有可能)"""
+    def __init__(self, file_hash, path=DEFAULT_CHECKPOINT_PATH):
+        self.file_hash = file_hash
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " file_hash TEXT, row_index TEXT, value TEXT, recorded_at REAL,"
+                " PRIMARY KEY (file_hash, row_index))"
+            )
+
+    def record(self, row_index, value):
+        """1行分の結果を記録する (記録済みの行はそのまま。タイムアウト・エラーは記録せず、再開時にもう一度処理する。
+        以前に記録されたタイムアウト・エラーは上書きする)"""
+        if not is_final_value(value):
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO results (file_hash, row_index, value, recorded_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (file_hash, row_index) DO UPDATE SET value = excluded.value, recorded_at = excluded.recorded_at"
+                f" WHERE NOT ({_FINAL_VALUE_CONDITION})",
+                (self.file_hash, str(row_index), value, time.time(), *TRANSIENT_VALUES, TRANSIENT_VALUE_PREFIX + '%'),
+            )
+
+    def load(self, row_indices):
+        """記録済みの結果を {行インデックス: 値} で返す (row_indices に含まれる行のみ)"""
+        keys = {str(row_index): row_index for row_index in row_indices}
+        with self._lock:
+            rows = self._conn.execute(f"SELECT row_index, value FROM results WHERE file_hash = ? AND {_FINAL_VALUE_CONDITION}",
+                                      (self.file_hash, *TRANSIENT_VALUES, TRANSIENT_VALUE_PREFIX + '%')).fetchall()
+        return {keys[key]: value for key, value in rows if key in keys}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM results WHERE file_hash = ? AND {_FINAL_VALUE_CONDITION}",
+                                      (self.file_hash, *TRANSIENT_VALUES, TRANSIENT_VALUE_PREFIX + '%')).fetchone()[0]
+
+    def clear(self):
+        """このファイルの記録を削除する (最初からやり直す場合)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE file_hash = ?", (self.file_hash,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,376 @@
+# cli.py
+# 電話番号補完のコマンドライン版 (Streamlitなしでバッチ実行する: cron / ジョブ実行基盤など)
+# ログ・進捗・実行統計は1行1件のJSON (JSON Lines) で標準出力に書き出す
+#   実行: python cli.py 入力.csv -o 出力.xlsx [--workers 2] [--no-cache] [--offline] ...
+#   大きなファイル: python cli.py 入力.csv -o 出力.parquet --stream [--chunk-size 2000] [--all-columns]
+#   分散処理: python cli.py 入力.csv -o 出力.xlsx --queue job_queue.sqlite3 [--queue-workers 3]  (作業単位をキューに登録し、結果を集める)
+#             python cli.py --queue-worker --queue redis://ホスト:6379/0 --job <ジョブID>  (他のホストからワーカーとして参加する)
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from html_text import available_backends
+from page_cache import PageCache, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+from checkpoint import RunCheckpoint, path_digest
+from streaming_io import DEFAULT_CHUNK_SIZE
+from resource_policy import ResourcePolicy, DEFAULT_BLOCKED_TYPES, THIRD_PARTY_BLOCKED_HOSTS, PAGE_LOAD_STRATEGIES
+from driver_pool import RecyclePolicy, WarmDriverPool, DEFAULT_MAX_BROWSER_RSS_MB, DEFAULT_MAX_PAGES_PER_DRIVER
+from stage_metrics import StageMetrics, METRICS_FORMATS
+from stage_scheduler import StageScheduler, SCHEDULE_POLICIES, DEFAULT_SCHEDULE_POLICY
+from parse_pool import default_parse_workers
+from job_queue import DEFAULT_QUEUE_PATH, DEFAULT_LEASE_SECONDS, open_job_queue
+from time_budget import DEFAULT_ROW_BUDGET_SECONDS, Deadline
+from scraper_engine import (
+    DEFAULT_WORKER_COUNT, MAX_WORKER_COUNT, PAGE_CACHE_PATH, CHECKPOINT_PATH, STAGE_METRICS_PATH, STAGE_ESTIMATES_PATH,
+    AREA_CODE_CSV_PATH,
+    load_area_codes, read_input_table, run_scraping_process, run_streaming_process, run_queue_coordinator, run_queue_worker,
+)
+
+COMPLETED_MESSAGES = ("完了", "処理対象なし")
+QUEUE_WORKER_LOG_DIR = "logs" # --queue-workers で起動したワーカーの出力先
+PROXY_PASS_ENV = "SCRAPER_PROXY_PASS" # プロキシのパスワードを渡す環境変数 (起動するワーカーにもこれで渡す)
+
+
+class JsonLinesSink:
+    """ログ・進捗・統計を JSON Lines で出力する (info/success/warning/error は処理本体のログ出力先として使う)"""
+    def __init__(self, stream=None, quiet=False):
+        self._stream = stream or sys.stdout
+        self._quiet = quiet
+        self._lock = threading.Lock()
+
+    def emit(self, event_type, **fields):
+        record = {"type": event_type, "time": round(time.time(), 3), **fields}
+        with self._lock:
+            self._stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._stream.flush()
+
+    def _log(self, level, message):
+        if not self._quiet or level == 'error':
+            self.emit("log", level=level, message=message)
+
+    def info(self, message): self._log('info', message)
+    def success(self, message): self._log('success', message)
+    def warning(self, message): self._log('warning', message)
+    def error(self, message): self._log('error', message)
+
+    def stats(self, stats):
+        self.emit("stats", **stats)
+
+
+def default_output_path(input_path):
+    base, _ = os.path.splitext(input_path)
+    return f"{base}_番号抽出完了.xlsx"
+
+
+def write_output(df, path):
+    """拡張子に応じて CSV (UTF-8 BOM付き) または Excel で保存する"""
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    else:
+        df.to_excel(path, index=False, sheet_name='Sheet1', engine='openpyxl')
+
+
+def write_metrics(args, sink):
+    """ステージ別の計測値をファイルに書き出し、metrics イベントとしても出力する (実行順の見積もり用の実測値も更新する)"""
+    try:
+        args.stage_metrics.write(args.metrics_path, args.metrics_format)
+        args.stage_scheduler.save()
+    except OSError as e:
+        sink.warning(f"ステージ別の計測値を保存できませんでした: {e}")
+    sink.emit("metrics", path=args.metrics_path, stages=args.stage_metrics.snapshot())
+
+
+def queue_worker_options(args):
+    """コーディネーターの設定のうち、起動するワーカーにも渡すもの (cli.py の引数のリスト)"""
+    options = ['--workers', str(args.workers), '--area-codes', args.area_codes, '--parse-workers', str(args.parse_workers),
+               '--cache-path', args.cache_path, '--cache-ttl-days', str(args.cache_ttl_days), '--cache-max-mb', str(args.cache_max_mb),
+               '--block-resources', args.block_resources, '--page-load-strategy', args.page_load_strategy,
+               '--max-browser-mb', str(args.max_browser_mb), '--max-pages-per-browser', str(args.max_pages_per_browser),
+               '--schedule', args.schedule, '--stage-estimates-path', args.stage_estimates_path, '--lease-seconds', str(args.lease_seconds),
+               '--row-budget', str(args.row_budget)]
+    for flag, enabled in (('--no-http-fetch', args.no_http_fetch), ('--no-sitemap', args.no_sitemap), ('--no-cache', args.no_cache),
+                          ('--allow-third-party', args.allow_third_party), ('--no-standby', args.no_standby),
+                          ('--disable-headless', args.disable_headless), ('--quiet', args.quiet)):
+        if enabled:
+            options.append(flag)
+    # プロキシのパスワードはコマンドライン (ps 等で見える) に載せず、spawn_queue_workers の proxy_pass で環境変数として渡す
+    for flag, value in (('--html-backend', args.html_backend), ('--proxy-host', args.proxy_host), ('--proxy-port', args.proxy_port),
+                        ('--proxy-user', args.proxy_user)):
+        if value:
+            options += [flag, value]
+    return options
+
+
+def deadline_options(run_deadline):
+    """実行全体の締め切りの残り時間を、起動するワーカーの --deadline-minutes にする (締め切りがなければ空のリスト)"""
+    if run_deadline is None or run_deadline.expires_at is None:
+        return []
+    return ['--deadline-minutes', f"{max(run_deadline.remaining(), 0.01) / 60:.4f}"]
+
+
+def queue_worker_metrics_path(metrics_path, number):
+    """spawn_queue_workers で起動した number 番目のワーカーが計測値を書き出すファイル"""
+    base, extension = os.path.splitext(metrics_path)
+    return f"{base}.{number}{extension}"
+
+
+def spawn_queue_workers(queue_url, job_id, count, options=(), log_dir=QUEUE_WORKER_LOG_DIR, metrics_path=STAGE_METRICS_PATH, proxy_pass=None):
+    """このマシンでワーカーのプロセス (cli.py --queue-worker) を count 個起動する。出力は log_dir のワーカーごとのファイルに書き出す
+    proxy_pass (プロキシのパスワード) は環境変数 PROXY_PASS_ENV で渡す。起動した subprocess.Popen のリストを返す"""
+    os.makedirs(log_dir, exist_ok=True)
+    env = {**os.environ, PROXY_PASS_ENV: proxy_pass} if proxy_pass else None
+    processes = []
+    for number in range(1, count + 1):
+        worker_name = f"{socket.gethostname()}-{os.getpid()}-{number}"
+        with open(os.path.join(log_dir, f"queue_worker_{job_id[:12]}_{number}.jsonl"), 'a', encoding='utf-8') as log_file:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--queue-worker', '--queue', queue_url, '--job', job_id, '--worker-name', worker_name,
+                 '--metrics-path', queue_worker_metrics_path(metrics_path, number), *options],
+                stdout=log_file, stderr=subprocess.STDOUT, env=env,
+            ))
+    return processes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='電話番号 自動補完 (コマンドライン版)。進捗と実行統計を JSON Lines で標準出力に書き出す')
+    parser.add_argument('input', nargs='?', help='処理対象ファイル (電話番号, [HP], [屋号], [住所/所在地] 列を含む CSV / XLSX / XLS。--queue-worker では不要)')
+    parser.add_argument('-o', '--output', help='出力ファイル (.csv / .xlsx / --stream では .parquet も可)。省略時は <入力ファイル名>_番号抽出完了.xlsx')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKER_COUNT, help=f'同時に動かすブラウザ数 (1〜{MAX_WORKER_COUNT})')
+    parser.add_argument('--area-codes', default=AREA_CODE_CSV_PATH, help='市外局番リスト (CSV)')
+    parser.add_argument('--no-http-fetch', action='store_true', help='軽量HTTP取得を使わず、全てのページをブラウザで読み込む')
+    parser.add_argument('--html-backend', choices=available_backends(), help='HTML解析エンジン (省略時は使える中で最も速いもの)')
+    parser.add_argument('--parse-workers', type=int, default=default_parse_workers(),
+                        help='HTML解析・電話番号抽出を行う別プロセスの数 (0 で使わない。既定はCPUコア数 - 1, 最大4)')
+    parser.add_argument('--no-sitemap', action='store_true', help='robots.txt / sitemap.xml から会社概要ページを探さない')
+    parser.add_argument('--no-cache', action='store_true', help='ページキャッシュを使わない')
+    parser.add_argument('--cache-path', default=PAGE_CACHE_PATH)
+    parser.add_argument('--cache-ttl-days', type=float, default=DEFAULT_TTL_SECONDS / 86400, help='ページキャッシュの有効期限 (日)')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help='ページキャッシュの最大サイズ (MB)')
+    parser.add_argument('--offline', action='store_true', help='オフライン再抽出モード (キャッシュ済みのページのみから抽出する)')
+    parser.add_argument('--checkpoint-path', default=CHECKPOINT_PATH)
+    parser.add_argument('--no-resume', action='store_true', help='途中結果があっても最初からやり直す')
+    parser.add_argument('--block-resources', default=','.join(DEFAULT_BLOCKED_TYPES),
+                        help="ブラウザで読み込まないリソースの種類 (image,font,stylesheet,media をカンマ区切りで指定。'none' で制限なし)")
+    parser.add_argument('--allow-third-party', action='store_true', help='広告・アクセス解析などの外部スクリプトをブロックしない')
+    parser.add_argument('--page-load-strategy', choices=PAGE_LOAD_STRATEGIES, default='eager')
+    parser.add_argument('--max-browser-mb', type=int, default=DEFAULT_MAX_BROWSER_RSS_MB,
+                        help='ブラウザ1台 (Chrome の全プロセス) のメモリ使用量の上限 (MB)。超えたらブラウザを入れ替える (0 で無制限)')
+    parser.add_argument('--max-pages-per-browser', type=int, default=DEFAULT_MAX_PAGES_PER_DRIVER,
+                        help='ブラウザ1台で読み込むページ数の上限。超えたらブラウザを入れ替える (0 で無制限)')
+    parser.add_argument('--no-standby', action='store_true', help='入れ替え用のブラウザを裏で起動しておかない (メモリ節約)')
+    parser.add_argument('--schedule', choices=SCHEDULE_POLICIES, default=DEFAULT_SCHEDULE_POLICY,
+                        help='検索ステージの実行順 (fixed: 従来どおり HP → Yahoo / accuracy: 全ステージを実行し順番のみ調整 / speed: 発見率の低いステージを省略)')
+    parser.add_argument('--stage-estimates-path', default=STAGE_ESTIMATES_PATH,
+                        help="実行順の見積もりに使うステージごとの実測値 (実行ごとに更新する。'' で記録しない)")
+    parser.add_argument('--metrics-path', default=STAGE_METRICS_PATH, help='ステージ別の所要時間・発見率等の出力先')
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, default='json',
+                        help='ステージ別の計測値の形式 (prometheus: node_exporter の textfile collector 等で読み込むテキスト形式)')
+    parser.add_argument('--row-budget', type=float, default=DEFAULT_ROW_BUDGET_SECONDS,
+                        help='1件あたりの処理時間の上限 (秒)。検索ステージに配分し、超えた行は「タイムアウト」と記録する (0 で無制限)')
+    parser.add_argument('--deadline-minutes', type=float, default=0,
+                        help='実行全体の締め切り (分)。過ぎたら処理中の行を打ち切り、途中までの結果を出力する (0 で無制限)')
+    parser.add_argument('--disable-headless', action='store_true', help='ヘッドレスモードを無効化 (デバッグ用)')
+    parser.add_argument('--proxy-host'); parser.add_argument('--proxy-port')
+    parser.add_argument('--proxy-user')
+    parser.add_argument('--proxy-pass', default=os.environ.get(PROXY_PASS_ENV) or None,
+                        help=f'プロキシのパスワード (省略時は環境変数 {PROXY_PASS_ENV}。コマンドラインは他のユーザーからも見えるため環境変数を推奨)')
+    parser.add_argument('--stream', action='store_true', help='大きなファイル用: 一定行数ずつ読み込み、処理が終わった分から書き出す (CSV / XLSX 入力のみ)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='--stream で一度に処理する行数')
+    parser.add_argument('--all-columns', action='store_true', help='--stream で全ての列を書き出す (省略時は行番号と処理に使う列のみ)')
+    parser.add_argument('--queue', help=f'分散処理: 作業単位を登録するジョブキュー (SQLite のファイルパス (例: {DEFAULT_QUEUE_PATH}) / redis://ホスト:ポート/DB番号)')
+    parser.add_argument('--queue-workers', type=int, default=1,
+                        help='--queue: このマシンで起動するワーカーのプロセス数 (0 で起動せず、他で起動したワーカーの結果を待つ)')
+    parser.add_argument('--queue-worker', action='store_true', help='ワーカーとして --queue の --job の作業単位を処理する (入力ファイルは不要)')
+    parser.add_argument('--job', help='ジョブID (省略時は入力ファイルの内容から決める。ワーカーには必須)')
+    parser.add_argument('--worker-name', help='ワーカー名 (省略時はホスト名とプロセスID)')
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                        help='作業単位のリースの期限 (秒)。この間ワーカーから応答がなければ他のワーカーに割り当て直す')
+    parser.add_argument('--quiet', action='store_true', help='詳細ログを出力しない (エラー・進捗・統計のみ)')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.queue_worker and not (args.queue and args.job):
+        parser.error('--queue-worker には --queue と --job が必要です')
+    if not args.queue_worker and not args.input:
+        parser.error('処理対象ファイルを指定してください')
+    if args.queue and (args.stream or args.offline):
+        parser.error('--queue は --stream / --offline と同時に使えません')
+    sink = JsonLinesSink(quiet=args.quiet)
+
+    try:
+        blocked_types = [] if args.block_resources.strip() == 'none' else [t.strip() for t in args.block_resources.split(',') if t.strip()]
+        args.resource_policy = ResourcePolicy(blocked_types, () if args.allow_third_party else THIRD_PARTY_BLOCKED_HOSTS, args.page_load_strategy)
+    except ValueError as e:
+        sink.error(str(e))
+        return 2
+    args.recycle_policy = RecyclePolicy(args.max_browser_mb, args.max_pages_per_browser, not args.no_standby)
+    args.stage_metrics = StageMetrics()
+    args.stage_scheduler = StageScheduler(args.schedule, args.stage_metrics, None if args.offline else args.stage_estimates_path or None)
+    args.run_deadline = Deadline.after(args.deadline_minutes * 60) # 入力の読み込みも含めて数える
+
+    if args.queue_worker:
+        return run_worker(args, sink)
+    try:
+        area_codes_set, _ = load_area_codes(args.area_codes)
+        file_hash = path_digest(args.input)
+        df = None if args.stream else read_input_table(args.input, args.input)[0]
+    except Exception as e:
+        sink.error(f"入力ファイルの読み込みに失敗しました: {e}")
+        return 2
+    sink.info(f"市外局番 {len(area_codes_set)} 件を読み込みました。" + ("" if df is None else f" (入力 {len(df)} 行)"))
+
+    page_cache = None
+    if not args.no_cache or args.offline:
+        page_cache = PageCache(args.cache_path, ttl_seconds=None if args.offline else args.cache_ttl_days * 24 * 3600,
+                               max_bytes=args.cache_max_mb * 1024 * 1024)
+    checkpoint = RunCheckpoint(file_hash + (':offline' if args.offline else ''), args.checkpoint_path)
+    if args.no_resume:
+        checkpoint.clear()
+
+    proxy_settings = {"proxy_host": args.proxy_host, "proxy_port": args.proxy_port,
+                      "proxy_user": args.proxy_user, "proxy_pass": args.proxy_pass}
+    output_path = args.output or default_output_path(args.input)
+    if args.queue:
+        checkpoint.close()
+        if page_cache:
+            page_cache.close() # ページキャッシュはワーカーが開く
+        return run_coordinator(args, sink, output_path, df, file_hash)
+    if args.stream:
+        return run_stream(args, sink, output_path, proxy_settings, area_codes_set, page_cache, checkpoint)
+
+    final_df, message = None, ""
+    try:
+        for rate, message, df_result in run_scraping_process(df, sink, proxy_settings, args.disable_headless, area_codes_set,
+                                                              args.workers, not args.no_http_fetch, args.html_backend,
+                                                              page_cache, args.offline, checkpoint, sink, sink.stats, args.resource_policy,
+                                                              args.recycle_policy, not args.no_sitemap,
+                                                              stage_metrics=args.stage_metrics, stage_scheduler=args.stage_scheduler,
+                                                              parse_workers=args.parse_workers, row_budget_seconds=args.row_budget,
+                                                              run_deadline=args.run_deadline):
+            sink.emit("progress", rate=round(rate, 4), message=message)
+            if df_result is not None:
+                final_df = df_result
+    finally:
+        if page_cache:
+            page_cache.close()
+        checkpoint.close()
+        write_metrics(args, sink)
+
+    if final_df is not None:
+        write_output(final_df, output_path)
+        sink.emit("output", path=output_path, rows=len(final_df))
+    completed = message.startswith(COMPLETED_MESSAGES)
+    sink.emit("finished", completed=completed, message=message)
+    return 0 if completed else 1
+
+
+def run_stream(args, sink, output_path, proxy_settings, area_codes_set, page_cache, checkpoint):
+    """--stream: チャンクごとに処理して出力ファイルに追記する (ブラウザはチャンクの間も起動したままにする)"""
+    message, completed, rows_written = "", False, 0
+    warm_driver_pool = WarmDriverPool()
+    try:
+        for rows_written, message, completed in run_streaming_process(args.input, output_path, sink, proxy_settings, args.disable_headless, area_codes_set,
+                                                                      args.workers, not args.no_http_fetch, args.html_backend, page_cache, args.offline,
+                                                                      checkpoint, sink, sink.stats, args.chunk_size, args.all_columns,
+                                                                      args.resource_policy, args.recycle_policy, not args.no_sitemap,
+                                                                      stage_metrics=args.stage_metrics, stage_scheduler=args.stage_scheduler,
+                                                                      parse_workers=args.parse_workers, row_budget_seconds=args.row_budget,
+                                                                      run_deadline=args.run_deadline, warm_driver_pool=warm_driver_pool):
+            sink.emit("progress", rows_written=rows_written, message=message)
+    except Exception as e:
+        sink.error(f"ストリーミング処理に失敗しました: {e}")
+    finally:
+        warm_driver_pool.clear()
+        if page_cache:
+            page_cache.close()
+        checkpoint.close()
+        write_metrics(args, sink)
+
+    sink.emit("output", path=output_path, rows=rows_written)
+    sink.emit("finished", completed=completed, message=message)
+    return 0 if completed else 1
+
+
+def run_coordinator(args, sink, output_path, df, file_hash):
+    """--queue: 作業単位をジョブキューに登録し、ワーカー (--queue-workers 個をこのマシンで起動) の結果を集めて出力する"""
+    job_id = args.job or file_hash
+    try:
+        job_queue = open_job_queue(args.queue)
+    except Exception as e:
+        sink.error(f"ジョブキューを開けませんでした: {e}")
+        return 2
+    if args.no_resume:
+        job_queue.clear(job_id)
+    sink.emit("job", queue=args.queue, job_id=job_id)
+
+    processes = []
+    def start_workers():
+        processes.extend(spawn_queue_workers(args.queue, job_id, args.queue_workers, queue_worker_options(args) + deadline_options(args.run_deadline),
+                                             metrics_path=args.metrics_path, proxy_pass=args.proxy_pass))
+    live_workers = (lambda: sum(process.poll() is None for process in processes)) if args.queue_workers > 0 else None
+    final_df, message = None, ""
+    try:
+        for rate, message, df_result in run_queue_coordinator(df, job_queue, job_id, sink, sink, live_workers, start_workers,
+                                                              run_deadline=args.run_deadline):
+            sink.emit("progress", rate=round(rate, 4), message=message)
+            if df_result is not None:
+                final_df = df_result
+    finally:
+        for process in processes:
+            if not message.startswith(COMPLETED_MESSAGES) and process.poll() is None:
+                process.terminate() # 締め切り・中断時 (完了時はワーカーは自分で終了する)
+        for process in processes:
+            process.wait()
+        job_queue.close()
+
+    if final_df is not None:
+        write_output(final_df, output_path)
+        sink.emit("output", path=output_path, rows=len(final_df))
+    completed = message.startswith(COMPLETED_MESSAGES)
+    sink.emit("finished", completed=completed, message=message, job_id=job_id)
+    return 0 if completed else 1
+
+
+def run_worker(args, sink):
+    """--queue-worker: ジョブキューの作業単位を、他のワーカーと分担して処理する"""
+    try:
+        area_codes_set, _ = load_area_codes(args.area_codes)
+        job_queue = open_job_queue(args.queue)
+    except Exception as e:
+        sink.error(f"ワーカーの起動に失敗しました: {e}")
+        return 2
+    page_cache = None
+    if not args.no_cache:
+        page_cache = PageCache(args.cache_path, ttl_seconds=args.cache_ttl_days * 24 * 3600, max_bytes=args.cache_max_mb * 1024 * 1024)
+    proxy_settings = {"proxy_host": args.proxy_host, "proxy_port": args.proxy_port,
+                      "proxy_user": args.proxy_user, "proxy_pass": args.proxy_pass}
+    worker_name = args.worker_name or f"{socket.gethostname()}-{os.getpid()}"
+
+    message, finished = "", False
+    try:
+        for completed_units, message, finished in run_queue_worker(job_queue, args.job, worker_name, sink, proxy_settings, args.disable_headless,
+                                                                   area_codes_set, args.workers, not args.no_http_fetch, args.html_backend,
+                                                                   page_cache, sink, args.resource_policy, args.recycle_policy, not args.no_sitemap,
+                                                                   args.stage_metrics, args.stage_scheduler, args.parse_workers, args.lease_seconds,
+                                                                   row_budget_seconds=args.row_budget, run_deadline=args.run_deadline):
+            sink.emit("progress", units=completed_units, message=message)
+    finally:
+        if page_cache:
+            page_cache.close()
+        job_queue.close()
+        write_metrics(args, sink)
+
+    completed = finished and message.startswith(COMPLETED_MESSAGES)
+    sink.emit("finished", completed=completed, message=message, worker=worker_name)
+    return 0 if completed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
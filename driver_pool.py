@@ -0,0 +1,275 @@
+# driver_pool.py
+# ワーカーごとのブラウザの入れ替え (メモリ対策)
+# 一定件数ごとの再起動ではなく、Chrome のプロセスツリー全体のメモリ使用量(RSS)とページ数の上限で入れ替える
+# 入れ替え用のブラウザを裏で起動しておき、入れ替え時のブラウザ起動待ちをなくす
+# 実行の終わったブラウザは WarmDriverPool に預けて、次の実行 (Streamlit の再実行) の起動待ちをなくす
+import atexit
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+DEFAULT_MAX_BROWSER_RSS_MB = 1024 # ブラウザ1台 (chromedriver + Chrome の全プロセス) の合計RSSの上限
+DEFAULT_MAX_PAGES_PER_DRIVER = 200 # 1台のブラウザで読み込むページ数の上限
+DEFAULT_MAX_WARM_DRIVERS = 8 # 実行をまたいで起動したままにするブラウザの台数の上限
+DEFAULT_WARM_IDLE_SECONDS = 600 # 使われないまま預けておく秒数の上限 (超えたら終了する)
+
+
+class RecyclePolicy:
+    """ブラウザを入れ替える条件と、入れ替え用の待機ブラウザを使うか"""
+    __slots__ = ('max_rss_mb', 'max_pages', 'use_standby')
+
+    def __init__(self, max_rss_mb=DEFAULT_MAX_BROWSER_RSS_MB, max_pages=DEFAULT_MAX_PAGES_PER_DRIVER, use_standby=True):
+        self.max_rss_mb = max_rss_mb
+        self.max_pages = max_pages
+        self.use_standby = use_standby
+
+
+DEFAULT_RECYCLE_POLICY = RecyclePolicy()
+
+
+# --- ★★★ プロセスツリーのメモリ使用量 ★★★ ---
+def _linux_children_map():
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # "pid (comm) state ppid ..." : comm に空白や括弧が入る場合があるため最後の ')' の後ろを読む
+        ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(name))
+    return children
+
+
+def _linux_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_tree_rss(pid):
+    """pid とその子孫プロセスの合計RSS[バイト] (測れない環境では None)"""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    if not os.path.isdir('/proc'):
+        return None
+    children = _linux_children_map()
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += _linux_rss(current)
+        pending.extend(children.get(current, ()))
+    return total
+
+
+def driver_process_id(driver):
+    """chromedriver のプロセスID (Chrome はその子プロセス)"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return getattr(process, 'pid', None)
+
+
+def _quit_quietly(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def driver_is_alive(driver):
+    """ブラウザが応答するか (起動後・預けている間に落ちていないか確認する)"""
+    try:
+        driver.window_handles
+        return True
+    except Exception:
+        return False
+
+
+# --- ★★★ 実行をまたいで使い回すブラウザ ★★★ ---
+class WarmDriverPool:
+    """実行の終わったワーカーのブラウザを起動したまま預かり、次の実行のワーカーに渡す (スレッド間で共有する)
+    ブラウザは起動時の設定 (key) ごとに預かり、取り出す時に応答を確認する。max_idle_seconds 秒使われなかったものは終了する"""
+    def __init__(self, max_idle=DEFAULT_MAX_WARM_DRIVERS, max_idle_seconds=DEFAULT_WARM_IDLE_SECONDS):
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.reused = 0 # 預けていたブラウザを渡した回数
+        self._lock = threading.Lock()
+        self._idle = [] # (key, ブラウザ, ページ数, 預けた時刻)
+        self._reaper = None
+        atexit.register(self.clear)
+
+    def take(self, key):
+        """key の設定で起動したブラウザを1台取り出す。(ブラウザ, 読み込んだページ数) を返す (なければ (None, 0))"""
+        self._expire()
+        while True:
+            with self._lock:
+                entry = next((entry for entry in self._idle if entry[0] == key), None)
+                if entry is None:
+                    return None, 0
+                self._idle.remove(entry)
+            _, driver, pages, _ = entry
+            if driver_is_alive(driver):
+                self.reused += 1
+                return driver, pages
+            _quit_quietly(driver)
+
+    def put(self, key, driver, pages=0):
+        """ブラウザを預ける (応答しない・上限の台数を超える場合は終了する)"""
+        try:
+            driver.get('about:blank') # 前の実行のページを閉じておく
+        except Exception:
+            _quit_quietly(driver)
+            return False
+        with self._lock:
+            if len(self._idle) >= self.max_idle:
+                kept = False
+            else:
+                self._idle.append((key, driver, pages, time.monotonic()))
+                kept = True
+                if self._reaper is None:
+                    self._reaper = threading.Thread(target=self._reap, name="warm-driver-reaper", daemon=True)
+                    self._reaper.start()
+        if not kept:
+            _quit_quietly(driver)
+        return kept
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def _expire(self):
+        limit = time.monotonic() - self.max_idle_seconds
+        with self._lock:
+            expired = [entry for entry in self._idle if entry[3] < limit]
+            self._idle = [entry for entry in self._idle if entry[3] >= limit]
+        for entry in expired:
+            _quit_quietly(entry[1])
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, self.max_idle_seconds / 10))
+            self._expire()
+
+    def clear(self):
+        """預けている全てのブラウザを終了する"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            _quit_quietly(entry[1])
+
+
+# --- ★★★ ワーカー1台分のブラウザ ★★★ ---
+class RecyclingDriver:
+    """使用中のブラウザと、入れ替え用に裏で起動しておく待機ブラウザを管理する
+    launch は新しいブラウザを起動して返す関数 (失敗したら None)
+    warm_pool (WarmDriverPool) を渡すと、最初のブラウザは warm_key の設定で預けてあるものを使い、終了時には預け直す"""
+    def __init__(self, launch, policy=None, warm_pool=None, warm_key=None):
+        self._launch = launch
+        self.policy = policy or DEFAULT_RECYCLE_POLICY
+        self.warm_pool = warm_pool
+        self.warm_key = warm_key
+        self.warm_started = False # 預けてあったブラウザで始めたか
+        self.driver = None
+        self.pages = 0
+        self.recycle_count = 0
+        self._standby = None
+        self._standby_thread = None
+
+    def start(self):
+        if self.warm_pool is not None:
+            self.driver, self.pages = self.warm_pool.take(self.warm_key)
+            self.warm_started = self.driver is not None
+        if self.driver is None:
+            self.driver = self._launch()
+        if self.driver is not None:
+            self._prepare_standby()
+        return self.driver
+
+    def add_pages(self, count):
+        self.pages += count
+
+    def rss_bytes(self):
+        pid = driver_process_id(self.driver) if self.driver else None
+        return process_tree_rss(pid) if pid else None
+
+    def recycle_reason(self):
+        """入れ替えが必要な理由 (不要なら None)"""
+        if self.driver is None:
+            return None
+        if self.policy.max_pages and self.pages >= self.policy.max_pages:
+            return f"ページ数 {self.pages} 件"
+        if self.policy.max_rss_mb:
+            rss = self.rss_bytes()
+            if rss is not None and rss > self.policy.max_rss_mb * MB:
+                return f"メモリ使用量 {rss / MB:.0f}MB"
+        return None
+
+    def recycle(self):
+        """待機ブラウザに切り替え (なければ新しく起動し)、古いブラウザは裏で終了する。新しいブラウザ (失敗時は None) を返す"""
+        old_driver = self.driver
+        new_driver = self._take_standby() or self._launch()
+        if old_driver is not None:
+            threading.Thread(target=_quit_quietly, args=(old_driver,), daemon=True).start()
+        self.driver = new_driver
+        self.pages = 0
+        self.recycle_count += 1
+        if new_driver is not None:
+            self._prepare_standby()
+        return new_driver
+
+    def _prepare_standby(self):
+        if not self.policy.use_standby or self._standby_thread is not None:
+            return
+
+        def launch_standby():
+            standby = self.warm_pool.take(self.warm_key)[0] if self.warm_pool is not None else None
+            self._standby = standby or self._launch()
+
+        self._standby_thread = threading.Thread(target=launch_standby, name="standby-driver", daemon=True)
+        self._standby_thread.start()
+
+    def _take_standby(self):
+        if self._standby_thread is None:
+            return None
+        self._standby_thread.join()
+        standby, self._standby, self._standby_thread = self._standby, None, None
+        if standby is None:
+            return None
+        if not driver_is_alive(standby): # 起動後に落ちていないか確認する
+            _quit_quietly(standby)
+            return None
+        return standby
+
+    def close(self):
+        """ブラウザを終了する (warm_pool があれば、応答するブラウザは終了せずに預ける)"""
+        if self._standby_thread is not None:
+            self._standby_thread.join()
+        for driver, pages in ((self.driver, self.pages), (self._standby, 0)):
+            if driver is None:
+                continue
+            if self.warm_pool is not None and driver_is_alive(driver):
+                self.warm_pool.put(self.warm_key, driver, pages)
+            else:
+                _quit_quietly(driver)
+        self.driver = self._standby = self._standby_thread = None
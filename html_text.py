@@ -0,0 +1,367 @@
+# html_text.py
+# HTML解析バックエンド (lexbor / lxml / BeautifulSoup) の切り替え
+# 不要タグの除去・テキスト抽出・リンクの列挙だけを行い、変更可能な soup ツリーは作らない
+# (lexbor / lxml が未インストールの場合は BeautifulSoup(html.parser) を使う。bs4 は使う時に初めて読み込む)
+import re
+from urllib.parse import unquote
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+UNWANTED_TAGS = ('script', 'style', 'header', 'nav', 'aside')
+# Yahoo検索結果一覧のブロック (タグ, class)
+YAHOO_RESULT_BLOCKS = (('div', 'sw-CardBase'), ('div', 'Algo'), ('section', 'Algo'))
+# Yahoo検索結果のスポット情報 (「電話：」の次の span に番号がある)
+YAHOO_SPOT_DETAIL_CLASS = 'AnswerLocalSpot__subInfoSpotDetail'
+YAHOO_SPOT_PHONE_LABEL = '電話：'
+
+# --- ▼▼▼ 電話番号が載っている領域 (phone_tiers で優先順に返す) ▼▼▼ ---
+# 1. tel: リンク  2. <address>・<footer>・「TEL」「電話」の見出しの隣の表 / 定義リストのセル  3. schema.org の telephone  4. ページ全体
+PHONE_REGION_TAGS = ('address', 'footer')
+PHONE_LABEL_CELL_TAGS = ('th', 'td', 'dt')
+PHONE_VALUE_CELL_TAGS = ('td', 'dd')
+PHONE_LABEL_PATTERN = re.compile(r'TEL|電話', re.IGNORECASE)
+MAX_PHONE_LABEL_LENGTH = 20 # 見出しのセルとみなす文字数の上限
+TEL_HREF_PATTERN = re.compile(r'^tel:')
+JSON_LD_TELEPHONE_PATTERN = re.compile(r'"telephone"\s*:\s*"([^"]{5,40})"')
+
+
+def _soup(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+
+def _css_selector(blocks):
+    return ', '.join(f"{tag}.{css_class}" for tag, css_class in blocks)
+
+
+def _matches_link(href, text, text_keywords, href_keywords):
+    return bool(href and any(keyword in href for keyword in href_keywords)) or \
+        any(keyword in text for keyword in text_keywords)
+
+
+def _first_matching_href(links, text_keywords, href_keywords):
+    for href, text in links:
+        if _matches_link(href, text, text_keywords, href_keywords):
+            return href
+    return None
+
+
+def _domestic_number(number):
+    """国番号 +81 付きの番号を国内の表記 (0始まり) に戻す"""
+    return re.sub(r'^\s*\+81[-\s.]*(?:\(0\))?', '0', number)
+
+
+def _tel_number(href):
+    """tel: リンクの番号 (国番号は 0 に戻し、数字だけにする)"""
+    return re.sub(r'\D', '', _domestic_number(unquote(href[4:])))
+
+
+def _is_phone_label(text):
+    text = text.strip()
+    return len(text) <= MAX_PHONE_LABEL_LENGTH and PHONE_LABEL_PATTERN.search(text) is not None
+
+
+def json_ld_telephones(html):
+    """JSON-LD (schema.org) の "telephone" の値 (script は不要タグとして除くため、HTMLの文字列から直接探す)"""
+    return [_domestic_number(number) for number in JSON_LD_TELEPHONE_PATTERN.findall(html)]
+
+
+# --- ★★★ BeautifulSoup (html.parser) : 従来の処理 / フォールバック ★★★ ---
+class BeautifulSoupBackend:
+    name = 'bs4'
+
+    def page_text(self, html):
+        """不要タグを除いたページ全体のテキスト"""
+        soup = _soup(html)
+        for tag in soup(list(UNWANTED_TAGS)):
+            tag.decompose()
+        return soup.get_text()
+
+    def block_texts(self, html, blocks, limit=None):
+        """指定した (タグ, class) に一致する要素のテキストを文書順に返す"""
+        soup = _soup(html)
+        return [element.get_text() for element in soup.select(_css_selector(blocks))[:limit]]
+
+    def links(self, html):
+        """a要素の (href, リンク文字列) を文書順に返す"""
+        soup = _soup(html)
+        return [(a_tag.get('href'), a_tag.get_text()) for a_tag in soup.find_all('a')]
+
+    def find_link_href(self, html, text_keywords, href_keywords):
+        """文書順で最初にキーワードに一致した a要素の href (XPath版と同じ規則)"""
+        return _first_matching_href(self.links(html), text_keywords, href_keywords)
+
+    def phone_tiers(self, html):
+        """電話番号が載っていそうな領域のテキストを、優先順に1組ずつ返すジェネレーター (不要タグの内側は除く)
+        呼び出し元が番号を見つけた時点で止めれば、後の組 (最後はページ全体) は作らない"""
+        soup = _soup(html)
+        unwanted = list(UNWANTED_TAGS)
+        visible = lambda element: element.find_parent(unwanted) is None
+        yield [_tel_number(a_tag['href']) for a_tag in soup.find_all('a', href=TEL_HREF_PATTERN) if visible(a_tag)]
+
+        regions = []
+        for label in soup.find_all(list(PHONE_LABEL_CELL_TAGS)):
+            label_text = label.get_text()
+            if _is_phone_label(label_text) and visible(label):
+                value = label.find_next_sibling(list(PHONE_VALUE_CELL_TAGS))
+                if value is not None:
+                    regions.append(f"{label_text} {value.get_text()}")
+        regions += [element.get_text() for element in soup.find_all(list(PHONE_REGION_TAGS)) if visible(element)]
+        yield regions
+
+        yield [_domestic_number(element.get('content') or element.get_text())
+               for element in soup.find_all(attrs={'itemprop': 'telephone'}) if visible(element)] + json_ld_telephones(html)
+
+        for tag in soup(unwanted): # 不要タグの除去は、領域で見つからなかったページだけで行う
+            tag.decompose()
+        yield [soup.get_text()]
+
+
+def find_yahoo_spot_phone_text(html):
+    """保存済みのYahoo検索結果から、ブラウザ版のXPathと同じ規則でスポット情報の電話番号テキストを探す (なければ None)"""
+    soup = _soup(html)
+    for span in soup.find_all('span'):
+        if YAHOO_SPOT_DETAIL_CLASS not in ' '.join(span.get('class') or []):
+            continue
+        if any(str(text) == YAHOO_SPOT_PHONE_LABEL for text in span.find_all(string=True, recursive=False)):
+            phone_span = span.find_next_sibling('span')
+            return phone_span.get_text().strip() if phone_span else None
+    return None
+
+
+# --- ★★★ selectolax (lexbor) ★★★ ---
+class LexborBackend:
+    name = 'lexbor'
+
+    def page_text(self, html):
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(list(UNWANTED_TAGS))
+        return tree.root.text() if tree.root is not None else ''
+
+    def block_texts(self, html, blocks, limit=None):
+        tree = LexborHTMLParser(html)
+        return [node.text() for node in tree.css(_css_selector(blocks))[:limit]]
+
+    def links(self, html):
+        tree = LexborHTMLParser(html)
+        return [(node.attributes.get('href'), node.text()) for node in tree.css('a')]
+
+    def find_link_href(self, html, text_keywords, href_keywords):
+        return _first_matching_href(self.links(html), text_keywords, href_keywords)
+
+    @staticmethod
+    def _visible(node):
+        parent = node.parent
+        while parent is not None:
+            if parent.tag in UNWANTED_TAGS:
+                return False
+            parent = parent.parent
+        return True
+
+    def phone_tiers(self, html):
+        tree = LexborHTMLParser(html)
+        yield [_tel_number(node.attributes['href']) for node in tree.css('a[href^="tel:"]') if self._visible(node)]
+
+        regions = []
+        for label in tree.css(', '.join(PHONE_LABEL_CELL_TAGS)):
+            label_text = label.text()
+            if not (_is_phone_label(label_text) and self._visible(label)):
+                continue
+            value = label.next
+            while value is not None and value.tag not in PHONE_VALUE_CELL_TAGS:
+                value = value.next
+            if value is not None:
+                regions.append(f"{label_text} {value.text()}")
+        regions += [node.text() for node in tree.css(', '.join(PHONE_REGION_TAGS)) if self._visible(node)]
+        yield regions
+
+        yield [_domestic_number(node.attributes.get('content') or node.text())
+               for node in tree.css('[itemprop="telephone"]') if self._visible(node)] + json_ld_telephones(html)
+
+        tree.strip_tags(list(UNWANTED_TAGS))
+        yield [tree.root.text() if tree.root is not None else '']
+
+
+# --- ★★★ lxml : ツリーを作らずイベント(target)で処理する ★★★ ---
+class _LxmlTextTarget:
+    """不要タグの内側を読み飛ばしてテキストを集める"""
+    def __init__(self):
+        self.parts = []
+        self.skip_depth = 0
+
+    def start(self, tag, attrib):
+        if tag in UNWANTED_TAGS: self.skip_depth += 1
+
+    def end(self, tag):
+        if tag in UNWANTED_TAGS and self.skip_depth: self.skip_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth: self.parts.append(data)
+
+    def close(self):
+        return ''.join(self.parts)
+
+
+class _LxmlBlockTarget:
+    """(タグ, class) に一致する要素ごとにテキストを集める (入れ子の一致も個別に数える)"""
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.texts = []
+        self.stack = [] # 開いている要素ごとに、一致したブロックの番号 (一致しなければ None)
+        self.open_blocks = []
+
+    def start(self, tag, attrib):
+        classes = (attrib.get('class') or '').split()
+        if any(tag == block_tag and block_class in classes for block_tag, block_class in self.blocks):
+            self.texts.append([])
+            self.open_blocks.append(len(self.texts) - 1)
+            self.stack.append(len(self.texts) - 1)
+        else:
+            self.stack.append(None)
+
+    def end(self, tag):
+        if self.stack and self.stack.pop() is not None:
+            self.open_blocks.pop()
+
+    def data(self, data):
+        for block_number in self.open_blocks:
+            self.texts[block_number].append(data)
+
+    def close(self):
+        return [''.join(parts) for parts in self.texts]
+
+
+class _LxmlLinkTarget:
+    """a要素ごとに (href, テキスト) を文書順に集める"""
+    def __init__(self):
+        self.links = []
+        self.current = None
+
+    def start(self, tag, attrib):
+        if tag == 'a' and self.current is None:
+            self.current = [attrib.get('href'), []]
+
+    def end(self, tag):
+        if tag == 'a' and self.current is not None:
+            self.links.append((self.current[0], ''.join(self.current[1])))
+            self.current = None
+
+    def data(self, data):
+        if self.current is not None: self.current[1].append(data)
+
+    def close(self):
+        return self.links
+
+
+class _LxmlPhoneRegionTarget:
+    """1回の走査で、tel: リンク・電話番号の領域・schema.org の telephone・ページ全体のテキストを集める (不要タグの内側は除く)"""
+    def __init__(self):
+        self.text = _LxmlTextTarget()
+        self.tel_numbers = []
+        self.label_values = [] # 「TEL」「電話」の見出しのセル + 隣のセル
+        self.regions = [] # <address> / <footer>
+        self.schema = []
+        self.captures = [] # 開いている要素のうちテキストを集めるもの: [種類, タグ, テキスト, 深さ]
+        self.depth = 0
+        self.pending_label = None # 値のセルを待っている見出しのテキスト
+
+    def start(self, tag, attrib):
+        self.text.start(tag, attrib)
+        self.depth += 1
+        if self.text.skip_depth:
+            return
+        if tag == 'a' and (attrib.get('href') or '').startswith('tel:'):
+            self.tel_numbers.append(_tel_number(attrib['href']))
+        if attrib.get('itemprop') == 'telephone':
+            if attrib.get('content'):
+                self.schema.append(attrib['content'])
+            else:
+                self.captures.append(['schema', tag, [], self.depth])
+        if tag in PHONE_REGION_TAGS:
+            self.captures.append(['region', tag, [], self.depth])
+        if tag in PHONE_LABEL_CELL_TAGS or tag in PHONE_VALUE_CELL_TAGS:
+            self.captures.append(['cell', tag, [], self.depth])
+        elif tag in ('tr', 'dl'):
+            self.pending_label = None
+
+    def end(self, tag):
+        self.text.end(tag)
+        while self.captures and self.captures[-1][3] >= self.depth:
+            kind, capture_tag, parts, _ = self.captures.pop()
+            text = ''.join(parts)
+            if kind == 'schema':
+                self.schema.append(text)
+            elif kind == 'region':
+                self.regions.append(text)
+            elif self.pending_label is not None and capture_tag in PHONE_VALUE_CELL_TAGS:
+                self.label_values.append(f"{self.pending_label} {text}")
+                self.pending_label = None
+            elif capture_tag in PHONE_LABEL_CELL_TAGS and _is_phone_label(text):
+                self.pending_label = text
+        self.depth -= 1
+
+    def data(self, data):
+        self.text.data(data)
+        if not self.text.skip_depth:
+            for capture in self.captures:
+                capture[2].append(data)
+
+    def close(self):
+        return self
+
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def _parse(self, html, target):
+        parser = lxml_etree.HTMLParser(target=target, recover=True, remove_comments=True)
+        parser.feed(html)
+        return parser.close()
+
+    def page_text(self, html):
+        return self._parse(html, _LxmlTextTarget())
+
+    def block_texts(self, html, blocks, limit=None):
+        return self._parse(html, _LxmlBlockTarget(blocks))[:limit]
+
+    def links(self, html):
+        return self._parse(html, _LxmlLinkTarget())
+
+    def find_link_href(self, html, text_keywords, href_keywords):
+        return _first_matching_href(self.links(html), text_keywords, href_keywords)
+
+    def phone_tiers(self, html):
+        target = self._parse(html, _LxmlPhoneRegionTarget())
+        yield target.tel_numbers
+        yield target.label_values + target.regions
+        yield [_domestic_number(number) for number in target.schema] + json_ld_telephones(html)
+        yield [target.text.close()]
+
+
+# --- ★★★ バックエンドの選択 ★★★ ---
+BACKEND_CLASSES = {'lexbor': LexborBackend, 'lxml': LxmlBackend, 'bs4': BeautifulSoupBackend}
+BACKEND_PREFERENCE = ('lexbor', 'lxml', 'bs4') # 名前を指定しない場合はこの順で使えるものを選ぶ
+_BACKEND_AVAILABLE = {'lexbor': LexborHTMLParser is not None, 'lxml': lxml_etree is not None, 'bs4': True}
+_backend_instances = {}
+
+
+def available_backends():
+    """インストールされているバックエンド名 (優先順)"""
+    return [name for name in BACKEND_PREFERENCE if _BACKEND_AVAILABLE[name]]
+
+
+def get_backend(name=None):
+    """バックエンドを返す。未指定・未インストールの場合は使える中で最も優先度の高いもの"""
+    if not name or not _BACKEND_AVAILABLE.get(name):
+        name = available_backends()[0]
+    if name not in _backend_instances:
+        _backend_instances[name] = BACKEND_CLASSES[name]()
+    return _backend_instances[name]
@@ -0,0 +1,107 @@
+# http_fetcher.py
+# Seleniumを使う前に試す軽量HTTP取得層 (keep-alive / コネクションプール付き)
+import re
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- ▼▼▼ 判定用の設定 ▼▼▼ ---
+MIN_USABLE_TEXT_LENGTH = 200 # これ未満の本文しかないページはJS描画とみなしてブラウザに回す
+MAX_CONTENT_BYTES = 5 * 1024 * 1024 # これを超えるレスポンスは読み込まない
+DEFAULT_TIMEOUT = (5, 10) # (接続, 読み込み) 秒
+HTML_CONTENT_TYPES = ('html',) # Content-Type に含まれていれば受け付ける文字列
+
+_SCRIPT_STYLE_PATTERN = re.compile(r'<(script|style|noscript)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_EMPTY_APP_ROOT_PATTERN = re.compile(r'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.IGNORECASE)
+_META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+class FetchedPage:
+    """HTTP取得したページ"""
+    __slots__ = ('url', 'html', 'status_code')
+
+    def __init__(self, url, html, status_code):
+        self.url = url
+        self.html = html
+        self.status_code = status_code
+
+
+def decode_html(content, declared_encoding=None):
+    """ヘッダーの charset → meta charset → utf-8 → cp932 の順でHTMLをデコードする"""
+    candidates = []
+    if declared_encoding:
+        candidates.append(declared_encoding)
+    meta_match = _META_CHARSET_PATTERN.search(content[:4096])
+    if meta_match:
+        candidates.append(meta_match.group(1).decode('ascii', 'ignore'))
+    candidates += ['utf-8', 'cp932']
+    for encoding in candidates:
+        try:
+            return content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return content.decode('utf-8', errors='replace')
+
+
+def visible_text_length(html):
+    """script/style/タグを除いた本文のおおよその文字数"""
+    text = _TAG_PATTERN.sub(' ', _SCRIPT_STYLE_PATTERN.sub(' ', html))
+    return len(_WHITESPACE_PATTERN.sub(' ', text).strip())
+
+
+def looks_js_rendered(html):
+    """JavaScriptで描画されるページ (または本文が無いページ) かどうか"""
+    if not html:
+        return True
+    text_length = visible_text_length(html)
+    if text_length < MIN_USABLE_TEXT_LENGTH:
+        return True
+    # SPAの空のマウントポイントしかなく、本文も少ない場合
+    if _EMPTY_APP_ROOT_PATTERN.search(html) and text_length < MIN_USABLE_TEXT_LENGTH * 5:
+        return True
+    return False
+
+
+class StaticPageFetcher:
+    """requests.Session を使った静的HTML取得 (スレッド間で共有可能)"""
+    def __init__(self, user_agent=None, pool_size=4, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(pool_size, 10), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'ja-JP,ja;q=0.9',
+        })
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+    def fetch(self, url, content_types=HTML_CONTENT_TYPES, timeout=None):
+        """200番台のHTML (content_types を指定した場合はその種類の文書) が取れた場合のみ FetchedPage を返す (それ以外は None)
+        timeout を渡すと、このリクエストだけ既定のタイムアウトの代わりに使う (行の予算の残り時間に縮める場合など)"""
+        try:
+            with self.session.get(url, timeout=timeout or self.timeout, allow_redirects=True, stream=True) as response:
+                if not (200 <= response.status_code < 300):
+                    return None
+                content_type = response.headers.get('Content-Type', '').lower()
+                if content_type and not any(accepted in content_type for accepted in content_types):
+                    return None
+                content_length = response.headers.get('Content-Length')
+                if content_length and content_length.isdigit() and int(content_length) > MAX_CONTENT_BYTES:
+                    return None
+                chunks, total = [], 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total > MAX_CONTENT_BYTES:
+                        return None
+                declared_encoding = response.encoding if 'charset=' in content_type else None
+                html = decode_html(b''.join(chunks), declared_encoding)
+                return FetchedPage(response.url, html, response.status_code)
+        except (requests.RequestException, ValueError):
+            return None
+
+    def close(self):
+        self.session.close()
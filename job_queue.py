@@ -0,0 +1,386 @@
+# job_queue.py
+# 複数のワーカープロセス / ホストで1つの入力ファイルを分担するためのジョブキュー
+# 作業単位 (work_units.group_work_units の1件) をキューに入れ、ワーカーは期限付きで借りて (リース) 処理し、結果を書き戻す
+# 期限内に結果も延長もないリース (ワーカーが落ちた等) は期限切れとして他のワーカーに割り当て直す
+#   既定: SQLite (同じマシンのプロセス間 / 共有ディスク)。Redis 互換のサーバーを使う場合は redis://ホスト:ポート/DB番号
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from row_jobs import RowJob
+
+DEFAULT_QUEUE_PATH = "job_queue.sqlite3"
+DEFAULT_LEASE_SECONDS = 300 # リースの期限 (ワーカーは期限の 1/3 ごとに延長する)
+MAX_ATTEMPTS = 3 # 同じ作業単位のリースが期限切れになった回数の上限 (超えたら失敗として記録する)
+LEASE_FAILED_VALUE = 'エラー(ワーカー応答なし)'
+
+
+def encode_unit(unit):
+    """作業単位 (行インデックスのタプル, HP, 屋号, 住所) をキュー用の文字列にする (行インデックスは文字列で保存する)"""
+    row_indices, company_hp_url, company_name, address = unit
+    return json.dumps([[str(index) for index in row_indices], company_hp_url, company_name, address], ensure_ascii=False)
+
+
+def decode_unit(payload):
+    """キュー用の文字列から作業単位 (row_jobs.RowJob。検索語はここで作り直す) に戻す"""
+    row_indices, company_hp_url, company_name, address = json.loads(payload)
+    return RowJob.from_values(tuple(row_indices), company_hp_url, company_name, address)
+
+
+class QueueProgress:
+    """ジョブの進捗 (作業単位の件数。期限切れのリースは pending に数える)"""
+    __slots__ = ('total', 'pending', 'leased', 'done')
+
+    def __init__(self, total, pending, leased, done):
+        self.total = total
+        self.pending = pending
+        self.leased = leased
+        self.done = done
+
+
+# --- ★★★ SQLite (既定) ★★★ ---
+class SqliteJobQueue:
+    """SQLite のジョブキュー (プロセス間で共有可能。BEGIN IMMEDIATE で借りる処理を直列化する)"""
+    def __init__(self, path=DEFAULT_QUEUE_PATH, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS units ("
+                " job_id TEXT, unit_id INTEGER, payload TEXT, status TEXT, worker TEXT, lease_expires REAL, attempts INTEGER,"
+                " PRIMARY KEY (job_id, unit_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS units_status ON units (job_id, status, lease_expires)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, unit_id INTEGER, value TEXT, worker TEXT, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_job ON results (job_id, seq)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, job_id, units):
+        """作業単位を登録する (同じ job_id で登録済みの番号はそのまま。再実行時は続きから処理する)"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO units (job_id, unit_id, payload, status, worker, lease_expires, attempts) VALUES (?, ?, ?, 'pending', NULL, 0, 0)",
+                ((job_id, unit_id, encode_unit(unit)) for unit_id, unit in enumerate(units)),
+            )
+
+    def claim(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """未処理 (またはリース期限切れ) の作業単位を1件借りる。(作業単位の番号, 作業単位) を返す (なければ None)"""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT unit_id, payload, status, attempts FROM units WHERE job_id = ?"
+                    " AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) ORDER BY unit_id LIMIT 1",
+                    (job_id, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                unit_id, payload, status, attempts = row
+                if status == 'leased' and attempts >= self.max_attempts:
+                    self._finish(conn, job_id, unit_id, LEASE_FAILED_VALUE, None, now)
+                    continue
+                conn.execute(
+                    "UPDATE units SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE job_id = ? AND unit_id = ?",
+                    (worker, now + lease_seconds, job_id, unit_id),
+                )
+                return unit_id, decode_unit(payload)
+
+    def extend(self, job_id, worker, unit_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """借りている作業単位のリースを延長する"""
+        if not unit_ids:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE units SET lease_expires = ? WHERE job_id = ? AND unit_id = ? AND status = 'leased' AND worker = ?",
+                ((time.time() + lease_seconds, job_id, unit_id, worker) for unit_id in unit_ids),
+            )
+
+    def release(self, job_id, worker, unit_id):
+        """借りた作業単位を処理せずに返す (他のワーカーがすぐに借りられる。期限切れの回数には数えない)"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE units SET status = 'pending', worker = NULL, attempts = MAX(attempts - 1, 0)"
+                " WHERE job_id = ? AND unit_id = ? AND status = 'leased' AND worker = ?",
+                (job_id, unit_id, worker),
+            )
+
+    def complete(self, job_id, worker, unit_id, value):
+        """結果を記録する。記録済み (期限切れ後に他のワーカーが先に終えた等) の場合は False"""
+        with self._transaction() as conn:
+            status = conn.execute("SELECT status FROM units WHERE job_id = ? AND unit_id = ?", (job_id, unit_id)).fetchone()
+            if status is None or status[0] == 'done':
+                return False
+            self._finish(conn, job_id, unit_id, value, worker, time.time())
+            return True
+
+    @staticmethod
+    def _finish(conn, job_id, unit_id, value, worker, now):
+        conn.execute("UPDATE units SET status = 'done', worker = ?, lease_expires = 0 WHERE job_id = ? AND unit_id = ?", (worker, job_id, unit_id))
+        conn.execute("INSERT INTO results (job_id, unit_id, value, worker, finished_at) VALUES (?, ?, ?, ?, ?)",
+                     (job_id, unit_id, value, worker, now))
+
+    def results_after(self, job_id, after=0):
+        """after より後に記録された結果。(次に渡す位置, [(作業単位, 値), ...]) を返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.seq, u.payload, r.value FROM results r JOIN units u ON u.job_id = r.job_id AND u.unit_id = r.unit_id"
+                " WHERE r.job_id = ? AND r.seq > ? ORDER BY r.seq",
+                (job_id, after),
+            ).fetchall()
+        if not rows:
+            return after, []
+        return rows[-1][0], [(decode_unit(payload), value) for _, payload, value in rows]
+
+    def progress(self, job_id):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'pending' ELSE status END, COUNT(*)"
+                " FROM units WHERE job_id = ? GROUP BY 1", (time.time(), job_id)).fetchall())
+        return QueueProgress(sum(counts.values()), counts.get('pending', 0), counts.get('leased', 0), counts.get('done', 0))
+
+    def clear(self, job_id):
+        """ジョブの作業単位と結果を削除する (最初からやり直す場合)"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM units WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- ★★★ Redis 互換サーバー ★★★ ---
+# 借りる・結果を記録する処理は Lua スクリプトでまとめて実行する (複数のワーカーから同時に呼ばれても1件を1台にだけ貸す)
+_REDIS_ENQUEUE = """
+for i = 1, #ARGV, 2 do
+  if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+  end
+end
+return 1
+"""
+# KEYS: units, pending, leases, workers, attempts, done, results / ARGV: now, expires, worker, max_attempts, failed_value
+_REDIS_CLAIM = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+for _, unit in ipairs(expired) do
+  redis.call('ZREM', KEYS[3], unit)
+  if tonumber(redis.call('HGET', KEYS[5], unit) or '0') >= tonumber(ARGV[4]) then
+    redis.call('HSET', KEYS[6], unit, ARGV[5])
+    redis.call('RPUSH', KEYS[7], unit .. '\\t' .. ARGV[5])
+  else
+    redis.call('LPUSH', KEYS[2], unit)
+  end
+end
+local unit = redis.call('LPOP', KEYS[2])
+if not unit then
+  return false
+end
+redis.call('ZADD', KEYS[3], ARGV[2], unit)
+redis.call('HSET', KEYS[4], unit, ARGV[3])
+redis.call('HINCRBY', KEYS[5], unit, 1)
+return {unit, redis.call('HGET', KEYS[1], unit)}
+"""
+# KEYS: leases, workers / ARGV: expires, worker, unit...
+_REDIS_EXTEND = """
+for i = 3, #ARGV do
+  if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[2] and redis.call('ZSCORE', KEYS[1], ARGV[i]) then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i])
+  end
+end
+return 1
+"""
+# KEYS: pending, leases, workers, attempts / ARGV: worker, unit
+_REDIS_RELEASE = """
+if redis.call('HGET', KEYS[3], ARGV[2]) == ARGV[1] and redis.call('ZREM', KEYS[2], ARGV[2]) == 1 then
+  redis.call('LPUSH', KEYS[1], ARGV[2])
+  redis.call('HINCRBY', KEYS[4], ARGV[2], -1)
+end
+return 1
+"""
+# KEYS: leases, workers, done, results / ARGV: worker, unit, value
+_REDIS_COMPLETE = """
+if redis.call('HSETNX', KEYS[3], ARGV[2], ARGV[3]) == 0 then
+  return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[1])
+redis.call('RPUSH', KEYS[4], ARGV[2] .. '\\t' .. ARGV[3])
+return 1
+"""
+
+
+class RedisJobQueue:
+    """Redis 互換サーバーのジョブキュー (複数ホストのワーカーで共有する。redis パッケージが必要)
+    client を渡すと url の代わりに使う (redis.Redis と同じメソッドを持つもの)"""
+    def __init__(self, url=None, client=None, max_attempts=MAX_ATTEMPTS, prefix='phone_scraper'):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("Redis のジョブキューを使うには redis パッケージが必要です (pip install redis)") from e
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._enqueue = client.register_script(_REDIS_ENQUEUE)
+        self._claim = client.register_script(_REDIS_CLAIM)
+        self._extend = client.register_script(_REDIS_EXTEND)
+        self._release = client.register_script(_REDIS_RELEASE)
+        self._complete = client.register_script(_REDIS_COMPLETE)
+
+    def _keys(self, job_id, *names):
+        return [f"{self.prefix}:{job_id}:{name}" for name in names]
+
+    def enqueue(self, job_id, units):
+        arguments = []
+        for unit_id, unit in enumerate(units):
+            arguments += [unit_id, encode_unit(unit)]
+        for start in range(0, len(arguments), 2000): # 1回のスクリプトに渡す引数の数を抑える
+            self._enqueue(keys=self._keys(job_id, 'units', 'pending'), args=arguments[start:start + 2000])
+
+    def claim(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        claimed = self._claim(keys=self._keys(job_id, 'units', 'pending', 'leases', 'workers', 'attempts', 'done', 'results'),
+                              args=[now, now + lease_seconds, worker, self.max_attempts, LEASE_FAILED_VALUE])
+        if not claimed:
+            return None
+        unit_id, payload = claimed
+        return int(unit_id), decode_unit(payload)
+
+    def extend(self, job_id, worker, unit_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+        if unit_ids:
+            self._extend(keys=self._keys(job_id, 'leases', 'workers'), args=[time.time() + lease_seconds, worker, *unit_ids])
+
+    def release(self, job_id, worker, unit_id):
+        self._release(keys=self._keys(job_id, 'pending', 'leases', 'workers', 'attempts'), args=[worker, unit_id])
+
+    def complete(self, job_id, worker, unit_id, value):
+        return bool(self._complete(keys=self._keys(job_id, 'leases', 'workers', 'done', 'results'), args=[worker, unit_id, value]))
+
+    def results_after(self, job_id, after=0):
+        entries = self.client.lrange(self._keys(job_id, 'results')[0], after, -1)
+        if not entries:
+            return after, []
+        finished = [entry.split('\t', 1) for entry in entries]
+        payloads = self.client.hmget(self._keys(job_id, 'units')[0], [unit_id for unit_id, _ in finished])
+        return after + len(entries), [(decode_unit(payload), value) for (_, value), payload in zip(finished, payloads)]
+
+    def progress(self, job_id):
+        units, pending, leases, done = self._keys(job_id, 'units', 'pending', 'leases', 'done')
+        now = time.time()
+        pipeline = self.client.pipeline()
+        pipeline.hlen(units); pipeline.llen(pending); pipeline.zcount(leases, '-inf', now); pipeline.zcount(leases, f'({now}', '+inf'); pipeline.hlen(done)
+        total, pending_count, expired, leased, done_count = pipeline.execute()
+        return QueueProgress(total, pending_count + expired, leased, done_count)
+
+    def clear(self, job_id):
+        self.client.delete(*self._keys(job_id, 'units', 'pending', 'leases', 'workers', 'attempts', 'done', 'results'))
+
+    def close(self):
+        close = getattr(self.client, 'close', None)
+        if close:
+            close()
+
+
+def open_job_queue(url=DEFAULT_QUEUE_PATH):
+    """キューの指定 (SQLiteのファイルパス / sqlite:///パス / redis://...) からジョブキューを開く"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisJobQueue(url)
+    return SqliteJobQueue(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url)
+
+
+class LeasedUnitSource:
+    """ジョブキューから作業単位を借りて scraping_worker に渡す (queue.Queue の get_nowait / put と同じ使い方)
+    借りている作業単位のリースは裏のスレッドで延長し、complete_row で最初の行の結果が届いた時点で作業単位の結果として記録する
+    deadline (time_budget.Deadline) を過ぎたら新しい作業単位を借りない"""
+    def __init__(self, job_queue, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=2.0, stop_event=None, deadline=None):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event or threading.Event()
+        self.deadline = deadline
+        self.completed = 0 # このワーカーが記録した作業単位の数
+        self._lock = threading.Lock()
+        self._held = {} # 作業単位の番号: 作業単位
+        self._unit_of_row = {} # 行インデックス: 作業単位の番号
+        self._heartbeat = threading.Thread(target=self._extend_leases, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def get_nowait(self):
+        """作業単位を1件借りる。他のワーカーのリースが残っている間は、期限切れで割り当て直されるのを待つ
+        全ての作業単位が終わったか、締め切りを過ぎたら queue.Empty"""
+        while not self.stop_event.is_set():
+            if self.deadline and self.deadline.expired():
+                break
+            claimed = self.job_queue.claim(self.job_id, self.worker, self.lease_seconds)
+            if claimed is not None:
+                unit_id, unit = claimed
+                with self._lock:
+                    self._held[unit_id] = unit
+                    self._unit_of_row.update(dict.fromkeys(unit.row_indices, unit_id))
+                return unit
+            if not self.job_queue.progress(self.job_id).leased:
+                break
+            self.stop_event.wait(self.poll_interval)
+        raise queue.Empty
+
+    def put(self, unit):
+        """処理できなかった作業単位を返す"""
+        with self._lock:
+            unit_id = self._unit_of_row.get(unit.row_indices[0]) if unit.row_indices else None
+            self._forget(unit_id)
+        if unit_id is not None:
+            self.job_queue.release(self.job_id, self.worker, unit_id)
+
+    def complete_row(self, row_index, value):
+        """行の結果を受け取る (同じ作業単位の行は同じ値のため、最初の行の結果を作業単位の結果として記録する)"""
+        with self._lock:
+            unit_id = self._unit_of_row.get(row_index)
+            if unit_id is None:
+                return
+            self._forget(unit_id)
+        if self.job_queue.complete(self.job_id, self.worker, unit_id, value):
+            self.completed += 1
+
+    def _forget(self, unit_id):
+        unit = self._held.pop(unit_id, None)
+        for row_index in (unit.row_indices if unit else ()):
+            self._unit_of_row.pop(row_index, None)
+
+    def _extend_leases(self):
+        while not self.stop_event.wait(self.lease_seconds / 3):
+            with self._lock:
+                unit_ids = list(self._held)
+            try:
+                self.job_queue.extend(self.job_id, self.worker, unit_ids, self.lease_seconds)
+            except Exception:
+                pass # 延長に失敗しても、期限切れになれば他のワーカーが処理する
+
+    def close(self):
+        """借りたまま処理していない作業単位を返す"""
+        self.stop_event.set()
+        with self._lock:
+            unit_ids, self._held, self._unit_of_row = list(self._held), {}, {}
+        for unit_id in unit_ids:
+            self.job_queue.release(self.job_id, self.worker, unit_id)
@@ -0,0 +1,86 @@
+# link_discovery.py
+# 取得済みのHTMLから概要ページの候補リンクを探して順位付けする (ブラウザのDOMを待たない)
+# リンク文字列とURLのパスのキーワードで点数を付け、正規化したURLで重複を除いて上位の候補を返す
+import re
+from urllib.parse import urljoin, urlsplit
+from page_cache import normalize_url
+
+DEFAULT_CANDIDATE_COUNT = 3 # 1段階あたりに取得する候補ページ数の上限
+
+# --- 点数 (キーワードはリストの先頭ほど具体的なものとして高くする) ---
+TEXT_MATCH_SCORE = 10 # リンク文字列がキーワードを含む
+EXACT_TEXT_BONUS = 3 # リンク文字列がキーワードそのもの (「会社概要」など)
+PATH_MATCH_SCORE = 6 # URLのパスがキーワードを含む
+LONG_TEXT_LENGTH = 20 # これより長いリンク文字列は本文中の文章とみなして減点する
+LONG_TEXT_PENALTY = 3
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _site_host(url):
+    """URLのホスト名 (小文字、先頭の www. を除く。http / https 以外は None)"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower() if parts.scheme in ('http', 'https') else ''
+    return host[len('www.'):] if host.startswith('www.') else host or None
+
+
+def is_same_site(url, site_url):
+    """url が site_url と同じサイトか (ホスト名で比べる。www. の有無とサブドメインは同じサイトとする)"""
+    host, site_host = _site_host(url), _site_host(site_url)
+    return bool(host and site_host) and (host == site_host or host.endswith('.' + site_host))
+
+
+def resolve_overview_link(link_href, base_url, domain_source_url, exclude_url=None):
+    """リンクを絶対URLにし、同一ドメインの下層ページとして有効な場合のみ返す"""
+    if not link_href or link_href.startswith(('javascript:', 'tel:', 'mailto:')) or '#' in link_href.split('/')[-1]:
+        return None
+    overview_url = urljoin(base_url, link_href)
+    if exclude_url is not None and overview_url.split('#')[0] == exclude_url:
+        return None
+    if not is_same_site(overview_url, domain_source_url):
+        return None
+    return overview_url
+
+
+def score_link(url, text, text_keywords, href_keywords):
+    """候補リンクの点数 (キーワードに一致しなければ 0)"""
+    text = _WHITESPACE_PATTERN.sub(' ', text or '').strip()
+    segments = [segment for segment in urlsplit(url).path.lower().split('/') if segment]
+    score = 0
+    for rank, keyword in enumerate(text_keywords):
+        if keyword in text:
+            score += TEXT_MATCH_SCORE - rank
+            if text == keyword:
+                score += EXACT_TEXT_BONUS
+            elif len(text) > LONG_TEXT_LENGTH:
+                score -= LONG_TEXT_PENALTY
+            break
+    for rank, keyword in enumerate(href_keywords):
+        if any(keyword in segment for segment in segments):
+            score += PATH_MATCH_SCORE - rank
+            break
+    if score:
+        score -= max(0, len(segments) - 2) # 階層が深いページほど会社概要そのものである可能性が低い
+    return max(score, 0)
+
+
+def rank_link_candidates(links, domain_source_url, text_keywords, href_keywords, exclude_urls=(), limit=DEFAULT_CANDIDATE_COUNT):
+    """links は (href, リンク文字列, リンクがあったページのURL)。同一ドメインの下層ページの候補を
+    点数の高い順 (同点は文書順) に最大 limit 件 (None で全件) 返す。同じページへのリンクは正規化したURLでまとめ、最も高い点数を使う"""
+    excluded = {normalize_url(url) for url in exclude_urls if url}
+    best = {} # 正規化したURL: [点数, 文書順, URL]
+    for order, (href, text, base_url) in enumerate(links):
+        url = resolve_overview_link(href.strip() if href else href, base_url, domain_source_url)
+        if not url:
+            continue
+        key = normalize_url(url)
+        if key in excluded:
+            continue
+        score = score_link(url, text, text_keywords, href_keywords)
+        if score <= 0:
+            continue
+        if key not in best:
+            best[key] = [score, order, url.split('#')[0]]
+        elif score > best[key][0]:
+            best[key][0] = score
+    ranked = sorted(best.values(), key=lambda entry: (-entry[0], entry[1]))
+    return [url for _, _, url in ranked[:limit]]
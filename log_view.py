@@ -0,0 +1,77 @@
+# log_view.py
+# 長時間の実行でも画面が重くならない詳細ログ表示
+# ログは1行ずつファイルに書き出し (全件をダウンロードできる)、画面には直近の行だけを1つのプレースホルダーにまとめて一定間隔で再描画する
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_LOG_LINES = 200 # 画面に表示する直近の行数
+DEFAULT_RENDER_INTERVAL = 0.5 # 画面の再描画の最短間隔 (秒)
+LEVEL_MARKS = {'info': 'ℹ️', 'success': '✅', 'warning': '⚠️', 'error': '❌'}
+
+
+class RingBufferLog:
+    """info/success/warning/error を受け取り、全件を path に書き出し、直近 capacity 行を placeholder (st.empty() 等) に表示する
+    画面の再描画は作成したスレッド (Streamlit のスクリプト実行スレッド) からのみ、interval 秒に1回までにまとめる"""
+    def __init__(self, path, placeholder=None, capacity=DEFAULT_LOG_LINES, interval=DEFAULT_RENDER_INTERVAL):
+        self.path = path
+        self.placeholder = placeholder
+        self.interval = interval
+        self.counts = dict.fromkeys(LEVEL_MARKS, 0)
+        self._lines = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._owner = threading.current_thread()
+        self._dirty = False
+        self._rendered_at = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _log(self, level, message):
+        now = time.time()
+        line = f"{time.strftime('%H:%M:%S', time.localtime(now))} {LEVEL_MARKS[level]} {message}"
+        with self._lock:
+            self.counts[level] += 1
+            self._lines.append(line)
+            self._dirty = True
+            if self._file:
+                self._file.write(f"{time.strftime('%Y-%m-%d ', time.localtime(now))}{line}\n")
+        if threading.current_thread() is self._owner:
+            self.render()
+
+    def info(self, message): self._log('info', message)
+    def success(self, message): self._log('success', message)
+    def warning(self, message): self._log('warning', message)
+    def error(self, message): self._log('error', message)
+
+    def render(self, force=False):
+        """前回の描画から interval 秒以上経っていれば (force=True では常に) 直近の行を描画する"""
+        if self.placeholder is None or not (self._dirty or force):
+            return
+        now = time.monotonic()
+        if not force and now - self._rendered_at < self.interval:
+            return
+        with self._lock:
+            text = "\n".join(self._lines)
+            self._dirty = False
+            if self._file:
+                self._file.flush()
+        self._rendered_at = now
+        self.placeholder.code(text, language=None)
+
+    def read_full(self):
+        """ファイルに書き出した全件 (ダウンロード用のバイト列)"""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def close(self):
+        self.render(force=True)
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,129 @@
+# page_cache.py
+# 取得済みページ(HTML)のディスクキャッシュ (SQLite)
+# キーは正規化したURL (Yahoo検索は検索URL = 検索クエリ)。有効期限(TTL)と最大サイズ(LRUで削除)付き
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_CACHE_PATH = "page_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600 # 7日
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024 # 500MB (圧縮後のサイズ)
+EVICT_TARGET_RATIO = 0.9 # 上限を超えたら、上限のこの割合まで古い順に削除する
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """キャッシュキー用にURLを正規化する (スキーム/ホストの小文字化・既定ポート/フラグメント除去・クエリの並べ替え)"""
+    url = (url or '').strip()
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url
+    netloc = host if port is None or _DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+class PageNotCached(Exception):
+    """オフライン再抽出モードで、キャッシュにページが無い"""
+
+
+class CachedPage:
+    """キャッシュから取り出したページ"""
+    __slots__ = ('url', 'html', 'fetched_at')
+
+    def __init__(self, url, html, fetched_at):
+        self.url = url
+        self.html = html
+        self.fetched_at = fetched_at
+
+
+class PageCache:
+    """SQLiteによるページキャッシュ (スレッド間で共有可能)。ttl_seconds=None で期限なし (オフライン再抽出用)"""
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " key TEXT PRIMARY KEY, url TEXT, body BLOB, size INTEGER,"
+                " fetched_at REAL, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self.purge_expired()
+
+    def get(self, url):
+        """キャッシュされたページ (なければ / 期限切れなら None)"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT url, body, fetched_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None or self._is_expired(row[2], now):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return CachedPage(row[0], zlib.decompress(row[1]).decode('utf-8'), row[2])
+
+    def put(self, url, html, final_url=None):
+        """ページを保存し、最大サイズを超えていれば古い順に削除する"""
+        if not html:
+            return
+        body = zlib.compress(html.encode('utf-8'), 6)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, url, body, size, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), final_url or url, body, len(body), now, now),
+            )
+            self._evict_locked()
+
+    def _is_expired(self, fetched_at, now):
+        return bool(self.ttl_seconds) and now - fetched_at > self.ttl_seconds
+
+    def _evict_locked(self):
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for key, size in self._conn.execute("SELECT key, size FROM pages ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            total -= size
+
+    def purge_expired(self):
+        """期限切れのページを削除する"""
+        if not self.ttl_seconds:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+
+    def stats(self):
+        """(件数, 合計サイズ[バイト])"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return count, total
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,122 @@
+# parse_pool.py
+# HTMLの解析と電話番号の抽出を別プロセスで行う (ブラウザの操作・ページ取得と並行して複数コアを使う)
+# html_text のバックエンドと同じメソッドを持つため、html_backend の代わりにそのまま渡せる
+# 電話番号の抽出は submit_extract_phone で開始して Future を受け取り、抽出の間に呼び出し元は次のページの取得を進められる
+# 解析待ちのHTMLはプロセス数の数倍までに制限し、超えた分は空きができるまで呼び出し元のスレッドを待たせる
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html_text import get_backend
+from phone_extractor import AreaCodeIndex, extract_phone_from_tiers
+
+MAX_DEFAULT_PARSE_WORKERS = 4
+PENDING_PER_WORKER = 2 # 1プロセスあたりの解析待ちHTMLの上限
+INLINE_PARSE_MAX_CHARS = 16 * 1024 # これより小さいHTMLはプロセス間の受け渡しの方が遅いため呼び出し元で解析する
+
+_worker_state = {} # 解析プロセス内のバックエンドと市外局番インデックス
+
+
+def default_parse_workers():
+    """既定の解析プロセス数 (ブラウザ・メインスレッド用に1コア残す。1コアの環境では 0 = 使わない)"""
+    return max(0, min(MAX_DEFAULT_PARSE_WORKERS, (os.cpu_count() or 1) - 1))
+
+
+def _init_worker(backend_name, area_codes):
+    _worker_state['backend'] = get_backend(backend_name)
+    _worker_state['area_code_index'] = AreaCodeIndex(area_codes)
+
+
+def _call_backend(method, args):
+    return getattr(_worker_state['backend'], method)(*args)
+
+
+def _extract_phone(html):
+    return extract_phone_from_tiers(_worker_state['backend'].phone_tiers(html), _worker_state['area_code_index'])
+
+
+def completed_future(function):
+    """function() をこのスレッドで実行し、その結果 (例外) を持つ完了済みの Future を返す"""
+    future = Future()
+    try:
+        future.set_result(function())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class ParsePool:
+    """HTML解析バックエンドの処理と電話番号の抽出を解析プロセスで行う (スレッド間で共有する)
+    area_code_index は抽出に使う市外局番 (AreaCodeIndex または市外局番の集合)。解析プロセスの起動時に1回だけ渡す"""
+    def __init__(self, backend_name, area_code_index, max_workers=None, max_pending=None):
+        self.backend = get_backend(backend_name)
+        self.area_code_index = area_code_index if isinstance(area_code_index, AreaCodeIndex) else AreaCodeIndex(area_code_index)
+        self.max_workers = max_workers or default_parse_workers() or 1
+        self.name = f"{self.backend.name} (解析プロセス {self.max_workers})"
+        self.offloaded = 0 # 解析プロセスで処理した件数
+        self._slots = threading.BoundedSemaphore(max_pending or self.max_workers * PENDING_PER_WORKER)
+        self._broken = False
+        # ブラウザ操作のスレッドが動いているプロセスを fork しないよう spawn で起動する
+        self._executor = ProcessPoolExecutor(self.max_workers, multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(self.backend.name, self.area_code_index.codes()))
+
+    def _submit(self, function, args, html, inline):
+        """解析プロセスで function(*args) を開始し、結果の Future を返す (解析待ちのHTMLが上限に達している間は待つ)
+        小さいHTML・解析プロセスが落ちた後は inline() を呼び出し元で実行し、完了済みの Future を返す"""
+        if self._broken or not html or len(html) < INLINE_PARSE_MAX_CHARS:
+            return completed_future(inline)
+        self._slots.acquire() # 解析が終わるまで (Future の完了時に) 枠を返さない
+        try:
+            submitted = self._executor.submit(function, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._slots.release()
+            self._broken = True
+            return completed_future(inline)
+        result = Future()
+
+        def on_done(submitted):
+            self._slots.release()
+            try:
+                try:
+                    value = submitted.result()
+                    self.offloaded += 1
+                except BrokenProcessPool:
+                    self._broken = True # 解析プロセスが落ちた場合は以後呼び出し元で解析する
+                    value = inline()
+            except Exception as e:
+                result.set_exception(e)
+            else:
+                result.set_result(value)
+
+        submitted.add_done_callback(on_done)
+        return result
+
+    def _run(self, function, args, html, inline):
+        return self._submit(function, args, html, inline).result()
+
+    def submit_extract_phone(self, html):
+        """HTMLからの電話番号の抽出を開始し、結果 (電話番号 / None) の Future を返す"""
+        return self._submit(_extract_phone, (html,), html,
+                            lambda: extract_phone_from_tiers(self.backend.phone_tiers(html), self.area_code_index))
+
+    def extract_phone(self, html):
+        """HTMLから電話番号を1件抽出する (scraper_engine.extract_phone_number と同じ処理)"""
+        return self.submit_extract_phone(html).result()
+
+    # --- html_text のバックエンドと同じメソッド ---
+    def page_text(self, html):
+        return self._run(_call_backend, ('page_text', (html,)), html, lambda: self.backend.page_text(html))
+
+    def block_texts(self, html, blocks, limit=None):
+        return self._run(_call_backend, ('block_texts', (html, blocks, limit)), html, lambda: self.backend.block_texts(html, blocks, limit))
+
+    def links(self, html):
+        return self._run(_call_backend, ('links', (html,)), html, lambda: self.backend.links(html))
+
+    def find_link_href(self, html, text_keywords, href_keywords):
+        return self._run(_call_backend, ('find_link_href', (html, text_keywords, href_keywords)), html,
+                         lambda: self.backend.find_link_href(html, text_keywords, href_keywords))
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,142 @@
+# phone_extractor.py
+# HPページ / Yahoo検索結果で共通の電話番号抽出エンジン
+# (正規表現・変換テーブルはモジュール読み込み時に一度だけ作る)
+import re
+
+# --- ▼▼▼ 文字正規化テーブル ▼▼▼ ---
+HP_TRANSLATION_TABLE = str.maketrans('０１２３４５６７８９（）－‐　', '0123456789()-- ')
+# Yahoo検索結果用。従来の処理と結果を変えないため、'S' を空白にする変換もそのまま残している
+YAHOO_TRANSLATION_TABLE = str.maketrans('０１２３４５６７８９（）－‐S', '0123456789()-- ')
+
+EXCLUDED_PREFIXES = ('0120', '0800') # フリーダイヤル等は対象外
+NON_GEOGRAPHIC_PREFIXES = ('050', '070', '080', '090') # 市外局番の確認が不要な番号
+MOBILE_PREFIXES = ('070', '080', '090')
+
+# --- ▼▼▼ 番号計画上の桁数 ▼▼▼ ---
+GEOGRAPHIC_NUMBER_LENGTH = 10 # 固定電話: 0 + 市外局番 + 市内局番 + 加入者番号 = 10桁
+NON_GEOGRAPHIC_NUMBER_LENGTH = 11 # 050(IP電話) / 070・080・090(携帯) = 11桁
+
+# --- ▼▼▼ 1回の走査で3種類の候補を分類するパターン ▼▼▼ ---
+# labelled : 「TEL」「電話番号」「電話」の直後の区切り付き番号
+# separated: 区切り付きの番号 (03-1234-5678 など)
+# bare     : 区切りなしの10〜11桁
+# 全て先読み(幅0)にして、3種類の重なり方を従来の個別走査と同じにする
+_SEPARATED_NUMBER = r'0\d{1,4}[-()（）\s]{1,3}\d{1,4}[-()（）\s]{1,3}\d{3,4}'
+PHONE_SCAN_PATTERN = re.compile(
+    r'(?=(?:(?i:TEL)|電話番号|電話)\s*[.:：]?\s*(?P<labelled>' + _SEPARATED_NUMBER + r'))'
+    r'|(?=(?P<separated>' + _SEPARATED_NUMBER + r'))'
+    r'|(?=(?<!\d)(?P<bare>0\d{9,10})(?!\d))'
+)
+_NON_DIGIT_PATTERN = re.compile(r'[^0-9]')
+
+
+class AreaCodeIndex:
+    """市外局番の前方一致インデックス (桁数ごとの集合)。判定は番号の先頭2〜5桁を引くだけで済む"""
+    __slots__ = ('_codes_by_length', '_lengths')
+
+    def __init__(self, area_codes):
+        codes_by_length = {}
+        for code in area_codes:
+            code = str(code).strip()
+            if code:
+                codes_by_length.setdefault(len(code), set()).add(code)
+        self._codes_by_length = codes_by_length
+        self._lengths = tuple(sorted(codes_by_length, reverse=True))
+
+    def __len__(self):
+        return sum(len(codes) for codes in self._codes_by_length.values())
+
+    def codes(self):
+        """登録されている市外局番 (短い順)"""
+        return sorted((code for codes in self._codes_by_length.values() for code in codes), key=lambda code: (len(code), code))
+
+    def match(self, phone_digits):
+        """番号の先頭に一致する最も長い市外局番 (なければ None)"""
+        for length in self._lengths:
+            prefix = phone_digits[:length]
+            if len(prefix) == length and prefix in self._codes_by_length[length]:
+                return prefix
+        return None
+
+
+def is_valid_phone(phone_digits, area_code_index):
+    """番号帯と桁数(番号計画)を確認し、固定電話は市外局番インデックスで判定する"""
+    if phone_digits.startswith(EXCLUDED_PREFIXES): return False
+    if phone_digits.startswith(NON_GEOGRAPHIC_PREFIXES):
+        return len(phone_digits) == NON_GEOGRAPHIC_NUMBER_LENGTH
+    if len(phone_digits) != GEOGRAPHIC_NUMBER_LENGTH: return False
+    return area_code_index.match(phone_digits) is not None
+
+
+def find_phone_candidates(text, area_code_index, translation_table=HP_TRANSLATION_TABLE):
+    """テキスト中の有効な電話番号(数字のみ)を、ラベル付き → 区切り付き → 区切りなし の優先順で返す"""
+    normalized_text = text.translate(translation_table)
+    labelled, separated, bare = [], [], []
+    separated_end = 0
+    for match in PHONE_SCAN_PATTERN.finditer(normalized_text):
+        kind = match.lastgroup
+        if kind == 'separated':
+            # 区切り付きの走査は重なりなし (従来の re.findall と同じ)
+            if match.start() < separated_end:
+                continue
+            separated_end = match.end('separated')
+        candidate = match.group(kind)
+        if kind == 'bare':
+            bare.append(candidate)
+            continue
+        phone_digits = _NON_DIGIT_PATTERN.sub('', candidate)
+        if len(phone_digits) == 10 or len(phone_digits) == 11:
+            (labelled if kind == 'labelled' else separated).append(phone_digits)
+
+    found_phones, seen = [], set()
+    for phone_digits in labelled + separated + bare:
+        if phone_digits in seen: continue
+        if is_valid_phone(phone_digits, area_code_index):
+            seen.add(phone_digits)
+            found_phones.append(phone_digits)
+    return found_phones
+
+
+def choose_phone(found_phones):
+    """携帯番号があれば優先し、なければ最初に見つかった番号を返す"""
+    if not found_phones:
+        return None
+    return next((p for p in found_phones if p.startswith(MOBILE_PREFIXES)), found_phones[0])
+
+
+def extract_phone_from_text(text, area_code_index, translation_table=HP_TRANSLATION_TABLE):
+    """テキストから電話番号を1件抽出する (見つからなければ None)"""
+    return choose_phone(find_phone_candidates(text, _as_area_code_index(area_code_index), translation_table))
+
+
+def extract_phones_batch(texts, area_code_index, translation_table=HP_TRANSLATION_TABLE):
+    """複数テキストをまとめて処理し、テキストごとの抽出結果(または None)のリストを返す"""
+    area_code_index = _as_area_code_index(area_code_index)
+    return [choose_phone(find_phone_candidates(text, area_code_index, translation_table)) for text in texts]
+
+
+def extract_phone_from_tiers(tiers, area_code_index, translation_table=HP_TRANSLATION_TABLE):
+    """優先順に並んだテキストの組 (html_text の phone_tiers) を順に調べ、番号が見つかった最初の組から1件返す
+    見つかった時点で打ち切るため、後の組 (ページ全体のテキストなど) は作られない"""
+    area_code_index = _as_area_code_index(area_code_index)
+    for texts in tiers:
+        found_phones = []
+        for text in texts:
+            found_phones += [phone for phone in find_phone_candidates(text, area_code_index, translation_table) if phone not in found_phones]
+        if found_phones:
+            return choose_phone(found_phones)
+    return None
+
+
+def extract_phone_from_blocks(texts, area_code_index, translation_table=YAHOO_TRANSLATION_TABLE):
+    """検索結果ブロックを順に調べ、最初に番号が見つかったブロックから1件返す"""
+    area_code_index = _as_area_code_index(area_code_index)
+    for text in texts:
+        found_phones = find_phone_candidates(text, area_code_index, translation_table)
+        if found_phones:
+            return choose_phone(found_phones)
+    return None
+
+
+def _as_area_code_index(area_codes):
+    return area_codes if isinstance(area_codes, AreaCodeIndex) else AreaCodeIndex(area_codes)
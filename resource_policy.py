@@ -0,0 +1,65 @@
+# resource_policy.py
+# ブラウザで読み込むリソースの制限 (テキスト抽出に不要なフォント・CSS・画像・動画・広告/解析スクリプトを読み込まない)
+# Chrome DevTools Protocol の Network.setBlockedURLs でURLパターンごとにブロックし、pageLoadStrategy を eager にする
+RESOURCE_TYPE_EXTENSIONS = {
+    'image': ('jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'stylesheet': ('css',),
+    'media': ('mp4', 'webm', 'ogv', 'ogg', 'mov', 'm4v', 'mp3', 'm4a', 'wav'),
+}
+RESOURCE_TYPE_LABELS = {'image': '画像', 'font': 'フォント', 'stylesheet': 'CSS', 'media': '動画・音声'}
+
+# 広告・アクセス解析・埋め込み等のサードパーティホスト (サブドメインも対象)
+THIRD_PARTY_BLOCKED_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'googleadservices.com', 'doubleclick.net',
+    'adservice.google.com', 'fonts.googleapis.com', 'fonts.gstatic.com', 'use.typekit.net',
+    'facebook.net', 'connect.facebook.net', 'platform.twitter.com', 'analytics.twitter.com', 'ads-twitter.com',
+    'bat.bing.com', 'clarity.ms', 'hotjar.com', 'criteo.com', 'criteo.net', 'adsrvr.org', 'amazon-adsystem.com',
+    'youtube.com', 'ytimg.com', 'player.vimeo.com', 'yjtag.yahoo.co.jp', 'line-scdn.net', 'ptengine.jp', 'mouseflow.com',
+)
+
+PAGE_LOAD_STRATEGIES = ('eager', 'normal')
+
+
+class ResourcePolicy:
+    """ブロックするリソースの種類・ホストと pageLoadStrategy"""
+    __slots__ = ('blocked_types', 'blocked_hosts', 'page_load_strategy')
+
+    def __init__(self, blocked_types=(), blocked_hosts=(), page_load_strategy='normal'):
+        unknown = set(blocked_types) - set(RESOURCE_TYPE_EXTENSIONS)
+        if unknown:
+            raise ValueError(f"不明なリソースの種類です: {', '.join(sorted(unknown))}")
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError(f"pageLoadStrategy は {' / '.join(PAGE_LOAD_STRATEGIES)} のいずれかです: {page_load_strategy}")
+        self.blocked_types = tuple(blocked_types)
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.page_load_strategy = page_load_strategy
+
+    def __repr__(self):
+        return f"ResourcePolicy(types={list(self.blocked_types)}, hosts={len(self.blocked_hosts)}, strategy={self.page_load_strategy})"
+
+    def blocked_url_patterns(self):
+        """Network.setBlockedURLs に渡すURLパターン (* はワイルドカード)"""
+        patterns = []
+        for resource_type in self.blocked_types:
+            for extension in RESOURCE_TYPE_EXTENSIONS[resource_type]:
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+        for host in self.blocked_hosts:
+            patterns += [f"*://{host}/*", f"*://{host}:*", f"*.{host}/*"]
+        return patterns
+
+    def apply_to_options(self, options):
+        """ブラウザ起動前の設定 (pageLoadStrategy)"""
+        options.page_load_strategy = self.page_load_strategy
+
+    def apply_to_driver(self, driver):
+        """ブラウザ起動後の設定 (DevTools Protocol でリソースをブロックする)"""
+        patterns = self.blocked_url_patterns()
+        if patterns:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+DEFAULT_BLOCKED_TYPES = ('image', 'font', 'stylesheet', 'media')
+NO_RESOURCE_POLICY = ResourcePolicy() # 制限なし (従来の動作: 画像の表示のみ無効)
+DEFAULT_RESOURCE_POLICY = ResourcePolicy(DEFAULT_BLOCKED_TYPES, THIRD_PARTY_BLOCKED_HOSTS, 'eager')
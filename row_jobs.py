@@ -0,0 +1,97 @@
+# row_jobs.py
+# 処理対象の行の前処理 (HPのURLの確認・屋号の整形・Yahoo検索のクエリ・住所の市区町村までの切り出し) を pandas で全行まとめて行う
+# ワーカーは DataFrame に触れず、ここで作った RowJob だけを受け取る。結果は RowResults に集め、最後に DataFrame へまとめて書き込む
+import re
+import numpy as np
+import pandas as pd
+
+# Yahoo(ダイレクト) の検索で屋号から除く部分 (【...】・括弧書き・「の...求人...」)
+DIRECT_NAME_NOISE_PATTERN = re.compile(r'【.*?】|\(.*?\)|（.*?）|の.*?求人.*')
+# Yahoo(一覧) の検索で屋号から除く法人格の略称 ((株) / （有） 等)
+COMPANY_TYPE_PATTERN = re.compile(r'[（\(][株有合][）\)]')
+# Yahoo(一覧) の検索に使う住所の先頭 (都道府県 + 市区町村)
+ADDRESS_CITY_PATTERN = re.compile(r'(?:東京都|北海道|(?:京都|大阪)府|.{2,3}県)(?:[^市]+市|[^区]+区|[^郡]+郡[^町]+町|[^郡]+郡[^村]+村|[^町]+町|[^村]+村)')
+INVALID_SEARCH_VALUES = ('n/a', 'アクセスエラー', '抽出エラー', 'nan', '') # Yahoo(ダイレクト) の検索に使えない屋号・住所
+
+
+class RowJob:
+    """1件の作業単位 (まとめて処理する行インデックスのタプル, HP, 屋号, 住所) と、前処理で作った検索クエリ
+    (行インデックスのタプル, HP, 屋号, 住所) の順に展開できる"""
+    __slots__ = ('row_indices', 'company_hp_url', 'company_name', 'address', 'hp_available', 'direct_query', 'list_query')
+
+    def __init__(self, row_indices, company_hp_url, company_name, address, hp_available, direct_query, list_query):
+        self.row_indices = row_indices
+        self.company_hp_url = company_hp_url
+        self.company_name = company_name
+        self.address = address
+        self.hp_available = hp_available # HPのURLが http で始まる
+        self.direct_query = direct_query # Yahoo(ダイレクト) の検索語 (屋号/住所が無効なら空文字列)
+        self.list_query = list_query # Yahoo(一覧) の検索語
+
+    @classmethod
+    def from_values(cls, row_indices, company_hp_url, company_name, address):
+        """1件分の値から作る (ジョブキューから受け取った作業単位など。build_row_jobs と同じ前処理を1件ずつ行う)"""
+        direct_name = DIRECT_NAME_NOISE_PATTERN.sub('', company_name).strip() or company_name
+        direct_valid = company_name.lower() not in INVALID_SEARCH_VALUES and address.lower() not in INVALID_SEARCH_VALUES
+        city = ADDRESS_CITY_PATTERN.match(address)
+        return cls(row_indices, company_hp_url, company_name, address, company_hp_url.startswith('http'),
+                   f'"{direct_name}" "{address}"' if direct_valid else '',
+                   f'"{COMPANY_TYPE_PATTERN.sub("", company_name).strip()}" "{city.group(0) if city else address}" 電話番号')
+
+    def with_rows(self, row_indices):
+        """行インデックスだけを差し替えた作業単位"""
+        return RowJob(row_indices, self.company_hp_url, self.company_name, self.address, self.hp_available, self.direct_query, self.list_query)
+
+    def __iter__(self):
+        return iter((self.row_indices, self.company_hp_url, self.company_name, self.address))
+
+
+def _text_column(rows, column):
+    """列の値を前後の空白を除いた文字列にする (列がない・空欄・NaN は空文字列)"""
+    if not column or column not in rows.columns:
+        return pd.Series('', index=rows.index, dtype=object)
+    values = rows[column]
+    return values.where(values.notna(), '').astype(str).str.strip()
+
+
+def build_row_jobs(df, target_indices, hp_column_name='HP', company_column=None, address_column=None):
+    """処理対象の行を1行ずつの RowJob のリストにする (前処理は列ごとにまとめて行う)"""
+    rows = df.loc[target_indices]
+    hp_urls = _text_column(rows, hp_column_name)
+    names = _text_column(rows, company_column)
+    addresses = _text_column(rows, address_column)
+
+    direct_names = names.str.replace(DIRECT_NAME_NOISE_PATTERN, '', regex=True).str.strip()
+    direct_names = direct_names.where(direct_names != '', names)
+    direct_valid = ~names.str.lower().isin(INVALID_SEARCH_VALUES) & ~addresses.str.lower().isin(INVALID_SEARCH_VALUES)
+    direct_queries = ('"' + direct_names + '" "' + addresses + '"').where(direct_valid, '')
+    cities = addresses.str.extract(f'^({ADDRESS_CITY_PATTERN.pattern})', expand=False).fillna(addresses)
+    list_queries = '"' + names.str.replace(COMPANY_TYPE_PATTERN, '', regex=True).str.strip() + '" "' + cities + '" 電話番号'
+
+    return [RowJob((index,), *values) for index, *values in zip(rows.index, hp_urls, names, addresses, hp_urls.str.startswith('http'),
+                                                                 direct_queries, list_queries)]
+
+
+class RowResults:
+    """処理対象の行の結果 (行インデックスの順に確保した配列。DataFrame にはまとめて書き込む)"""
+    __slots__ = ('index', 'values', '_positions')
+
+    def __init__(self, target_indices):
+        self.index = pd.Index(target_indices)
+        self.values = np.full(len(self.index), None, dtype=object)
+        self._positions = {index: position for position, index in enumerate(self.index)}
+
+    def set(self, row_indices, value):
+        """行 (行インデックスのリスト。処理対象でない行は無視する) の結果を記録する"""
+        positions = [self._positions[index] for index in row_indices if index in self._positions]
+        self.values[positions] = value
+        return len(positions)
+
+    def assign_to(self, df, column):
+        """記録した結果を df の column 列にまとめて書き込む (未処理の行はそのまま)"""
+        filled = pd.notna(self.values)
+        if not filled.any():
+            return
+        if df[column].dtype != object:
+            df[column] = df[column].astype(object) # 空欄だけの列 (float) に文字列を書き込めるようにする
+        df.loc[self.index[filled], column] = self.values[filled]
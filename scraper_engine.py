@@ -0,0 +1,1486 @@
+# scraper_engine.py
+# 電話番号補完の処理本体 (Streamlitに依存しない)
+# ログは info/success/warning/error を持つ出力先 (st / st.expander / CLIのJSON Lines出力など) に書き出す
+import pandas as pd
+import time
+import random
+import re
+import io
+import threading
+import queue
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager, nullcontext
+from phone_extractor import AreaCodeIndex, extract_phone_from_tiers, extract_phone_from_blocks
+from html_text import YAHOO_RESULT_BLOCKS, get_backend, find_yahoo_spot_phone_text
+from http_fetcher import StaticPageFetcher, looks_js_rendered
+from page_cache import PageNotCached, normalize_url
+from link_discovery import DEFAULT_CANDIDATE_COUNT, rank_link_candidates
+from sitemap_discovery import SitemapDirectory
+from stage_metrics import StageMetrics, StageRecord, active_record, activate, note_html, note_timeout
+from stage_scheduler import DEFAULT_PLAN, HP_CHAIN, YAHOO_CHAIN, StageScheduler
+from time_budget import DEFAULT_ROW_BUDGET_SECONDS, NO_DEADLINE, ROW_TIMEOUT_VALUE, DeadlineExceeded, RowBudget
+from parse_pool import ParsePool, completed_future, default_parse_workers
+from resource_policy import DEFAULT_RESOURCE_POLICY
+from driver_pool import RecyclingDriver
+from streaming_io import DEFAULT_CHUNK_SIZE, ROW_NUMBER_COLUMN, iter_input_chunks, open_result_writer
+from row_jobs import RowResults, build_row_jobs
+from work_units import SharedStageResults, StageResult, group_work_units, hp_unit_key, yahoo_unit_key
+from job_queue import DEFAULT_LEASE_SECONDS, LeasedUnitSource
+# selenium.webdriver (ブラウザの起動・要素の検索) と zipfile は使う時に読み込む (Streamlit の起動・解析プロセスの起動を軽くする)
+# from selenium.webdriver.chrome.service import Service # <-- Streamlit Cloud用に削除
+# from webdriver_manager.chrome import ChromeDriverManager # <-- Streamlit Cloud用に削除
+from urllib.parse import quote_plus, urlparse
+from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException, InvalidSessionIdException, JavascriptException
+
+# --- ▼▼▼ 基本設定 ▼▼▼ ---
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
+]
+DECOY_URLS = ['https://www.yahoo.co.jp/', 'https://www.wikipedia.org/', 'https://www.nikkei.com/']
+YAHOO_SEARCH_URL = "https://search.yahoo.co.jp/search" # 検索クエリは ?p= で渡す (ベンチマークではローカルの代替サーバーに向ける)
+
+COMPANY_LINK_TEXT_KEYWORDS = ['会社概要', '企業情報', '会社案内', '私たちについて']
+COMPANY_LINK_HREF_KEYWORDS = ['company', 'about', 'corporate', 'profile', 'gaiyou']
+SUB_COMPANY_LINK_TEXT_KEYWORDS = ['概要', '沿革', '拠点', '事業所', 'アクセス']
+SUB_COMPANY_LINK_HREF_KEYWORDS = ['outline', 'access', 'location', 'base']
+
+def build_link_xpath(text_keywords, href_keywords):
+    """リンク文字列/href のキーワードから a要素を探すXPathを組み立てる"""
+    return " | ".join(
+        [f"//a[contains(., '{keyword}')]" for keyword in text_keywords] +
+        [f"//a[contains(@href, '{keyword}')]" for keyword in href_keywords]
+    )
+
+COMPANY_LINK_XPATH = build_link_xpath(COMPANY_LINK_TEXT_KEYWORDS, COMPANY_LINK_HREF_KEYWORDS)
+SUB_COMPANY_LINK_XPATH = build_link_xpath(SUB_COMPANY_LINK_TEXT_KEYWORDS, SUB_COMPANY_LINK_HREF_KEYWORDS)
+
+# --- 並列処理設定 ---
+DEFAULT_WORKER_COUNT = 2 # 同時に動かすブラウザ数の初期値
+MAX_WORKER_COUNT = 8
+MAX_CONCURRENT_PER_HOST = 1 # 同一ホストへの同時アクセス数の上限 (ブラウザ数を増やしても1サイトへの負荷は増やさない)
+
+# --- アクセス間隔・ページの準備待ち設定 ---
+POLITENESS_DELAY_SECONDS = 1.0 # 同一ホストへの連続アクセスの最小間隔 (秒)
+POLITENESS_JITTER_SECONDS = 0.5 # 間隔に加えるランダムな揺らぎの最大値 (秒)
+HOST_POLITENESS_DELAYS = {'search.yahoo.co.jp': 2.0} # ホストごとの最小間隔 (上記より長くしたいホスト)
+PAGE_READY_MAX_WAIT = 3.0 # driver.get の後にページの準備を待つ最大秒数 (以前の固定待機と同じ)
+NETWORK_IDLE_SECONDS = 0.5 # リソースの読み込みがこの秒数止まったら読み込み完了とみなす
+READY_POLL_INTERVAL = 0.1
+# DOMに電話番号らしい文字列が現れたら、読み込み途中でも待機を打ち切る (全角数字・区切りも対象)
+PHONE_LIKE_JS_PATTERN = r'[0０][0-9０-９]{1,4}[-－‐()（）\s]{1,3}[0-9０-９]{1,4}[-－‐()（）\s]{1,3}[0-9０-９]{3,4}|[0０][0-9０-９]{9,10}'
+PAGE_STATE_SCRIPT = (
+    "const body = document.body;"
+    "return [document.readyState, performance.getEntriesByType('resource').length,"
+    f" !!(body && /{PHONE_LIKE_JS_PATTERN}/.test(body.innerText))];"
+)
+
+# --- ページキャッシュ設定 ---
+PAGE_CACHE_PATH = "page_cache.sqlite3"
+
+# --- ストリーミング処理で読み込む列 (all_columns=False の場合) ---
+STREAM_COLUMNS = ('電話番号', 'HP', '屋号', '住所', '所在地')
+
+# --- チェックポイント設定 ---
+CHECKPOINT_PATH = "checkpoint.sqlite3"
+
+# --- ステージごとの計測値の出力先 (stage_metrics.py) ---
+STAGE_METRICS_PATH = "stage_metrics.json"
+# --- ステージの所要時間・発見率の実測値 (stage_scheduler.py が実行順の見積もりに使い、実行ごとに更新する) ---
+STAGE_ESTIMATES_PATH = "stage_estimates.json"
+
+AREA_CODE_CSV_PATH = "市外局番リスト.csv"
+
+# --- プロキシ設定用関数 ---
+def create_proxy_extension(proxy_host, proxy_port, proxy_user, proxy_pass):
+    import zipfile
+    manifest_json = """{"version": "1.0.0","manifest_version": 2,"name": "Chrome Proxy","permissions": ["proxy","tabs","unlimitedStorage","storage","<all_urls>","webRequest","webRequestBlocking"],"background": {"scripts": ["background.js"]}}"""
+    background_js = f"""var config = {{mode: "fixed_servers",rules: {{singleProxy: {{scheme: "http",host: "{proxy_host}",port: parseInt({proxy_port})}},bypassList: ["localhost"]}}}};chrome.proxy.settings.set({{value: config, scope: "regular"}}, function() {{}});function callbackFn(details) {{return {{authCredentials: {{username: "{proxy_user}",password: "{proxy_pass}"}}}};}}chrome.webRequest.onAuthRequired.addListener(callbackFn,{{urls: ["<all_urls>"]}},['blocking']);"""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        zf.writestr("manifest.json", manifest_json)
+        zf.writestr("background.js", background_js)
+    return zip_buffer.getvalue()
+
+# --- ★★★ 入力ファイル・市外局番リストの読み込み ★★★ ---
+def _rewind(file):
+    if hasattr(file, 'seek'): file.seek(0)
+
+
+def load_area_codes(path=AREA_CODE_CSV_PATH):
+    """市外局番リストを読み込み、(市外局番の集合, 読み込んだ文字コード) を返す ('市外局番' 列がなければ ValueError)"""
+    try:
+        area_codes_df = pd.read_csv(path, dtype=str, encoding="utf-8-sig"); encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        try:
+            area_codes_df = pd.read_csv(path, dtype=str, encoding="cp932"); encoding = "cp932"
+        except Exception:
+            area_codes_df = pd.read_csv(path, dtype=str, encoding="utf-8"); encoding = "utf-8"
+
+    area_codes_df.columns = area_codes_df.columns.str.strip()
+    if '市外局番' not in area_codes_df.columns:
+        raise ValueError(f"'{path}' に '市外局番' という列が見つかりません。")
+
+    area_codes_df['市外局番'] = area_codes_df['市外局番'].str.strip()
+    return set(area_codes_df['市外局番'].astype(str).str.zfill(2)), encoding
+
+
+def read_input_table(file, filename):
+    """処理対象ファイル (CSV / Excel) を読み込み、(DataFrame, CSVの文字コード) を返す (Excelの場合の文字コードは None)"""
+    if filename.lower().endswith('.csv'):
+        try:
+            df = pd.read_csv(file, dtype=str, encoding="utf-8-sig"); encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            try:
+                _rewind(file)
+                df = pd.read_csv(file, dtype=str, encoding="utf-8"); encoding = "utf-8"
+            except UnicodeDecodeError:
+                _rewind(file)
+                df = pd.read_csv(file, dtype=str, encoding="cp932"); encoding = "cp932"
+    elif filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(file, dtype=str); encoding = None
+    else:
+        raise ValueError("サポートされていないファイル形式です。CSV, XLSX, XLS ファイルを指定してください。")
+
+    df.columns = df.columns.str.strip()
+    return df, encoding
+
+# --- ★★★ 並列処理用ユーティリティ ★★★ ---
+class WaitTimer:
+    """スレッドごとの待ち時間 (アクセス枠・アクセス間隔・ページの準備待ち) の合計秒数"""
+    def __init__(self):
+        self._local = threading.local()
+
+    def total(self):
+        return getattr(self._local, 'total', 0.0)
+
+    def add(self, seconds):
+        self._local.total = self.total() + seconds
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(time.perf_counter() - start)
+
+
+WAIT_TIMER = WaitTimer()
+
+
+class HostConcurrencyLimiter:
+    """ホスト(ドメイン)ごとの同時アクセス数を制限し、同一ホストへの連続アクセスの間隔を空ける"""
+    def __init__(self, max_per_host=MAX_CONCURRENT_PER_HOST, politeness_delay=POLITENESS_DELAY_SECONDS,
+                 host_delays=None, jitter=POLITENESS_JITTER_SECONDS):
+        self.max_per_host = max_per_host
+        self.politeness_delay = politeness_delay
+        self.host_delays = HOST_POLITENESS_DELAYS if host_delays is None else host_delays
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_access = {} # ホストごとの次にアクセスしてよい時刻 (time.monotonic)
+
+    @contextmanager
+    def limit(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+        with WAIT_TIMER.measure():
+            semaphore.acquire()
+        try:
+            with self._lock:
+                delay = self._next_access.get(host, 0) - time.monotonic()
+            if delay > 0:
+                with WAIT_TIMER.measure():
+                    time.sleep(delay)
+            yield
+        finally:
+            with self._lock:
+                interval = self.host_delays.get(host, self.politeness_delay) + random.uniform(0, self.jitter)
+                self._next_access[host] = time.monotonic() + interval
+            semaphore.release()
+
+
+class QueuedStatus:
+    """ワーカースレッドからのログをキューに溜め、メインスレッドで描画するためのプロキシ
+    (Streamlitの要素はスクリプト実行スレッド以外から描画できないため)"""
+    def __init__(self, log_queue, target, prefix=''):
+        self._log_queue = log_queue
+        self._target = target
+        self._prefix = prefix
+
+    def _put(self, level, message):
+        self._log_queue.put((self._target, level, f"{self._prefix}{message}"))
+
+    def info(self, message): self._put('info', message)
+    def success(self, message): self._put('success', message)
+    def warning(self, message): self._put('warning', message)
+    def error(self, message): self._put('error', message)
+
+
+def flush_queued_status(log_queue):
+    """キューに溜まったログをメインスレッドで描画する"""
+    while True:
+        try:
+            target, level, message = log_queue.get_nowait()
+        except queue.Empty:
+            return
+        getattr(target, level)(message)
+
+
+def host_slot(host_limiter, url):
+    """ホストごとの同時アクセス枠 (制限なしの場合は何もしない)"""
+    return host_limiter.limit(url) if host_limiter else nullcontext()
+
+
+def wait_for_page_ready(driver, max_wait=PAGE_READY_MAX_WAIT):
+    """driver.get の後、DOMに電話番号らしい文字列が現れるか、document.readyState が complete で
+    リソースの読み込みが NETWORK_IDLE_SECONDS 止まるまで待つ (最大 max_wait 秒)。待った秒数を返す"""
+    start = time.perf_counter()
+    last_resource_count, idle_since = None, start
+    while True:
+        try:
+            ready_state, resource_count, has_phone = driver.execute_script(PAGE_STATE_SCRIPT)
+        except JavascriptException:
+            ready_state, resource_count, has_phone = 'complete', last_resource_count, False
+        now = time.perf_counter()
+        if has_phone:
+            break
+        if resource_count != last_resource_count:
+            last_resource_count, idle_since = resource_count, now
+        elif ready_state == 'complete' and now - idle_since >= NETWORK_IDLE_SECONDS:
+            break
+        if now - start >= max_wait:
+            break
+        time.sleep(READY_POLL_INTERVAL)
+    waited = time.perf_counter() - start
+    WAIT_TIMER.add(waited)
+    return waited
+
+
+def load_page(driver, url, host_limiter=None, timeout=30, max_wait=PAGE_READY_MAX_WAIT, deadline=NO_DEADLINE):
+    """ホストごとの同時アクセス制限・アクセス間隔を守ってページを読み込み、準備ができるまで (最大 max_wait 秒) 待つ
+    読み込み・準備待ちは deadline (time_budget.Deadline) までに打ち切る (アクセス前に過ぎていれば DeadlineExceeded)"""
+    deadline.check(url)
+    with host_slot(host_limiter, url):
+        deadline.check(url) # アクセス枠・アクセス間隔の待ちの間に過ぎた場合
+        driver.set_page_load_timeout(deadline.timeout(timeout))
+        try:
+            driver.get(url)
+        except TimeoutException:
+            note_timeout()
+            raise
+        if max_wait: wait_for_page_ready(driver, min(max_wait, deadline.remaining()))
+
+# --- ★★★ ページ取得: 軽量HTTP → (必要な場合のみ) ブラウザ ★★★ ---
+class LoadedPage:
+    """取得したページ (HTML文字列のまま保持し、解析はバックエンドに任せる)"""
+    __slots__ = ('url', 'html', 'via_browser')
+
+    def __init__(self, url, html, via_browser):
+        self.url = url
+        self.html = html
+        self.via_browser = via_browser
+
+
+def fetch_page(driver, url, http_fetcher, host_limiter, status_container, page_cache=None, offline=False, deadline=NO_DEADLINE):
+    """キャッシュ → 軽量HTTP取得 → (JS描画が必要そうな場合のみ) ブラウザ の順でページを取得する
+    (offline=True ではキャッシュのみを使い、無ければ PageNotCached。deadline を過ぎたら DeadlineExceeded)"""
+    if page_cache:
+        cached = page_cache.get(url)
+        if cached:
+            status_container.info(" -> キャッシュ済みのページを使用します。")
+            note_html(cached.html, cached=True)
+            return LoadedPage(cached.url, cached.html, False)
+    if offline:
+        raise PageNotCached(url)
+    page = None
+    if http_fetcher:
+        deadline.check(url)
+        with host_slot(host_limiter, url):
+            fetched = http_fetcher.fetch(url, timeout=deadline.timeout(http_fetcher.timeout))
+        if fetched:
+            note_html(fetched.html)
+        if fetched and not looks_js_rendered(fetched.html):
+            page = LoadedPage(fetched.url, fetched.html, False)
+        else:
+            status_container.info(" -> 静的HTMLでは本文を取得できないため、ブラウザで読み込みます。")
+    if page is None:
+        load_page(driver, url, host_limiter, deadline=deadline)
+        page = LoadedPage(driver.current_url or url, driver.page_source, True)
+        note_html(page.html)
+    if page_cache:
+        page_cache.put(url, page.html, page.url)
+    return page
+
+def fetch_static_page(url, http_fetcher, host_limiter, page_cache=None, offline=False, cancelled=None, deadline=NO_DEADLINE):
+    """キャッシュ → 軽量HTTP取得 だけでページを取得する (ブラウザが必要なページ・取得できないページは None)
+    ブラウザを使わないため別スレッドから呼び出せる。cancelled (threading.Event) が立っているか deadline を過ぎていればアクセスしない"""
+    if page_cache:
+        cached = page_cache.get(url)
+        if cached:
+            note_html(cached.html, cached=True)
+            return LoadedPage(cached.url, cached.html, False)
+    if offline or http_fetcher is None or (cancelled and cancelled.is_set()) or deadline.expired():
+        return None
+    with host_slot(host_limiter, url):
+        if (cancelled and cancelled.is_set()) or deadline.expired():
+            return None
+        fetched = http_fetcher.fetch(url, timeout=deadline.timeout(http_fetcher.timeout))
+    if fetched:
+        note_html(fetched.html)
+    if not fetched or looks_js_rendered(fetched.html):
+        return None
+    if page_cache:
+        page_cache.put(url, fetched.html, fetched.url)
+    return LoadedPage(fetched.url, fetched.html, False)
+
+
+class CandidatePrefetch:
+    """候補ページの静的取得 (fetch_static_page) を裏で始めておく (前のページの電話番号抽出を待つ間に取得を進める)
+    search_candidate_pages に渡すと取得済み・取得中のページをそのまま使う。取得したバイト数は record に数え、使う時にそのステージに移す"""
+    __slots__ = ('urls', 'record', '_cancelled', '_executor', '_futures')
+
+    def __init__(self, urls, http_fetcher, host_limiter, page_cache=None, offline=False, deadline=NO_DEADLINE):
+        self.urls = list(urls)
+        self.record = StageRecord()
+        self._cancelled = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.urls), thread_name_prefix="candidate-prefetch")
+
+        def fetch(url):
+            with activate(self.record):
+                return fetch_static_page(url, http_fetcher, host_limiter, page_cache, offline, self._cancelled, deadline)
+
+        self._futures = {url: self._executor.submit(fetch, url) for url in self.urls}
+
+    def page(self, url):
+        """url の取得結果を待って返す (fetch_static_page と同じく、静的HTMLで読めなければ None)"""
+        return self._futures[url].result()
+
+    def finish(self, stage_record=None):
+        """まだアクセスしていない候補を打ち切り、それまでに取得したバイト数を stage_record (そのステージの StageRecord) に移す"""
+        self._cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if stage_record is not None:
+            stage_record.bytes += self.record.bytes
+            stage_record.cache_hits += self.record.cache_hits
+        self.record = StageRecord()
+
+
+def search_candidate_pages(driver, candidate_urls, search_step, area_code_index, status_container, host_limiter=None, http_fetcher=None,
+                           html_backend=None, page_cache=None, offline=False, deadline=NO_DEADLINE, prefetch=None):
+    """候補ページを同時に取得し、最初に電話番号が見つかった時点で残りを打ち切る
+    (静的HTMLで読めなかった候補だけを、順位順にブラウザで読み込む)。(電話番号, 取得したページ, 取得回数, ブラウザを使ったか) を返す
+    deadline を過ぎたら残りの候補を打ち切って DeadlineExceeded。prefetch (CandidatePrefetch) の候補はその取得結果を使う"""
+    pages, fetch_count, used_browser = [], 0, False
+    needs_browser = []
+    cancelled = threading.Event()
+    stage_record = active_record() # 取得したバイト数は呼び出し元のステージに数える
+    prefetched = set(prefetch.urls) if prefetch else set()
+
+    def fetch_and_extract(url):
+        if url in prefetched:
+            page = prefetch.page(url)
+        else:
+            with activate(stage_record):
+                page = fetch_static_page(url, http_fetcher, host_limiter, page_cache, offline, cancelled, deadline)
+        return page, extract_phone_number(page.html, area_code_index, status_container, html_backend) if page else None
+
+    executor = ThreadPoolExecutor(max_workers=len(candidate_urls), thread_name_prefix="candidate-fetch")
+    try:
+        futures = {executor.submit(fetch_and_extract, url): url for url in candidate_urls}
+        remaining = deadline.remaining()
+        try:
+            for future in as_completed(futures, timeout=None if remaining == math.inf else remaining):
+                url = futures[future]
+                page, found_phone = future.result()
+                fetch_count += 1
+                if page is None:
+                    needs_browser.append(url)
+                    continue
+                pages.append(page)
+                if found_phone:
+                    status_container.success(f"{search_step}で番号抽出成功: {found_phone} ({url})")
+                    cancelled.set()
+                    return found_phone, pages, fetch_count, used_browser
+        except FuturesTimeoutError:
+            raise DeadlineExceeded(search_step) from None
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if prefetch:
+            prefetch.finish(stage_record)
+
+    for url in sorted(needs_browser, key=candidate_urls.index):
+        if offline:
+            status_container.warning(f"キャッシュにページがありません({search_step}): {url}")
+            continue
+        if driver is None:
+            continue
+        status_container.info(f" -> 静的HTMLでは本文を取得できないため、ブラウザで読み込みます: {url}")
+        try:
+            page = fetch_page(driver, url, None, host_limiter, status_container, page_cache, deadline=deadline)
+        except (TimeoutException, WebDriverException) as e:
+            used_browser = True
+            status_container.warning(f"ページロードエラー({search_step}): {e}")
+            continue
+        used_browser = used_browser or page.via_browser
+        pages.append(page)
+        found_phone = extract_phone_number(page.html, area_code_index, status_container, html_backend)
+        if found_phone:
+            status_container.success(f"{search_step}で番号抽出成功: {found_phone} ({url})")
+            return found_phone, pages, fetch_count, used_browser
+    return None, pages, fetch_count, used_browser
+
+
+def page_links(pages, html_backend):
+    """取得したページの a要素を (href, リンク文字列, ページのURL) で返す"""
+    return [(href, text, page.url) for page in pages for href, text in html_backend.links(page.html)]
+
+# --- ★★★ 電話番号抽出関連関数 ★★★ ---
+def extract_phone_number(html, area_code_index, status_container, html_backend=None):
+    """HTMLから電話番号を抽出 (script/style/header/nav/aside は除外。抽出中のエラーは status_container に警告して None)
+    tel: リンク → <address>・<footer>・TEL/電話 の見出しの隣のセル → schema.org の telephone → ページ全体 の順に探し、見つかった時点で打ち切る
+    html_backend が parse_pool.ParsePool の場合は、解析と抽出をまとめて解析プロセスで行う"""
+    try:
+        html_backend = html_backend or get_backend()
+        if isinstance(html_backend, ParsePool):
+            return html_backend.extract_phone(html)
+        return extract_phone_from_tiers(html_backend.phone_tiers(html), area_code_index)
+    except Exception as e:
+        status_container.warning(f"電話番号抽出中にエラー: {e}"); return None
+
+
+def start_phone_extraction(html, area_code_index, status_container, html_backend=None):
+    """extract_phone_number を開始し、結果 (電話番号 / None) の Future を返す
+    html_backend が ParsePool の場合は解析プロセスで抽出し、呼び出し元はその間に次のページの取得を進められる (それ以外は抽出済みの Future)"""
+    if isinstance(html_backend, ParsePool):
+        return html_backend.submit_extract_phone(html)
+    return completed_future(lambda: extract_phone_number(html, area_code_index, status_container, html_backend))
+
+
+def phone_extraction_result(future, status_container):
+    """start_phone_extraction の結果を待つ (解析プロセスでのエラー等は status_container に警告して None)"""
+    try:
+        return future.result()
+    except Exception as e:
+        status_container.warning(f"電話番号抽出中にエラー: {e}"); return None
+
+# --- ★★★ Yahoo検索(検索結果ページ)から電話番号を探す関数 ★★★ ---
+def search_yahoo_search_phone(driver, job, status_container, host_limiter=None, page_cache=None, offline=False, deadline=NO_DEADLINE):
+    """Yahoo検索結果ページから施設名と住所 (作業単位 job の検索語) で電話番号を探す (deadline を過ぎたら DeadlineExceeded)"""
+    phone_number = 'N/A'
+    if not job.direct_query:
+        status_container.info(f" -> 屋号/住所が無効なためYahoo検索(ダイレクト)スキップ。(屋号: {job.company_name}, 住所: {job.address})")
+        return phone_number
+
+    search_query = job.direct_query
+    status_container.info(f" -> Yahoo検索(ダイレクト)開始: '{search_query}'")
+
+    try:
+        search_url = f"{YAHOO_SEARCH_URL}?p={quote_plus(search_query)}"
+        cached = page_cache.get(search_url) if page_cache else None
+        if cached:
+            status_container.info(f" -> キャッシュ済みのYahoo検索ページを使用します: {search_url}")
+            note_html(cached.html, cached=True)
+        elif offline:
+            status_container.warning(f" -> Yahoo検索ページ ({search_url}) がキャッシュにありません。")
+            return phone_number
+        else:
+            status_container.info(f" -> Yahoo検索ページに移動します: {search_url}")
+            load_page(driver, search_url, host_limiter, max_wait=2.0, deadline=deadline)
+            page_source = driver.page_source
+            note_html(page_source)
+            if page_cache:
+                page_cache.put(search_url, page_source, driver.current_url)
+
+        phone_xpath = "//span[contains(@class, 'AnswerLocalSpot__subInfoSpotDetail') and text()='電話：']/following-sibling::span[1]"
+
+        try:
+            status_container.info(f" -> 電話番号要素 ({phone_xpath}) を検索...")
+            if cached:
+                phone_text = find_yahoo_spot_phone_text(cached.html)
+                if phone_text is None: raise NoSuchElementException(phone_xpath)
+            else:
+                from selenium.webdriver.common.by import By
+                phone_element = driver.find_element(By.XPATH, phone_xpath)
+                phone_text = phone_element.text.strip()
+
+            if phone_text and re.fullmatch(r'[\d-]+', phone_text):
+                phone_number = phone_text
+                status_container.success(f" ----> 電話番号候補 (Yahoo検索結果): {phone_number}")
+            else:
+                status_container.warning(f" ----> 電話番号要素のテキストが不正または空: '{phone_text}'")
+
+        except NoSuchElementException:
+            status_container.warning(f" ----> 電話番号要素 ({phone_xpath}) が見つかりませんでした。")
+        except Exception as e_phone:
+            status_container.error(f" ----> 電話番号抽出(Yahoo検索結果)エラー: {e_phone}")
+
+    except InvalidSessionIdException as e_sid:
+        status_container.error(f" -> Yahoo検索中にセッション無効: {e_sid}"); raise
+    except DeadlineExceeded:
+        raise
+    except TimeoutException:
+        status_container.warning(f" -> Yahoo検索ページ ({search_url}) の読み込みタイムアウト。")
+    except Exception as e:
+        status_container.error(f" -> Yahoo検索中に予期せぬエラー: {e}")
+
+    return phone_number
+
+# --- ★★★ (従来の)Yahoo検索(検索結果一覧)で電話番号を探す関数 ★★★ ---
+def search_yahoo_for_phone(query, driver, area_code_index, status_container, host_limiter=None, html_backend=None, page_cache=None, offline=False,
+                           deadline=NO_DEADLINE):
+    """(従来)Yahoo検索結果一覧から電話番号を抽出する (deadline を過ぎたら DeadlineExceeded)"""
+    try:
+        status_container.info(f"(予備) Yahoo検索(一覧)を実行: {query}")
+        search_url = f"{YAHOO_SEARCH_URL}?p={quote_plus(query)}"
+        cached = page_cache.get(search_url) if page_cache else None
+        if cached:
+            status_container.info("(予備) キャッシュ済みのYahoo検索ページを使用します。")
+            page_source = cached.html
+            note_html(page_source, cached=True)
+        elif offline:
+            status_container.warning(f"(予備) Yahoo検索ページ ({search_url}) がキャッシュにありません。")
+            return None
+        else:
+            load_page(driver, search_url, host_limiter, max_wait=3.0, deadline=deadline)
+            page_source = driver.page_source
+            note_html(page_source)
+            if page_cache:
+                page_cache.put(search_url, page_source, driver.current_url)
+
+        html_backend = html_backend or get_backend()
+        block_texts = html_backend.block_texts(page_source, YAHOO_RESULT_BLOCKS, limit=5)
+
+        return extract_phone_from_blocks(block_texts, area_code_index)
+
+    except (TimeoutException, WebDriverException) as e:
+        status_container.warning(f"(予備) Yahoo検索(一覧)中にタイムアウトまたはエラー: {e}")
+        return None
+    except InvalidSessionIdException as e_sid:
+        status_container.error(f" -> Yahoo検索(一覧)中にセッション無効: {e_sid}"); raise
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        status_container.error(f"(予備) Yahoo検索(一覧)中に予期せぬエラー: {e}")
+        return None
+
+# --- ★★★ (新) ブラウザ起動関数 ★★★ ---
+# 元の処理からブラウザ起動ロジックを分離
+def initialize_driver(status_container, proxy_settings, disable_headless, alert_container=None, resource_policy=None):
+    """WebDriverインスタンスを初期化して返す (resource_policy 省略時は DEFAULT_RESOURCE_POLICY でリソースを制限する)"""
+    alert_container = alert_container or status_container # ワーカースレッドからは QueuedStatus を渡す
+    resource_policy = resource_policy or DEFAULT_RESOURCE_POLICY
+    try:
+        status_container.info("ブラウザを起動しています...");
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        options = Options()
+        options.add_argument(f'user-agent={random.choice(USER_AGENTS)}')
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument(f'--window-size=1920,1980')
+        options.add_argument('--disable-gpu'); options.add_argument('--lang=ja-JP,ja;q=0.9')
+        options.add_argument("--disable-blink-features=AutomationControlled")
+        options.add_experimental_option("excludeSwitches", ["enable-automation"]); options.add_experimental_option('useAutomationExtension', False)
+        resource_policy.apply_to_options(options)
+
+        proxy_values = {k: v for k, v in proxy_settings.items() if v}
+        if all(k in proxy_values for k in ['proxy_host', 'proxy_port', 'proxy_user', 'proxy_pass']):
+            try:
+                options.add_extension(io.BytesIO(create_proxy_extension(**proxy_values)))
+                status_container.info("プロキシ設定を適用しました。")
+            except Exception as e:
+                alert_container.error(f"プロキシ設定エラー: {e}")
+
+        # --- Streamlit Cloud デプロイ用設定 ---
+        options.add_argument('--headless=new') # ヘッドレスモードを強制
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument('--disable-gpu')
+
+        if not disable_headless:
+            alert_container.info("（デプロイ環境ではヘッドレスモードが強制されます）")
+        
+        # システムパスの driver を使う
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(30)
+        try:
+            resource_policy.apply_to_driver(driver)
+        except Exception as e:
+            status_container.warning(f"リソースのブロック設定を適用できませんでした: {e}")
+        status_container.success("ブラウザの起動が完了しました。")
+        return driver
+    
+    except Exception as e_setup:
+        alert_container.error(f"WebDriverの起動に失敗しました: {e_setup}")
+        return None
+
+
+def warm_driver_key(proxy_settings, disable_headless, resource_policy=None):
+    """initialize_driver の設定のうちブラウザの起動時に決まるもの (WarmDriverPool で同じ設定のブラウザだけを使い回す)"""
+    resource_policy = resource_policy or DEFAULT_RESOURCE_POLICY
+    return (tuple(sorted((k, v) for k, v in proxy_settings.items() if v)), bool(disable_headless),
+            resource_policy.blocked_types, resource_policy.blocked_hosts, resource_policy.page_load_strategy)
+
+
+class RowProcessingError(Exception):
+    """行の処理中に発生したエラーと、その時点の検索ステップ"""
+    def __init__(self, search_step, original):
+        super().__init__(str(original))
+        self.search_step = search_step
+        self.original = original
+
+
+def overview_candidates(page, company_hp_url, html_backend, sitemap_directory, candidate_count, status_container):
+    """トップページ (取得できなかった場合は page=None) のリンクとサイトマップから概要ページの候補を探し、(基準のURL, 順位順の候補のURL) を返す"""
+    base_url = page.url if page else company_hp_url
+    links = page_links([page], html_backend) if page else []
+    candidates = rank_link_candidates(links, base_url, COMPANY_LINK_TEXT_KEYWORDS, COMPANY_LINK_HREF_KEYWORDS,
+                                      exclude_urls=(company_hp_url, base_url), limit=candidate_count)
+    if sitemap_directory:
+        sitemap_candidates = [url for url in sitemap_directory.candidates(base_url, candidate_count)
+                              if normalize_url(url) not in {normalize_url(company_hp_url), normalize_url(base_url)}]
+        if sitemap_candidates:
+            status_container.info(f"サイトマップから概要ページの候補を発見: {', '.join(sitemap_candidates)}")
+            known = {normalize_url(url) for url in sitemap_candidates}
+            candidates = (sitemap_candidates + [url for url in candidates if normalize_url(url) not in known])[:candidate_count]
+    return base_url, candidates
+
+
+# --- ★★★ HP → 概要1 → 概要2 で電話番号を探す (HPステージ) ★★★ ---
+def resolve_hp_phone(driver, company_hp_url, area_code_index, status_container, host_limiter=None, http_fetcher=None, html_backend=None,
+                     page_cache=None, offline=False, candidate_count=DEFAULT_CANDIDATE_COUNT, sitemap_directory=None, stage_metrics=None,
+                     skip_stages=frozenset(), budget=None):
+    """企業HPのトップ・概要ページから電話番号を探し、StageResult を返す
+    概要ページは取得済みのHTMLのリンクから探し、各段階で上位 candidate_count 件の候補を取得する
+    sitemap_directory (sitemap_discovery.SitemapDirectory) を渡すと、サイトマップに載っている会社概要ページを優先して候補にする
+    stage_metrics (stage_metrics.StageMetrics) には HP / 概要1 / 概要2 ステージの計測値を記録する
+    skip_stages に含まれる 概要1 / 概要2 は実行しない (stage_scheduler.py の速度優先)
+    budget (time_budget.RowBudget) を渡すと、各ステージを配分された時間で打ち切る (行の予算を使い切ったら DeadlineExceeded)
+    トップページの抽出を解析プロセスで行う間に、概要ページの候補の静的取得を始めておく (トップページに番号があれば打ち切る)"""
+    stage_metrics = stage_metrics or StageMetrics()
+    budget = budget or RowBudget(None)
+    found_phone = None
+    current_search_step = "HP"
+    used_browser = False
+    fetch_count = 0
+    timed_out = False
+    base_url, candidates_l1, prefetch = company_hp_url, None, None
+
+    try:
+        status_container.info(f"アクセス中: {company_hp_url}")
+        page = None
+        deadline = budget.stage(current_search_step)
+        with stage_metrics.measure(current_search_step) as record:
+            try:
+                fetch_count += 1
+                page = fetch_page(driver, company_hp_url, http_fetcher, host_limiter, status_container, page_cache, offline, deadline)
+                used_browser = used_browser or page.via_browser
+                phone_future = start_phone_extraction(page.html, area_code_index, status_container, html_backend)
+                if not phone_future.done() and '概要1' not in skip_stages:
+                    # 抽出を待つ間に概要ページの候補を探し、静的取得を始めておく
+                    base_url, candidates_l1 = overview_candidates(page, company_hp_url, html_backend, sitemap_directory, candidate_count,
+                                                                  status_container)
+                    if candidates_l1:
+                        prefetch = CandidatePrefetch(candidates_l1, http_fetcher, host_limiter, page_cache, offline, budget.deadline)
+                found_phone = phone_extraction_result(phone_future, status_container)
+                if found_phone:
+                    status_container.success(f"HPトップで番号抽出成功: {found_phone}")
+                    if prefetch:
+                        prefetch.finish(record) # 先に始めた概要ページの取得は打ち切る
+            except PageNotCached:
+                status_container.warning(f"キャッシュにページがありません({current_search_step})。")
+            except DeadlineExceeded:
+                record.timeout = timed_out = True
+                status_container.warning(f"{current_search_step}に配分した時間を超えたため打ち切ります。")
+            except (TimeoutException, WebDriverException) as e:
+                used_browser = True
+                status_container.warning(f"ページロードエラー({current_search_step})。下層ページ検索へ移行: {e}")
+                found_phone = None
+            record.found = bool(found_phone)
+
+        # --- 概要ページ1: 取得済みのHTMLから候補リンクを探して順位付けし、上位の候補を同時に取得する ---
+        if not found_phone and '概要1' in skip_stages:
+            status_container.info("トップページに番号なし。概要ページの検索は省略します (速度優先)。")
+        elif not found_phone:
+            status_container.info("トップページに番号なし。概要ページを探します...")
+            if candidates_l1 is None:
+                base_url, candidates_l1 = overview_candidates(page, company_hp_url, html_backend, sitemap_directory, candidate_count,
+                                                              status_container)
+            if candidates_l1:
+                status_container.success(f"概要ページの候補を発見！ -> {', '.join(candidates_l1)}")
+                current_search_step = "概要1"
+                deadline = budget.stage(current_search_step)
+                with stage_metrics.measure(current_search_step) as record:
+                    try:
+                        found_phone, pages_l1, fetched, browser_used = search_candidate_pages(
+                            driver, candidates_l1, current_search_step, area_code_index, status_container,
+                            host_limiter, http_fetcher, html_backend, page_cache, offline, deadline, prefetch)
+                    except DeadlineExceeded:
+                        record.timeout = timed_out = True
+                        status_container.warning(f"{current_search_step}に配分した時間を超えたため打ち切ります。")
+                        found_phone, pages_l1, fetched, browser_used = None, [], len(candidates_l1), False
+                    record.found = bool(found_phone)
+                fetch_count += fetched
+                used_browser = used_browser or browser_used
+
+                # --- 概要ページ2 ---
+                if not found_phone and pages_l1 and '概要2' not in skip_stages:
+                    status_container.info("概要1に番号なし。さらに詳細ページを探します...")
+                    candidates_l2 = rank_link_candidates(page_links(pages_l1, html_backend), base_url,
+                                                         SUB_COMPANY_LINK_TEXT_KEYWORDS, SUB_COMPANY_LINK_HREF_KEYWORDS,
+                                                         exclude_urls=(company_hp_url, base_url, *candidates_l1, *(p.url for p in pages_l1)),
+                                                         limit=candidate_count)
+                    if candidates_l2:
+                        status_container.success(f"詳細ページの候補を発見！ -> {', '.join(candidates_l2)}")
+                        current_search_step = "概要2"
+                        deadline = budget.stage(current_search_step)
+                        with stage_metrics.measure(current_search_step) as record:
+                            try:
+                                found_phone, _, fetched, browser_used = search_candidate_pages(
+                                    driver, candidates_l2, current_search_step, area_code_index, status_container,
+                                    host_limiter, http_fetcher, html_backend, page_cache, offline, deadline)
+                            except DeadlineExceeded:
+                                record.timeout = timed_out = True
+                                status_container.warning(f"{current_search_step}に配分した時間を超えたため打ち切ります。")
+                                found_phone, fetched, browser_used = None, len(candidates_l2), False
+                            record.found = bool(found_phone)
+                        fetch_count += fetched
+                        used_browser = used_browser or browser_used
+                    else:
+                        status_container.info("詳細ページの候補が見つかりません。")
+            else:
+                status_container.info("概要ページの候補が見つかりません。")
+
+    except (InvalidSessionIdException, DeadlineExceeded):
+        raise
+    except Exception as e:
+        # どのステップで失敗したかを呼び出し元に伝える
+        raise RowProcessingError(current_search_step, e) from e
+    finally:
+        if prefetch:
+            prefetch.finish() # 使わなかった先行取得を打ち切る (使った場合は打ち切り済み)
+
+    return StageResult(found_phone, fetch_count, used_browser, timed_out)
+
+
+# --- ★★★ Yahoo(ダイレクト) → Yahoo(一覧) で電話番号を探す (Yahooステージ) ★★★ ---
+def resolve_yahoo_phone(driver, job, area_code_index, status_container, host_limiter=None, html_backend=None,
+                        page_cache=None, offline=False, stage_metrics=None, skip_stages=frozenset(), budget=None):
+    """作業単位 job (row_jobs.RowJob) の屋号と住所のYahoo検索で電話番号を探し、StageResult を返す (stage_metrics にはYahooの2ステージの計測値を記録する)
+    skip_stages に含まれる Yahoo(ダイレクト) / Yahoo(一覧) は実行しない (stage_scheduler.py の速度優先)
+    budget (time_budget.RowBudget) を渡すと、各検索を配分された時間で打ち切る (行の予算を使い切ったら DeadlineExceeded)"""
+    stage_metrics = stage_metrics or StageMetrics()
+    budget = budget or RowBudget(None)
+    found_phone = None
+    fetch_count = 0
+    timed_out = False
+    if "Yahoo(ダイレクト)" not in skip_stages:
+        fetch_count += 1
+        deadline = budget.stage("Yahoo(ダイレクト)")
+        with stage_metrics.measure("Yahoo(ダイレクト)") as record:
+            try:
+                found_phone_direct = search_yahoo_search_phone(driver, job, status_container, host_limiter, page_cache, offline,
+                                                               deadline)
+            except DeadlineExceeded:
+                record.timeout = timed_out = True
+                status_container.warning("Yahoo検索(ダイレクト)に配分した時間を超えたため打ち切ります。")
+                found_phone_direct = None
+            record.found = bool(found_phone_direct and found_phone_direct != 'N/A')
+        if found_phone_direct and found_phone_direct != 'N/A':
+            found_phone = found_phone_direct
+            status_container.success(f"Yahoo検索(ダイレクト)で番号抽出成功: {found_phone}")
+
+    if not found_phone and "Yahoo(一覧)" in skip_stages:
+        status_container.info("Yahoo検索(一覧)は省略します (速度優先)。")
+    elif not found_phone:
+        status_container.info("Yahoo検索(ダイレクト)でも見つかりません。(予備)Yahoo検索(一覧)で補完します...")
+        query = job.list_query
+        fetch_count += 1
+        deadline = budget.stage("Yahoo(一覧)")
+        with stage_metrics.measure("Yahoo(一覧)") as record:
+            try:
+                found_phone_list = search_yahoo_for_phone(query, driver, area_code_index, status_container, host_limiter, html_backend, page_cache,
+                                                          offline, deadline)
+            except DeadlineExceeded:
+                record.timeout = timed_out = True
+                status_container.warning("Yahoo検索(一覧)に配分した時間を超えたため打ち切ります。")
+                found_phone_list = None
+            record.found = bool(found_phone_list)
+        if found_phone_list:
+            found_phone = found_phone_list
+            status_container.success(f"(予備)Yahoo検索(一覧)で電話番号を抽出: {found_phone}")
+        else:
+            status_container.warning("(予備)Yahoo検索(一覧)でも電話番号は見つかりませんでした。")
+
+    return StageResult(found_phone, fetch_count, not offline and fetch_count > 0, timed_out)
+
+
+# --- ★★★ 1件分の処理: HP → 概要1 → 概要2 → Yahoo(ダイレクト) → Yahoo(一覧) (実行順は stage_scheduler で変わる) ★★★ ---
+def process_row(driver, job, area_code_index, status_container, host_limiter=None, http_fetcher=None, html_backend=None,
+                page_cache=None, offline=False, stage_results=None, sitemap_directory=None, stage_metrics=None, stage_scheduler=None,
+                budget=None):
+    """1件の作業単位 job (row_jobs.RowJob) の電話番号を探し、(記録する値, ブラウザを使ったか, ページ取得回数) を返す
+    (同じHP / 同じ屋号+住所のステージ結果は stage_results から再利用する。InvalidSessionIdException等は呼び出し元で処理)
+    stage_scheduler (stage_scheduler.StageScheduler) を渡すと、HP系列 / Yahoo系列の実行順と省略するステージをその見積もりで決める
+    budget (time_budget.RowBudget) の予算を使い切ったら残りのステージを実行せず、ROW_TIMEOUT_VALUE を記録する値とする"""
+    row_indices, company_hp_url, company_name, address = job
+    stage_results = stage_results or SharedStageResults()
+    budget = budget or RowBudget(None)
+
+    yahoo_search_possible_for_this_row = bool(company_name) and bool(address) 
+    if not yahoo_search_possible_for_this_row:
+         status_container.info(f" -> 屋号/住所が空欄または無効なため、Yahoo検索はスキップします。 (屋号: '{company_name}', 住所: '{address}')")
+
+    found_phone = None
+    used_browser = False
+    fetch_count = 0
+    html_backend = html_backend or get_backend()
+    hp_available = job.hp_available
+    plan = stage_scheduler.plan(hp_available, yahoo_search_possible_for_this_row) if stage_scheduler else DEFAULT_PLAN
+    if plan.order[0] == 'Yahoo' and hp_available and yahoo_search_possible_for_this_row:
+        status_container.info("所要時間と発見率の見積もりにより、Yahoo検索を企業HPより先に実行します。")
+    # 実行しないステージの配分は、実行するステージに回す
+    budget.discard(plan.skip)
+    budget.discard(() if hp_available else HP_CHAIN)
+    budget.discard(() if yahoo_search_possible_for_this_row else YAHOO_CHAIN)
+
+    try:
+        for chain in plan.order:
+            if found_phone:
+                break
+            # --- HP URLがある場合のみサイト訪問 ---
+            if chain == 'HP':
+                if not hp_available:
+                    status_container.info("「HP」のURLが無効または空です。Yahoo検索を試みます。")
+                    continue
+                hp_result, reused = stage_results.run(
+                    # 省略したステージがある結果は、同じステージを省略する行でのみ再利用する (省略しない行・再計測の行では実行する)
+                    ('HP', hp_unit_key(company_hp_url), plan.skip.intersection(HP_CHAIN)),
+                    lambda: resolve_hp_phone(driver, company_hp_url, area_code_index, status_container, host_limiter, http_fetcher, html_backend,
+                                             page_cache, offline, sitemap_directory=sitemap_directory, stage_metrics=stage_metrics,
+                                             skip_stages=plan.skip, budget=budget),
+                    budget.deadline)
+                budget.discard(HP_CHAIN) # 見つからなかった・候補がなかったステージの残りは Yahoo系列に回す
+                if reused:
+                    status_container.info(f"同じHP ({company_hp_url}) の処理結果を再利用します: {hp_result.phone or '番号なし'}")
+                else:
+                    used_browser = used_browser or hp_result.used_browser
+                    fetch_count += hp_result.fetch_count
+                found_phone = hp_result.phone
+
+            # --- Yahoo検索 (HPで見つからない or HPがない場合。見積もりによってはHPより先) ---
+            elif yahoo_search_possible_for_this_row:
+                if plan.order[0] == 'HP':
+                    status_container.info("企業HPから番号が見つからなかったか「HP」がありません。Yahoo検索(ダイレクト)で補完します...")
+                yahoo_result, reused = stage_results.run(
+                    ('Yahoo', yahoo_unit_key(company_name, address), plan.skip.intersection(YAHOO_CHAIN)),
+                    lambda: resolve_yahoo_phone(driver, job, area_code_index, status_container, host_limiter, html_backend,
+                                                page_cache, offline, stage_metrics, plan.skip, budget),
+                    budget.deadline)
+                budget.discard(YAHOO_CHAIN)
+                if reused:
+                    status_container.info(f"同じ屋号+住所の検索結果を再利用します: {yahoo_result.phone or '番号なし'}")
+                else:
+                    used_browser = used_browser or yahoo_result.used_browser
+                    fetch_count += yahoo_result.fetch_count
+                found_phone = yahoo_result.phone
+            else:
+                status_container.warning("会社名(屋号)/住所が無効なため、Yahoo検索(ダイレクト)はスキップします。")
+                status_container.warning("会社名(屋号)/住所が無効なため、(予備)Yahoo検索(一覧)はスキップします。")
+
+    except DeadlineExceeded as e:
+        status_container.warning(f"1件あたりの処理時間の上限を超えたため、残りの検索 ({e}〜) を打ち切ります。")
+        return ROW_TIMEOUT_VALUE, used_browser, fetch_count
+    except (InvalidSessionIdException, RowProcessingError):
+        raise
+    except Exception as e:
+        raise RowProcessingError("Yahoo", e) from e
+
+    # --- 抽出結果の記録値 ---
+    if not found_phone and budget.deadline.expired():
+        return ROW_TIMEOUT_VALUE, used_browser, fetch_count # 最後のステージの途中で予算を使い切った
+    return (found_phone if found_phone else '見つかりません'), used_browser, fetch_count
+
+
+# --- ★★★ ワーカースレッド: 1ワーカー = 1ブラウザ ★★★ ---
+def scraping_worker(worker_id, job_queue, result_queue, stop_event, log_queue, status_container,
+                    proxy_settings, disable_headless, area_code_index, host_limiter, http_fetcher=None, html_backend=None,
+                    page_cache=None, offline=False, stage_results=None, alert_container=None, resource_policy=None, recycle_policy=None,
+                    sitemap_directory=None, driver_factory=None, stage_metrics=None, stage_scheduler=None,
+                    row_budget_seconds=DEFAULT_ROW_BUDGET_SECONDS, run_deadline=None, warm_driver_pool=None):
+    """共有キューから作業単位を取り出して処理し、結果をまとめた行ごとに result_queue に送る (offline=True ではブラウザを起動しない)
+    ブラウザはメモリ使用量・ページ数の上限 (recycle_policy) で、裏で起動しておいた待機ブラウザに入れ替える
+    1件の処理は row_budget_seconds 秒 (実行全体の締め切り run_deadline まで) で打ち切る。run_deadline で打ち切った作業単位は結果を送らずキューに戻す
+    warm_driver_pool (driver_pool.WarmDriverPool) を渡すと、前回の実行で起動したままのブラウザを使い、終了時にはブラウザを終了せずに預ける"""
+    worker_status = QueuedStatus(log_queue, status_container, prefix=f"[W{worker_id}] ")
+    stage_results = stage_results or SharedStageResults()
+    worker_alert = QueuedStatus(log_queue, alert_container or status_container, prefix=f"[W{worker_id}] ")
+
+    # ▼▼▼ ブラウザの入れ替え（メモリ対策）▼▼▼
+    # 入れ替えは待機ブラウザへの切り替えだけで済み、古いブラウザは裏で終了する (driver_pool.py)
+    # driver_factory (引数なしでブラウザを返す関数) を渡すと initialize_driver の代わりに使う (ベンチマーク用の代替ブラウザなど)
+    browser = RecyclingDriver(driver_factory or (lambda: initialize_driver(worker_status, proxy_settings, disable_headless, worker_alert, resource_policy)),
+                              recycle_policy, warm_driver_pool, warm_driver_key(proxy_settings, disable_headless, resource_policy))
+    driver = None
+    if not offline:
+        driver = browser.start()
+        if driver is None:
+            result_queue.put(("dead", worker_id, None, "ブラウザ起動エラー"))
+            return
+        if browser.warm_started:
+            worker_status.info("前回の実行で起動したままのブラウザを使います。")
+
+    def post_results(row_indices, value):
+        for index in row_indices:
+            result_queue.put(("result", worker_id, index, value))
+
+    browser_rows = 0 # ブラウザを使った行数 (デコイ処理の間隔に使用)
+    try:
+        while not stop_event.is_set():
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                break
+            row_indices = job.row_indices
+            used_browser = True
+
+            # --- ▼▼▼ メモリ対策：メモリ使用量・ページ数が上限を超えたらブラウザを入れ替え ▼▼▼ ---
+            recycle_reason = browser.recycle_reason()
+            if recycle_reason:
+                worker_status.warning(f"--- {recycle_reason} が上限を超えたため、ブラウザを入れ替えます ---")
+                driver = browser.recycle()
+                if driver is None:
+                    worker_alert.error("ブラウザの再起動に失敗しました。このワーカーを停止します。")
+                    job_queue.put(job) # 未処理の行は他のワーカーに任せる
+                    result_queue.put(("dead", worker_id, None, "ブラウザ再起動エラー"))
+                    return
+                worker_status.success("--- ブラウザを入れ替えました。処理を再開します ---")
+            # --- ▲▲▲ メモリ対策ここまで ▲▲▲ ---
+
+            row_start, wait_before = time.perf_counter(), WAIT_TIMER.total()
+            try:
+                value, used_browser, fetch_count = process_row(driver, job, area_code_index, worker_status, host_limiter, http_fetcher, html_backend,
+                                                               page_cache, offline, stage_results, sitemap_directory, stage_metrics,
+                                                               stage_scheduler, RowBudget(row_budget_seconds, run_deadline))
+                if value == ROW_TIMEOUT_VALUE and run_deadline and run_deadline.expired():
+                    job_queue.put(job) # 実行全体の締め切りで打ち切った行は未処理のまま残す (再実行時に処理する)
+                    break
+                if len(row_indices) > 1:
+                    stage_results.record_fan_out(len(row_indices), fetch_count)
+                    worker_status.info(f"同じHP・屋号+住所の {len(row_indices)} 行に結果を書き込みます。")
+                post_results(row_indices, value)
+
+            except InvalidSessionIdException as e_sid:
+                # --- セッションエラー時の再起動処理 ---
+                worker_alert.error(f"処理中にセッションが無効になりました: {e_sid}")
+                worker_alert.warning("ブラウザを再起動して次の処理を試みます。")
+                post_results(row_indices, 'エラー(セッション)')
+                driver = browser.recycle()
+                if driver is None:
+                    worker_alert.error("ブラウザの再起動に失敗しました。このワーカーを停止します。")
+                    result_queue.put(("dead", worker_id, None, "セッションエラー(再起動失敗)"))
+                    return
+
+            except RowProcessingError as e_row:
+                e = e_row.original
+                worker_alert.error(f"URL処理({e_row.search_step})中に予期せぬエラー ({job.company_hp_url}): {e}")
+                post_results(row_indices, f'エラー({e_row.search_step})')
+
+                # --- WebDriver関連エラーでも再起動を試みる ---
+                if "driver" in str(e).lower() or isinstance(e, WebDriverException):
+                    worker_alert.warning("WebDriverエラー検出。ブラウザを再起動します。")
+                    try:
+                        driver = browser.recycle()
+                    except Exception as e_restart:
+                        worker_alert.error(f"再起動中に致命的エラー: {e_restart}。このワーカーを停止します。")
+                        driver = None
+                    if driver is None:
+                        result_queue.put(("dead", worker_id, None, "WebDriverエラー(再起動失敗)"))
+                        return
+
+            # --- 所要時間の内訳 (待機: アクセス枠・アクセス間隔・ページの準備待ち / 処理: それ以外) ---
+            row_seconds = time.perf_counter() - row_start
+            wait_seconds = min(WAIT_TIMER.total() - wait_before, row_seconds)
+            worker_status.info(f"所要時間 {row_seconds:.1f}秒 (待機 {wait_seconds:.1f}秒 / 処理 {row_seconds - wait_seconds:.1f}秒)")
+            result_queue.put(("timing", worker_id, row_indices, (wait_seconds, row_seconds - wait_seconds)))
+
+            # 軽量HTTP取得だけで終わった行はブラウザの負荷・アクセスパターンに影響しない
+            if not used_browser:
+                continue
+            browser.add_pages(fetch_count)
+            browser_rows += 1
+
+            # --- (デコイ処理) ---
+            if browser_rows % 5 == 0:
+                try:
+                    decoy_url = random.choice(DECOY_URLS)
+                    worker_status.info(f"パターン偽装のため、無関係なサイトにアクセスします: {decoy_url}")
+                    with stage_metrics.measure("デコイ"):
+                        load_page(driver, decoy_url, host_limiter, timeout=15, max_wait=2.0)
+                    browser.add_pages(1)
+                except (TimeoutException, WebDriverException) as e:
+                    worker_status.warning(f"デコイアクセスでエラー（タイムアウト等）: {e}")
+                except Exception as e_decoy:
+                    worker_status.warning(f"デコイアクセスで予期せぬエラー: {e_decoy}")
+
+        result_queue.put(("done", worker_id, None, None))
+
+    except Exception as e_worker:
+        worker_alert.error(f"ワーカー{worker_id}で致命的なエラーが発生しました: {e_worker}")
+        result_queue.put(("dead", worker_id, None, "致命的エラー"))
+
+    finally:
+        result_queue.put(("recycled", worker_id, None, browser.recycle_count))
+        if browser.driver:
+            worker_status.info(f"ワーカー終了。ブラウザを{'次の実行用に残しました' if warm_driver_pool else '終了しました'}。(入れ替え {browser.recycle_count} 回)")
+        browser.close()
+
+
+# --- ★★★ 作業単位・ワーカー間で共有するものの準備 ★★★ ---
+def build_fetch_resources(worker_count, use_http_fetch, html_backend_name, area_code_index, host_limiter, page_cache=None, offline=False,
+                          use_sitemap=True, parse_workers=None):
+    """ワーカー間で共有する (軽量HTTP取得, HTML解析バックエンド, サイトマップ) を用意する (使わないものは None)"""
+    http_fetcher = StaticPageFetcher(random.choice(USER_AGENTS), pool_size=worker_count) if use_http_fetch and not offline else None
+    parse_workers = default_parse_workers() if parse_workers is None else parse_workers
+    html_backend = ParsePool(html_backend_name, area_code_index, parse_workers) if parse_workers > 0 else get_backend(html_backend_name)
+    sitemap_directory = None
+    if use_sitemap and (http_fetcher or (offline and page_cache)):
+        sitemap_directory = SitemapDirectory(http_fetcher, COMPANY_LINK_TEXT_KEYWORDS, COMPANY_LINK_HREF_KEYWORDS, host_limiter, page_cache, offline)
+    return http_fetcher, html_backend, sitemap_directory
+
+
+PERCENTILE_STATS = ("row_p50_seconds", "row_p95_seconds")
+
+
+def percentile(values, percent):
+    """最近傍順位法のパーセンタイル (値がなければ 0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))]
+
+
+# --- ★★★ メイン処理: run_scraping_process (並列ワーカー対応版) ★★★ ---
+def run_scraping_process(df, status_container, proxy_settings, disable_headless, area_codes_set, worker_count=DEFAULT_WORKER_COUNT, use_http_fetch=True, html_backend_name=None,
+                         page_cache=None, offline=False, checkpoint=None, alert_container=None, on_stats=None, resource_policy=None, recycle_policy=None,
+                         use_sitemap=True, host_limiter=None, driver_factory=None, stage_metrics=None, stage_scheduler=None, parse_workers=None,
+                         row_budget_seconds=DEFAULT_ROW_BUDGET_SECONDS, run_deadline=None, warm_driver_pool=None):
+    """空欄の電話番号を補完する。(進捗率, メッセージ, 結果DataFrame または None) を順に返すジェネレーター
+    status_container には詳細ログ、alert_container (省略時は status_container) にはエラー等の目立たせるメッセージを出力する
+    on_stats を渡すと、終了時に実行統計 (dict) を渡して呼び出す。resource_policy はブラウザで読み込むリソースの制限 (resource_policy.py)
+    recycle_policy はブラウザを入れ替えるメモリ使用量・ページ数の上限 (driver_pool.py)
+    use_sitemap=True では、ドメインごとに robots.txt / サイトマップを1回読み、会社概要ページを直接探す (sitemap_discovery.py)
+    host_limiter (省略時は既定のアクセス間隔の HostConcurrencyLimiter)・driver_factory はベンチマーク等で差し替える場合に渡す
+    stage_metrics (stage_metrics.StageMetrics) を渡すと、検索ステージごとの所要時間・発見率等をそこに記録する (実行中も参照できる)
+    stage_scheduler (stage_scheduler.StageScheduler) はステージの実行順を決める (省略時は既定の方針で、今回の実行の計測値のみから見積もる)
+    parse_workers はHTML解析・電話番号抽出を行う別プロセスの数 (0 で使わない。省略時はCPUコア数から決める。parse_pool.py)
+    row_budget_seconds は1件あたりの処理時間の上限 (超えた行は ROW_TIMEOUT_VALUE を記録する。0 / None で無制限。time_budget.py)
+    run_deadline (time_budget.Deadline) を過ぎたら新しい行の処理を止め、処理中の行も打ち切って途中までの結果を返す (打ち切った行は空欄のまま)
+    area_codes_set には読み込み済みの AreaCodeIndex も渡せる。warm_driver_pool (driver_pool.WarmDriverPool) はブラウザを実行をまたいで使い回す"""
+    alert_container = alert_container or status_container
+    stage_metrics = stage_metrics or (stage_scheduler.stage_metrics if stage_scheduler else StageMetrics())
+    stage_scheduler = stage_scheduler or StageScheduler(stage_metrics=stage_metrics)
+    reordered_before, skipped_before = stage_scheduler.reordered, stage_scheduler.skipped
+
+    phone_column_name = '電話番号'
+    hp_column_name = 'HP'
+    company_name_cols = ['屋号']
+    address_cols = ['住所', '所在地']
+
+    actual_company_col = next((col for col in company_name_cols if col in df.columns), None)
+    actual_address_col = next((col for col in address_cols if col in df.columns), None)
+
+    if phone_column_name not in df.columns:
+         alert_container.error(f"エラー: CSVに '{phone_column_name}' 列が見つかりません。")
+         yield 1.0, "列名エラー(電話番号)", df
+         return
+
+    target_indices = df[
+        (df[phone_column_name].isnull() | (df[phone_column_name] == ''))
+    ].index
+
+    total_jobs = len(target_indices)
+    if total_jobs == 0:
+        alert_container.warning(f"処理対象（'{phone_column_name}'が空の行）が0件です。")
+        yield 1.0, "処理対象なし", df
+        return
+
+    # 固定電話の市外局番判定用 (前方一致インデックス)
+    area_code_index = area_codes_set if isinstance(area_codes_set, AreaCodeIndex) else AreaCodeIndex(area_codes_set)
+    df_copy = df.copy()
+
+    # --- チェックポイントから前回の結果を復元し、未処理の行だけを処理する ---
+    resumed_count = 0
+    if checkpoint:
+        resumed = checkpoint.load(target_indices)
+        resumed_count = len(resumed)
+        if resumed_count:
+            df_copy.loc[list(resumed), phone_column_name] = list(resumed.values())
+            target_indices = [index for index in target_indices if index not in resumed]
+            status_container.info(f"チェックポイントから {resumed_count} 件の結果を復元しました。残り {len(target_indices)} 件を処理します。")
+    if resumed_count == total_jobs:
+        yield 1.0, "完了！", df_copy
+        return
+
+    # --- 行データの準備 (ワーカーはDataFrameに触れない。前処理は全行まとめて行い、結果は配列に集めて最後にまとめて書き込む) ---
+    jobs = build_row_jobs(df_copy, target_indices, hp_column_name, actual_company_col, actual_address_col)
+
+    # --- 重複排除: HPと屋号+住所が同じ行は1件の作業単位として1回だけ処理する ---
+    units = group_work_units(jobs)
+    job_queue = queue.Queue()
+    for unit in units:
+        job_queue.put(unit)
+    unique_hp_count = len({hp_unit_key(job.company_hp_url) for job in jobs} - {None})
+    unique_yahoo_count = len({yahoo_unit_key(job.company_name, job.address) for job in jobs} - {None})
+    results = RowResults(target_indices)
+    stage_results = SharedStageResults()
+
+    worker_count = max(1, min(int(worker_count), MAX_WORKER_COUNT, len(units)))
+    result_queue = queue.Queue()
+    log_queue = queue.Queue()
+    stop_event = threading.Event()
+    host_limiter = host_limiter or HostConcurrencyLimiter(MAX_CONCURRENT_PER_HOST)
+    http_fetcher, html_backend, sitemap_directory = build_fetch_resources(worker_count, use_http_fetch, html_backend_name, area_code_index, host_limiter,
+                                                                          page_cache, offline, use_sitemap, parse_workers)
+
+    workers = [
+        threading.Thread(
+            target=scraping_worker,
+            args=(worker_id, job_queue, result_queue, stop_event, log_queue, status_container,
+                  proxy_settings, disable_headless, area_code_index, host_limiter, http_fetcher, html_backend,
+                  page_cache, offline, stage_results, alert_container, resource_policy, recycle_policy, sitemap_directory, driver_factory,
+                  stage_metrics, stage_scheduler, row_budget_seconds, run_deadline, None if driver_factory else warm_driver_pool),
+            name=f"scraping-worker-{worker_id}", daemon=True,
+        )
+        for worker_id in range(1, worker_count + 1)
+    ]
+    if offline:
+        status_container.info(f"オフライン再抽出モード: キャッシュ済みのページのみから抽出します (ネットワークアクセスなし, HTML解析: {html_backend.name})。")
+    else:
+        status_container.info(f"ブラウザ {worker_count} 台で並列処理を開始します (同一ホストへの同時アクセスは最大 {MAX_CONCURRENT_PER_HOST} 件, HTML解析: {html_backend.name})。")
+    status_container.info(f"重複排除: 対象 {len(jobs)} 行を {len(units)} 件の作業単位にまとめました "
+                          f"(異なるHP {unique_hp_count} 件 / 異なる屋号+住所 {unique_yahoo_count} 件)。")
+
+    if row_budget_seconds:
+        status_container.info(f"1件あたりの処理時間の上限: {row_budget_seconds}秒 (超えた行は「{ROW_TIMEOUT_VALUE}」と記録します)")
+
+    processed_count = resumed_count
+    timed_out_count = 0 # 処理時間の上限を超えた行数
+    progress_rate = processed_count / total_jobs
+    running_workers = worker_count
+    last_failure = None
+    start_time = time.time()
+    first_row_seconds = None # 開始から最初の行の結果が届くまでの秒数 (ブラウザの起動待ちを含む)
+    wait_total = work_total = 0.0 # 行ごとの所要時間の内訳の合計
+    row_seconds = [] # 行ごとの所要時間 (まとめて処理した行はその作業単位の所要時間)
+    recycle_total = 0 # ブラウザの入れ替え回数 (全ワーカー合計)
+
+    try:
+        for worker in workers:
+            worker.start()
+
+        while processed_count < total_jobs and running_workers > 0:
+            if run_deadline and run_deadline.expired() and not stop_event.is_set():
+                alert_container.warning("実行全体の締め切りに達しました。処理中の行を打ち切って終了します。")
+                stop_event.set() # ワーカーは新しい行を取らず、処理中の行は締め切りで打ち切られる
+            try:
+                event, worker_id, index, value = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                flush_queued_status(log_queue)
+                continue
+            flush_queued_status(log_queue)
+
+            if event == "result":
+                # DataFrameへの書き込みは終了時にメインスレッドでまとめて行う
+                results.set((index,), value)
+                if first_row_seconds is None:
+                    first_row_seconds = time.time() - start_time
+                    status_container.info(f"最初の1件の処理完了まで {first_row_seconds:.1f}秒")
+                if checkpoint:
+                    checkpoint.record(index, value)
+                processed_count += 1
+                timed_out_count += value == ROW_TIMEOUT_VALUE
+                progress_rate = processed_count / total_jobs
+                yield progress_rate, f"{processed_count}/{total_jobs}件目 処理完了", None
+            elif event == "timing":
+                wait_total, work_total = wait_total + value[0], work_total + value[1]
+                row_seconds += [value[0] + value[1]] * len(index)
+            elif event == "recycled":
+                recycle_total += value
+            else:
+                running_workers -= 1
+                if event == "dead":
+                    last_failure = value
+
+        flush_queued_status(log_queue)
+        results.assign_to(df_copy, phone_column_name)
+
+        if processed_count == 0 and last_failure == "ブラウザ起動エラー":
+            yield 1.0, "ブラウザ起動エラー", df
+            return
+        if processed_count < total_jobs and run_deadline and run_deadline.expired():
+            alert_container.warning(f"実行全体の締め切りのため、{total_jobs - processed_count} 件を未処理のまま終了しました (再実行すると続きから処理します)。")
+            yield progress_rate, "締め切り", df_copy # 途中までの結果を返す
+            return
+        if processed_count < total_jobs:
+            alert_container.error("全てのブラウザが停止したため処理を中断します。")
+            yield progress_rate, last_failure or "ワーカー停止", df_copy # 途中までの結果を返す
+            return
+
+        # --- ループ正常終了 ---
+        yield 1.0, "完了！", df_copy
+
+    except Exception as e_main:
+        # メインループの外側での予期せぬエラー
+        alert_container.error(f"処理全体で致命的なエラーが発生しました: {e_main}")
+        results.assign_to(df_copy, phone_column_name)
+        yield 1.0, "致命的エラー", df_copy # 途中までの結果を返す
+
+    finally:
+        stop_event.set()
+        for worker in workers:
+            if worker.is_alive():
+                worker.join(timeout=5)
+        flush_queued_status(log_queue)
+        while True: # 最後の行の所要時間・入れ替え回数は結果の後に届く
+            try:
+                event, _, index, value = result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event == "timing":
+                wait_total, work_total = wait_total + value[0], work_total + value[1]
+                row_seconds += [value[0] + value[1]] * len(index)
+            elif event == "recycled":
+                recycle_total += value
+        if http_fetcher:
+            http_fetcher.close()
+        if isinstance(html_backend, ParsePool):
+            html_backend.close()
+            status_container.info(f"HTML解析: {html_backend.offloaded} 件を解析プロセスで処理しました。")
+        if page_cache:
+            status_container.info(f"ページキャッシュ: ヒット {page_cache.hits}件 / ミス {page_cache.misses}件")
+        if stage_results.reused:
+            status_container.info(f"重複排除: 処理結果を {stage_results.reused} 回再利用し、ページ取得を {stage_results.saved_fetches} 回省略しました。")
+        status_container.info(f"所要時間の内訳 (全ワーカー合計): 待機 {wait_total:.1f}秒 / 処理 {work_total:.1f}秒")
+        if recycle_total:
+            status_container.info(f"ブラウザの入れ替え: {recycle_total} 回")
+        if timed_out_count:
+            status_container.info(f"処理時間の上限 ({row_budget_seconds}秒) を超えた行: {timed_out_count} 件")
+        if sitemap_directory and sitemap_directory.domains:
+            status_container.info(f"サイトマップ: {sitemap_directory.domains} ドメイン中 {sitemap_directory.domains_found} ドメインで概要ページの候補を発見しました。")
+        stage_summary = " / ".join(f"{row['ステージ']} {row['発見率']} ({row['回数']}回, 平均{row['平均秒']}秒)" for row in stage_metrics.summary_table())
+        if stage_summary:
+            status_container.info(f"ステージ別の発見率: {stage_summary}")
+        reordered_rows, skipped_rows = stage_scheduler.reordered - reordered_before, stage_scheduler.skipped - skipped_before
+        if reordered_rows or skipped_rows:
+            status_container.info(f"ステージの実行順 ({stage_scheduler.policy}): Yahoo検索を先に実行 {reordered_rows} 件 / ステージを省略 {skipped_rows} 件")
+        status_container.info(f"最終処理完了。ブラウザを{'次の実行用に残しました' if warm_driver_pool and not driver_factory else '終了しました'}。")
+        if on_stats:
+            on_stats({
+                "rows_total": total_jobs, "rows_resumed": resumed_count, "rows_processed": processed_count - resumed_count,
+                "work_units": len(units), "unique_hp": unique_hp_count, "unique_name_address": unique_yahoo_count,
+                "reused_results": stage_results.reused, "saved_fetches": stage_results.saved_fetches,
+                "cache_hits": page_cache.hits if page_cache else 0, "cache_misses": page_cache.misses if page_cache else 0,
+                "workers": worker_count, "elapsed_seconds": round(time.time() - start_time, 3),
+                "wait_seconds": round(wait_total, 3), "work_seconds": round(work_total, 3), "browser_recycles": recycle_total,
+                "row_p50_seconds": round(percentile(row_seconds, 50), 3), "row_p95_seconds": round(percentile(row_seconds, 95), 3),
+                "sitemap_domains": sitemap_directory.domains if sitemap_directory else 0,
+                "sitemap_domains_found": sitemap_directory.domains_found if sitemap_directory else 0,
+                "yahoo_first_rows": stage_scheduler.reordered - reordered_before, "stage_skipped_rows": stage_scheduler.skipped - skipped_before,
+                "rows_timed_out": timed_out_count, "first_row_seconds": round(first_row_seconds or 0.0, 3),
+            })
+
+
+# --- ★★★ ストリーミング処理 (大きなファイル用): チャンクごとに処理し、終わった分から書き出す ★★★ ---
+def run_streaming_process(input_path, output_path, status_container, proxy_settings, disable_headless, area_codes_set, worker_count=DEFAULT_WORKER_COUNT,
+                          use_http_fetch=True, html_backend_name=None, page_cache=None, offline=False, checkpoint=None, alert_container=None, on_stats=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE, all_columns=False, resource_policy=None, recycle_policy=None, use_sitemap=True,
+                          stage_metrics=None, stage_scheduler=None, parse_workers=None, row_budget_seconds=DEFAULT_ROW_BUDGET_SECONDS, run_deadline=None,
+                          warm_driver_pool=None):
+    """入力を chunk_size 行ずつ run_scraping_process で処理し、出力ファイルに追記する。(書き出した行数, メッセージ, 完了したか) を順に返す
+    all_columns=False では処理に必要な列と行番号だけを読み書きする (チェックポイントのキーはファイル全体での行番号)
+    stage_metrics / stage_scheduler・実行全体の締め切り run_deadline は全チャンクで共有する
+    warm_driver_pool を渡すと、チャンクの間もブラウザを終了せずに次のチャンクで使う"""
+    alert_container = alert_container or status_container
+    stage_metrics = stage_metrics or (stage_scheduler.stage_metrics if stage_scheduler else StageMetrics())
+    stage_scheduler = stage_scheduler or StageScheduler(stage_metrics=stage_metrics)
+    chunk_stats = []
+    rows_written = 0
+    writer = open_result_writer(output_path)
+    try:
+        for chunk_number, chunk in enumerate(iter_input_chunks(input_path, None if all_columns else STREAM_COLUMNS, chunk_size), start=1):
+            status_container.info(f"チャンク {chunk_number} ({chunk.index[0]}〜{chunk.index[-1]}行目) を処理します。")
+            result_df, message = None, ""
+            for _, message, df_result in run_scraping_process(chunk, status_container, proxy_settings, disable_headless, area_codes_set, worker_count,
+                                                              use_http_fetch, html_backend_name, page_cache, offline, checkpoint, alert_container,
+                                                              chunk_stats.append, resource_policy, recycle_policy, use_sitemap,
+                                                              stage_metrics=stage_metrics, stage_scheduler=stage_scheduler, parse_workers=parse_workers,
+                                                              row_budget_seconds=row_budget_seconds, run_deadline=run_deadline,
+                                                              warm_driver_pool=warm_driver_pool):
+                if df_result is None:
+                    yield rows_written, f"チャンク {chunk_number}: {message}", False
+                else:
+                    result_df = df_result
+
+            if result_df is not None:
+                writer.write(result_df if all_columns else result_df.rename_axis(ROW_NUMBER_COLUMN).reset_index())
+                rows_written += len(result_df)
+            if not message.startswith(("完了", "処理対象なし")):
+                yield rows_written, message, False # 途中までの結果を書き出して終了 (再実行するとチェックポイントから再開する)
+                return
+            del chunk, result_df
+            yield rows_written, f"{rows_written}行 書き出し完了", False
+
+        yield rows_written, "完了！", True
+
+    finally:
+        writer.close()
+        if on_stats and chunk_stats:
+            totals = {key: sum(stats[key] for stats in chunk_stats) for key in chunk_stats[0]
+                      if key not in ("workers", "first_row_seconds") and key not in PERCENTILE_STATS}
+            totals.update({key: max(stats[key] for stats in chunk_stats) for key in PERCENTILE_STATS}) # チャンクごとの値の最大 (目安)
+            on_stats({**totals, "chunks": len(chunk_stats), "workers": max(stats["workers"] for stats in chunk_stats),
+                      "first_row_seconds": chunk_stats[0]["first_row_seconds"]}) # 最初のチャンクの値
+
+
+# --- ★★★ 分散処理 (コーディネーター): 作業単位をジョブキューに登録し、ワーカーの結果を集める ★★★ ---
+def run_queue_coordinator(df, job_queue, job_id, status_container, alert_container=None, live_workers=None, on_enqueued=None, poll_interval=1.0,
+                          run_deadline=None):
+    """作業単位を job_queue (job_queue.py) に登録し、複数のワーカープロセス / ホスト (run_queue_worker) の結果を集める
+    run_scraping_process と同じく (進捗率, メッセージ, 結果DataFrame または None) を順に返すジェネレーター
+    live_workers (動いているローカルのワーカー数を返す関数) を渡すと、全て止まり処理中のリースもなくなった時点で途中までの結果を返す
+    (渡さない場合は他のホストのワーカーを待ち続ける)。同じ job_id で再実行すると記録済みの結果から再開する
+    on_enqueued は登録後に1回呼ぶ (ワーカーの起動用。登録前に起動したワーカーは作業単位がないため直ちに終了する)
+    run_deadline (time_budget.Deadline) を過ぎたら、その時点までに届いた結果を返す (残りの作業単位はキューに残る)"""
+    alert_container = alert_container or status_container
+    phone_column_name = '電話番号'
+    actual_company_col = next((col for col in ['屋号'] if col in df.columns), None)
+    actual_address_col = next((col for col in ['住所', '所在地'] if col in df.columns), None)
+
+    if phone_column_name not in df.columns:
+        alert_container.error(f"エラー: CSVに '{phone_column_name}' 列が見つかりません。")
+        yield 1.0, "列名エラー(電話番号)", df
+        return
+    target_indices = df[(df[phone_column_name].isnull() | (df[phone_column_name] == ''))].index
+    total_jobs = len(target_indices)
+    if total_jobs == 0:
+        alert_container.warning(f"処理対象（'{phone_column_name}'が空の行）が0件です。")
+        yield 1.0, "処理対象なし", df
+        return
+
+    df_copy = df.copy()
+    units = group_work_units(build_row_jobs(df_copy, target_indices, 'HP', actual_company_col, actual_address_col))
+    job_queue.enqueue(job_id, units)
+    status_container.info(f"ジョブキューに {len(units)} 件の作業単位 ({total_jobs} 行) を登録しました。(ジョブID: {job_id})")
+    if on_enqueued:
+        on_enqueued()
+    yield 0.0, "ワーカーの結果を待っています", None
+    index_by_key = {str(index): index for index in target_indices} # キューには行インデックスを文字列で保存している
+    results = RowResults(target_indices)
+
+    after, processed_count = 0, 0
+    while True:
+        after, finished = job_queue.results_after(job_id, after)
+        for unit, value in finished:
+            processed_count += results.set([index_by_key[key] for key in unit.row_indices if key in index_by_key], value)
+        progress = job_queue.progress(job_id)
+        if progress.done >= progress.total:
+            status_container.info(f"全 {progress.total} 件の作業単位が完了しました。")
+            results.assign_to(df_copy, phone_column_name)
+            yield 1.0, "完了！", df_copy
+            return
+        if finished:
+            yield (processed_count / total_jobs, f"{processed_count}/{total_jobs}件目 処理完了 "
+                   f"(作業単位: 完了 {progress.done} / 処理中 {progress.leased} / 未処理 {progress.pending})", None)
+        if run_deadline and run_deadline.expired():
+            alert_container.warning(f"実行全体の締め切りのため、{progress.total - progress.done} 件の作業単位を未処理のまま終了しました (キューに残っています)。")
+            results.assign_to(df_copy, phone_column_name)
+            yield processed_count / total_jobs, "締め切り", df_copy
+            return
+        if live_workers is not None and live_workers() == 0 and not progress.leased:
+            alert_container.error(f"全てのワーカーが停止しました。未処理 {progress.pending} 件の作業単位はキューに残っています (再実行すると続きから処理します)。")
+            results.assign_to(df_copy, phone_column_name)
+            yield processed_count / total_jobs, "ワーカー停止", df_copy
+            return
+        time.sleep(poll_interval)
+
+
+# --- ★★★ 分散処理 (ワーカー): ジョブキューから作業単位を借りて処理し、結果を書き戻す ★★★ ---
+def run_queue_worker(job_queue, job_id, worker_name, status_container, proxy_settings, disable_headless, area_codes_set, worker_count=DEFAULT_WORKER_COUNT,
+                     use_http_fetch=True, html_backend_name=None, page_cache=None, alert_container=None, resource_policy=None, recycle_policy=None,
+                     use_sitemap=True, stage_metrics=None, stage_scheduler=None, parse_workers=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                     host_limiter=None, driver_factory=None, row_budget_seconds=DEFAULT_ROW_BUDGET_SECONDS, run_deadline=None):
+    """job_queue (job_queue.py) の job_id の作業単位を、ブラウザ worker_count 台で借りて処理する (作業単位は他のワーカーと分担する)
+    (このワーカーが記録した作業単位の数, メッセージ, 終了したか) を順に返すジェネレーター
+    借りた作業単位のリースは処理中に延長し、このプロセスが落ちた場合は lease_seconds 後に他のワーカーに割り当て直される
+    1件の処理は row_budget_seconds 秒で打ち切る (run_scraping_process と同じ)
+    run_deadline (time_budget.Deadline) を過ぎたら新しい作業単位を借りず、処理中の作業単位も打ち切ってキューに返す"""
+    alert_container = alert_container or status_container
+    stage_metrics = stage_metrics or (stage_scheduler.stage_metrics if stage_scheduler else StageMetrics())
+    stage_scheduler = stage_scheduler or StageScheduler(stage_metrics=stage_metrics)
+    area_code_index = area_codes_set if isinstance(area_codes_set, AreaCodeIndex) else AreaCodeIndex(area_codes_set)
+    worker_count = max(1, min(int(worker_count), MAX_WORKER_COUNT))
+    result_queue = queue.Queue()
+    log_queue = queue.Queue()
+    stop_event = threading.Event()
+    unit_source = LeasedUnitSource(job_queue, job_id, worker_name, lease_seconds, stop_event=stop_event, deadline=run_deadline)
+    host_limiter = host_limiter or HostConcurrencyLimiter(MAX_CONCURRENT_PER_HOST)
+    http_fetcher, html_backend, sitemap_directory = build_fetch_resources(worker_count, use_http_fetch, html_backend_name, area_code_index, host_limiter,
+                                                                          page_cache, False, use_sitemap, parse_workers)
+    workers = [
+        threading.Thread(
+            target=scraping_worker,
+            args=(worker_id, unit_source, result_queue, stop_event, log_queue, status_container,
+                  proxy_settings, disable_headless, area_code_index, host_limiter, http_fetcher, html_backend,
+                  page_cache, False, SharedStageResults(), alert_container, resource_policy, recycle_policy, sitemap_directory, driver_factory,
+                  stage_metrics, stage_scheduler, row_budget_seconds, run_deadline),
+            name=f"queue-worker-{worker_id}", daemon=True,
+        )
+        for worker_id in range(1, worker_count + 1)
+    ]
+    status_container.info(f"ワーカー {worker_name}: ブラウザ {worker_count} 台でジョブ {job_id} の処理を開始します (リース {lease_seconds} 秒)。")
+
+    running_workers, last_failure = worker_count, None
+    try:
+        for worker in workers:
+            worker.start()
+        while running_workers > 0:
+            try:
+                event, worker_id, index, value = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                flush_queued_status(log_queue)
+                continue
+            flush_queued_status(log_queue)
+            if event == "result":
+                before = unit_source.completed
+                unit_source.complete_row(index, value)
+                if unit_source.completed > before:
+                    yield unit_source.completed, f"{unit_source.completed}件目の作業単位を記録しました", False
+            elif event in ("done", "dead"):
+                running_workers -= 1
+                if event == "dead":
+                    last_failure = value
+                    alert_container.error(f"ワーカー{worker_id}が停止しました: {value}")
+        flush_queued_status(log_queue)
+        if run_deadline and run_deadline.expired():
+            alert_container.warning("実行全体の締め切りに達したため、残りの作業単位をキューに残して終了します。")
+            yield unit_source.completed, "締め切り", True
+            return
+        yield unit_source.completed, ("完了！" if last_failure is None else last_failure), True
+    finally:
+        stop_event.set()
+        for worker in workers:
+            if worker.is_alive():
+                worker.join(timeout=5)
+        flush_queued_status(log_queue)
+        unit_source.close() # 借りたまま処理していない作業単位は他のワーカーに返す
+        if http_fetcher:
+            http_fetcher.close()
+        if isinstance(html_backend, ParsePool):
+            html_backend.close()
@@ -0,0 +1,138 @@
+# sitemap_discovery.py
+# robots.txt / サイトマップ (sitemap.xml) から会社概要ページを直接探す
+# ドメインごとに1回だけ読み、実行中は結果を覚えておく (HP → 概要1 → 概要2 とリンクをたどる前に候補にする)
+import html
+import re
+import threading
+from contextlib import nullcontext
+from urllib.parse import unquote, urlsplit
+from urllib.robotparser import RobotFileParser
+from link_discovery import DEFAULT_CANDIDATE_COUNT, rank_link_candidates
+
+MAX_SITEMAP_FILES = 4 # 1ドメインあたりに読むサイトマップの数 (サイトマップインデックスの子を含む)
+MAX_SITEMAP_URLS = 5000 # 1つのサイトマップから読むURLの数
+SITEMAP_CONTENT_TYPES = ('xml', 'text/plain')
+ROBOTS_CONTENT_TYPES = ('text/plain',)
+# サイトマップインデックスの子のうち、会社情報を含まない可能性が高いもの (後回しにする)
+LOW_PRIORITY_SITEMAP_KEYWORDS = ('post', 'blog', 'news', 'product', 'item', 'tag', 'category', 'image', 'video')
+
+_LOC_PATTERN = re.compile(r'<loc>\s*(.*?)\s*</loc>', re.IGNORECASE | re.DOTALL)
+_SITEMAP_INDEX_PATTERN = re.compile(r'<sitemapindex\b', re.IGNORECASE)
+
+
+def site_origin(url):
+    """スキーム + ホスト (+ ポート)。http / https 以外は None"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc.lower()}"
+
+
+def parse_sitemap(text, limit=MAX_SITEMAP_URLS):
+    """サイトマップのXMLから (サイトマップインデックスか, <loc> のURL) を返す"""
+    locations = [html.unescape(match.group(1)) for match in _LOC_PATTERN.finditer(text)]
+    return bool(_SITEMAP_INDEX_PATTERN.search(text)), locations[:limit]
+
+
+def _sitemap_priority(url, href_keywords):
+    lower_url = url.lower()
+    if any(keyword in lower_url for keyword in href_keywords):
+        return 0
+    if any(keyword in lower_url for keyword in LOW_PRIORITY_SITEMAP_KEYWORDS):
+        return 2
+    return 1
+
+
+class SitemapDirectory:
+    """ドメインごとの会社概要ページ候補 (robots.txt / サイトマップから)。スレッド間で共有し、同じドメインは1回だけ読む
+    http_fetcher は http_fetcher.StaticPageFetcher、host_limiter はホストごとのアクセス制限 (limit(url) を持つもの)"""
+    def __init__(self, http_fetcher, text_keywords, href_keywords, host_limiter=None, page_cache=None, offline=False,
+                 max_sitemaps=MAX_SITEMAP_FILES):
+        self.http_fetcher = http_fetcher
+        self.text_keywords = text_keywords
+        self.href_keywords = href_keywords
+        self.host_limiter = host_limiter
+        self.page_cache = page_cache
+        self.offline = offline
+        self.max_sitemaps = max_sitemaps
+        self.domains = 0 # 読み込んだドメイン数
+        self.domains_found = 0 # 候補が見つかったドメイン数
+        self._lock = threading.Lock()
+        self._entries = {} # origin: 候補URLのリスト
+        self._in_flight = {} # origin: 読み込み中の threading.Event
+
+    def candidates(self, site_url, limit=DEFAULT_CANDIDATE_COUNT):
+        """site_url のドメインの会社概要ページ候補 (点数順, 最大 limit 件)
+        HPがドメインの下層 (例: https://example.com/shop/) の場合は、そのディレクトリ以下のページだけを返す"""
+        origin = site_origin(site_url)
+        if origin is None:
+            return []
+        directory = urlsplit(site_url).path.rsplit('/', 1)[0] + '/'
+        return [url for url in self._ranked_urls(origin, site_url) if urlsplit(url).path.startswith(directory)][:limit]
+
+    def _ranked_urls(self, origin, site_url):
+        while True:
+            with self._lock:
+                if origin in self._entries:
+                    return self._entries[origin]
+                event = self._in_flight.get(origin)
+                if event is None:
+                    event = self._in_flight[origin] = threading.Event()
+                    break
+            event.wait() # 他のワーカーが読み込み中
+        ranked = []
+        try:
+            ranked = self._discover(origin, site_url)
+        finally:
+            with self._lock:
+                self._entries[origin] = ranked
+                self.domains += 1
+                self.domains_found += bool(ranked)
+                del self._in_flight[origin]
+            event.set()
+        return ranked
+
+    def _discover(self, origin, site_url):
+        robots = RobotFileParser()
+        robots_text = self._fetch_text(f"{origin}/robots.txt", ROBOTS_CONTENT_TYPES)
+        robots.parse((robots_text or '').splitlines())
+        pending = list(dict.fromkeys(url for url in (robots.site_maps() or []) if site_origin(url) == origin)) or [f"{origin}/sitemap.xml"]
+
+        locations, read_count = [], 0
+        while pending and read_count < self.max_sitemaps:
+            sitemap_url = pending.pop(0)
+            read_count += 1
+            if sitemap_url.lower().endswith('.gz'):
+                continue
+            text = self._fetch_text(sitemap_url, SITEMAP_CONTENT_TYPES)
+            if not text:
+                continue
+            is_index, urls = parse_sitemap(text)
+            if is_index:
+                pending += sorted((url for url in urls if site_origin(url) == origin),
+                                  key=lambda url: _sitemap_priority(url, self.href_keywords))
+            else:
+                locations += urls
+
+        links = [(url, unquote(urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]), url)
+                 for url in locations if robots.can_fetch('*', url)]
+        return rank_link_candidates(links, site_url, self.text_keywords, self.href_keywords, exclude_urls=(f"{origin}/",), limit=None)
+
+    def _fetch_text(self, url, content_types):
+        """キャッシュ → 軽量HTTP取得 で本文を返す (取得できなければ None)"""
+        if self.page_cache:
+            cached = self.page_cache.get(url)
+            if cached:
+                return cached.html
+        if self.offline or self.http_fetcher is None:
+            return None
+        with (self.host_limiter.limit(url) if self.host_limiter else nullcontext()):
+            fetched = self.http_fetcher.fetch(url, content_types)
+        if fetched is None:
+            return None
+        if self.page_cache:
+            self.page_cache.put(url, fetched.html, fetched.url)
+        return fetched.html
@@ -0,0 +1,192 @@
+# stage_metrics.py
+# 検索ステージごとの計測 (HPトップ / 概要1 / 概要2 / Yahoo(ダイレクト) / Yahoo(一覧) / デコイ)
+# 所要時間のヒストグラム・番号が見つかった回数・タイムアウト・取得したHTMLのバイト数を集計し、JSON / Prometheus形式で書き出す
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# ステージ名: Prometheus のラベル値
+STAGES = {
+    'HP': 'hp_top', '概要1': 'overview1', '概要2': 'overview2',
+    'Yahoo(ダイレクト)': 'yahoo_direct', 'Yahoo(一覧)': 'yahoo_list', 'デコイ': 'decoy',
+}
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0) # 秒 (上限。これを超えたものは +Inf)
+METRICS_FORMATS = ('json', 'prometheus')
+
+_active = threading.local() # 実行中のステージの StageRecord (スレッドごと)
+
+
+class StageRecord:
+    """1回のステージ実行の結果 (ステージの処理中に found / timeout / バイト数を書き込む)"""
+    __slots__ = ('found', 'timeout', 'bytes', 'cache_hits')
+
+    def __init__(self):
+        self.found = False
+        self.timeout = False
+        self.bytes = 0
+        self.cache_hits = 0
+
+    def add_html(self, html, cached=False):
+        if cached:
+            self.cache_hits += 1
+        else:
+            self.bytes += len(html.encode('utf-8', errors='ignore')) if html else 0
+
+
+class StageStats:
+    """ステージごとの集計"""
+    __slots__ = ('count', 'found', 'timeouts', 'errors', 'bytes', 'cache_hits', 'seconds_total', 'buckets')
+
+    def __init__(self):
+        self.count = self.found = self.timeouts = self.errors = self.bytes = self.cache_hits = 0
+        self.seconds_total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1) # 最後は +Inf
+
+    def to_dict(self, label):
+        cumulative, buckets = 0, {}
+        for bound, count in zip([*LATENCY_BUCKETS, math.inf], self.buckets):
+            cumulative += count
+            buckets['+Inf' if bound == math.inf else str(bound)] = cumulative
+        return {
+            'label': label, 'count': self.count, 'found': self.found,
+            'hit_rate': round(self.found / self.count, 4) if self.count else 0.0,
+            'timeouts': self.timeouts, 'errors': self.errors, 'bytes': self.bytes, 'cache_hits': self.cache_hits,
+            'seconds_total': round(self.seconds_total, 3),
+            'seconds_mean': round(self.seconds_total / self.count, 3) if self.count else 0.0,
+            'latency_buckets': buckets, # 累積 (その秒数以下で終わった回数)
+        }
+
+
+class StageMetrics:
+    """ステージごとの計測値 (スレッド間で共有する)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {stage: StageStats() for stage in STAGES}
+        self.started_at = time.time()
+
+    @contextmanager
+    def measure(self, stage):
+        """with の中をステージ stage の1回の実行として計測する。StageRecord を返す (found 等はここに書き込む)
+        with の中 (同じスレッド) で note_html / note_timeout を呼ぶと、このステージの値として数える"""
+        record = StageRecord()
+        previous = getattr(_active, 'record', None)
+        _active.record = record
+        start = time.perf_counter()
+        error = False
+        try:
+            yield record
+        except Exception:
+            error = True
+            raise
+        finally:
+            _active.record = previous
+            self._add(stage, time.perf_counter() - start, record, error)
+
+    def _add(self, stage, seconds, record, error):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            stats = self._stats[stage]
+            stats.count += 1
+            stats.found += bool(record.found)
+            stats.timeouts += bool(record.timeout)
+            stats.errors += error
+            stats.bytes += record.bytes
+            stats.cache_hits += record.cache_hits
+            stats.seconds_total += seconds
+            stats.buckets[bucket] += 1
+
+    def snapshot(self):
+        """ステージごとの集計値 (dict)"""
+        with self._lock:
+            return {STAGES[stage]: stats.to_dict(stage) for stage, stats in self._stats.items()}
+
+    def totals(self):
+        """ステージごとの (回数, 発見回数, 所要時間の合計[秒]) (stage_scheduler.py の見積もりに使う)"""
+        with self._lock:
+            return {stage: (stats.count, stats.found, stats.seconds_total) for stage, stats in self._stats.items()}
+
+    def summary_table(self):
+        """画面表示用の表 (実行されたステージのみ)"""
+        return [
+            {'ステージ': values['label'], '回数': values['count'], '発見': values['found'], '発見率': f"{values['hit_rate']:.0%}",
+             '平均秒': values['seconds_mean'], 'タイムアウト': values['timeouts'], 'KB': round(values['bytes'] / 1024)}
+            for values in self.snapshot().values() if values['count']
+        ]
+
+    def merge_file(self, path):
+        """write() で書き出した JSON (別のプロセスの計測値) をこの計測値に加える"""
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)['stages']
+        stages = {key: stage for stage, key in STAGES.items()}
+        with self._lock:
+            for key, values in snapshot.items():
+                stats = self._stats[stages[key]]
+                stats.count += values['count']
+                stats.found += values['found']
+                stats.timeouts += values['timeouts']
+                stats.errors += values['errors']
+                stats.bytes += values['bytes']
+                stats.cache_hits += values['cache_hits']
+                stats.seconds_total += values['seconds_total']
+                previous = 0
+                for bucket, cumulative in enumerate(values['latency_buckets'].values()): # 累積を区間ごとの回数に戻す
+                    stats.buckets[bucket] += cumulative - previous
+                    previous = cumulative
+
+    def to_json(self):
+        return json.dumps({'started_at': round(self.started_at, 3), 'generated_at': round(time.time(), 3), 'stages': self.snapshot()},
+                          ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix='phone_scraper_stage'):
+        """Prometheus のテキスト形式 (node_exporter の textfile collector 等で読み込む)"""
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_latency_seconds ステージの所要時間", f"# TYPE {prefix}_latency_seconds histogram"]
+        for key, values in snapshot.items():
+            for bound, count in values['latency_buckets'].items():
+                lines.append(f'{prefix}_latency_seconds_bucket{{stage="{key}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_latency_seconds_sum{{stage="{key}"}} {values["seconds_total"]}')
+            lines.append(f'{prefix}_latency_seconds_count{{stage="{key}"}} {values["count"]}')
+        for name, field, description in (('found_total', 'found', '番号が見つかった回数'), ('timeouts_total', 'timeouts', 'タイムアウトした回数'),
+                                         ('errors_total', 'errors', 'エラーで中断した回数'), ('bytes_total', 'bytes', '取得したHTMLのバイト数'),
+                                         ('cache_hits_total', 'cache_hits', 'キャッシュを使った回数')):
+            lines += [f"# HELP {prefix}_{name} {description}", f"# TYPE {prefix}_{name} counter"]
+            lines += [f'{prefix}_{name}{{stage="{key}"}} {values[field]}' for key, values in snapshot.items()]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, metrics_format='json'):
+        """計測値をファイルに書き出す (metrics_format: json / prometheus)"""
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError(f"出力形式は {' / '.join(METRICS_FORMATS)} のいずれかです: {metrics_format}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json() if metrics_format == 'json' else self.to_prometheus())
+
+
+def active_record():
+    """このスレッドで実行中のステージの StageRecord (なければ None)"""
+    return getattr(_active, 'record', None)
+
+
+@contextmanager
+def activate(record):
+    """別スレッドの処理を、呼び出し元のステージ (record) の値として数える"""
+    previous = getattr(_active, 'record', None)
+    _active.record = record
+    try:
+        yield
+    finally:
+        _active.record = previous
+
+
+def note_html(html, cached=False):
+    """取得したHTML (cached=True はキャッシュから) を実行中のステージに数える"""
+    record = active_record()
+    if record is not None:
+        record.add_html(html, cached)
+
+
+def note_timeout():
+    record = active_record()
+    if record is not None:
+        record.timeout = True
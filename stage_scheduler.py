@@ -0,0 +1,197 @@
+# stage_scheduler.py
+# 検索ステージの実行順を、ステージごとの所要時間と発見率の見積もりから決める
+# HP → 概要1 → 概要2 と Yahoo(ダイレクト) → Yahoo(一覧) はそれぞれ前のステージの結果を使うため、並べ替えは2つの系列の単位で行う
+# 見積もりは実行中の計測値 (stage_metrics.py) で更新し、ファイルに保存して次回の実行の初期値にする
+import json
+import os
+import tempfile
+import threading
+import time
+from stage_metrics import StageMetrics
+
+try:
+    import fcntl # 保存時のファイルロック (Windows にはないため、ロックせずに合算する)
+except ImportError:
+    fcntl = None
+
+SCHEDULE_POLICIES = ('fixed', 'accuracy', 'speed')
+SCHEDULE_POLICY_LABELS = {
+    'fixed': '従来どおり (HP → Yahoo)',
+    'accuracy': '精度優先 (全ステージを実行し、順番のみ調整)',
+    'speed': '速度優先 (発見率の低いステージを省略)',
+}
+DEFAULT_SCHEDULE_POLICY = 'accuracy'
+
+HP_CHAIN = ('HP', '概要1', '概要2')
+YAHOO_CHAIN = ('Yahoo(ダイレクト)', 'Yahoo(一覧)')
+SKIPPABLE_STAGES = ('概要1', '概要2', 'Yahoo(ダイレクト)', 'Yahoo(一覧)') # HPトップは後続のステージがリンクを使うため省略しない
+
+# 見積もりの初期値: ステージ名: (所要時間[秒], 発見率, 前のステージで見つからなかった時にこのステージを実行する割合)
+DEFAULT_ESTIMATES = {
+    'HP': (3.0, 0.4, 1.0),
+    '概要1': (3.0, 0.5, 0.8),
+    '概要2': (4.0, 0.2, 0.5),
+    'Yahoo(ダイレクト)': (2.0, 0.4, 1.0),
+    'Yahoo(一覧)': (3.0, 0.3, 1.0),
+}
+PRIOR_WEIGHT = 5 # 初期値を何回分の実測とみなすか
+MAX_SAVED_COUNT = 200 # 保存済みの実測はステージごとに最大この回数分として読み込む (今回の実行の傾向に追従しやすくする)
+ACCURACY_REORDER_MARGIN = 2.0 # 精度優先: Yahoo系列の1件あたりの期待時間がHP系列のこの分の1未満の場合のみYahooを先にする
+SPEED_MIN_HIT_RATE = 0.05 # 速度優先: 発見率がこれ未満のステージは省略する
+MIN_SAMPLES_TO_SKIP = 20 # 省略の判断に必要な実測回数
+EXPLORE_INTERVAL = 20 # 速度優先でも、この件数に1件は省略せずに実行する (省略したステージの見積もりを更新するため)
+
+
+class StagePlan:
+    """1件分のステージの実行計画 (order: 系列名 'HP' / 'Yahoo' の実行順, skip: 省略するステージ名)"""
+    __slots__ = ('order', 'skip')
+
+    def __init__(self, order=('HP', 'Yahoo'), skip=frozenset()):
+        self.order = order
+        self.skip = skip
+
+
+DEFAULT_PLAN = StagePlan()
+
+
+def load_stage_estimates(path):
+    """保存済みの実測値 {ステージ名: (回数, 発見回数, 所要時間の合計)} (ファイルがない・読めない場合は空)"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            stages = json.load(f).get('stages', {})
+        return {stage: (float(values['count']), float(values['found']), float(values['seconds']))
+                for stage, values in stages.items() if stage in DEFAULT_ESTIMATES}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return {}
+
+
+def _recent_totals(totals):
+    """保存済みの実測値を、ステージごとに最大 MAX_SAVED_COUNT 回分に縮める"""
+    scaled = {}
+    for stage, (count, found, seconds) in totals.items():
+        scale = min(1.0, MAX_SAVED_COUNT / count) if count else 0.0
+        scaled[stage] = (count * scale, found * scale, seconds * scale)
+    return scaled
+
+
+class StageScheduler:
+    """ステージごとの所要時間・発見率の見積もりから、1件ごとに系列の実行順と省略するステージを決める (スレッド間で共有する)
+    stage_metrics は今回の実行の計測値 (scraper_engine に渡すものと同じ StageMetrics)
+    estimates_path を渡すと、前回までの実測値を読み込み、save() で今回の分を加えて保存する
+    (キューのワーカーなど複数のプロセスが同じファイルに保存するため、保存時にファイルを読み直して今回の分だけを加える)"""
+    def __init__(self, policy=DEFAULT_SCHEDULE_POLICY, stage_metrics=None, estimates_path=None):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"実行順の方針は {' / '.join(SCHEDULE_POLICIES)} のいずれかです: {policy}")
+        self.policy = policy
+        self.stage_metrics = stage_metrics or StageMetrics()
+        self.estimates_path = estimates_path
+        self.reordered = 0 # Yahoo系列を先に実行した件数
+        self.skipped = 0 # ステージを省略した件数
+        self._planned = 0
+        self._lock = threading.Lock()
+        self._saved = _recent_totals(load_stage_estimates(estimates_path))
+        self._persisted = {} # save() でファイルに加えた今回の計測値
+
+    def combined_totals(self):
+        """保存済みの実測値と今回の計測値の合計 {ステージ名: (回数, 発見回数, 所要時間の合計)}"""
+        current = self.stage_metrics.totals()
+        combined = {}
+        for stage in DEFAULT_ESTIMATES:
+            saved_count, saved_found, saved_seconds = self._saved.get(stage, (0, 0, 0.0))
+            count, found, seconds = current.get(stage, (0, 0, 0.0))
+            combined[stage] = (saved_count + count, saved_found + found, saved_seconds + seconds)
+        return combined
+
+    def estimates(self):
+        """ステージごとの見積もり {ステージ名: (所要時間[秒], 発見率, 実行する割合, 実測回数)} (初期値を PRIOR_WEIGHT 回分として混ぜる)"""
+        totals = self.combined_totals()
+        result, previous = {}, None
+        for stage, (prior_seconds, prior_hit_rate, prior_reach) in DEFAULT_ESTIMATES.items():
+            count, found, seconds = totals[stage]
+            reach = prior_reach
+            if previous is not None:
+                previous_count, previous_found, _ = totals[previous]
+                reach = (count + prior_reach * PRIOR_WEIGHT) / (max(previous_count - previous_found, count) + PRIOR_WEIGHT)
+            result[stage] = ((seconds + prior_seconds * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT),
+                             (found + prior_hit_rate * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT),
+                             min(reach, 1.0), count)
+            previous = None if stage in (HP_CHAIN[-1], YAHOO_CHAIN[-1]) else stage
+        return result
+
+    @staticmethod
+    def chain_estimate(stages, estimates, skip=frozenset()):
+        """系列の (期待所要時間[秒], 番号が見つかる確率)。各ステージは前のステージで見つからなかった場合にのみ実行する"""
+        expected_seconds, probability, arrive = 0.0, 0.0, 1.0
+        for position, stage in enumerate(stages):
+            if stage in skip:
+                continue # 概要1 を省略する場合は 概要2 も skip に含める
+            seconds, hit_rate, reach, _ = estimates[stage]
+            if position:
+                arrive *= reach
+            expected_seconds += arrive * seconds
+            probability += arrive * hit_rate
+            arrive *= 1 - hit_rate
+        return expected_seconds, probability
+
+    def plan(self, has_hp=True, has_yahoo=True):
+        """1件分の StagePlan (HP / 屋号+住所 のない系列は呼び出し元で飛ばす)"""
+        if self.policy == 'fixed':
+            return DEFAULT_PLAN
+        estimates = self.estimates()
+        with self._lock:
+            self._planned += 1
+            explore = self._planned % EXPLORE_INTERVAL == 0
+        skip = frozenset()
+        if self.policy == 'speed' and not explore:
+            skip = frozenset(stage for stage in SKIPPABLE_STAGES
+                             if estimates[stage][3] >= MIN_SAMPLES_TO_SKIP and estimates[stage][1] < SPEED_MIN_HIT_RATE)
+            if '概要1' in skip:
+                skip |= {'概要2'}
+        order = ('HP', 'Yahoo')
+        if has_hp and has_yahoo:
+            hp_seconds, hp_probability = self.chain_estimate(HP_CHAIN, estimates, skip)
+            yahoo_seconds, yahoo_probability = self.chain_estimate(YAHOO_CHAIN, estimates, skip)
+            margin = ACCURACY_REORDER_MARGIN if self.policy == 'accuracy' else 1.0
+            # 番号1件あたりの期待時間 (所要時間 / 発見確率) が短い系列を先にする
+            if yahoo_probability and (not hp_probability or
+                                      yahoo_seconds / yahoo_probability * margin < hp_seconds / hp_probability):
+                order = ('Yahoo', 'HP')
+        with self._lock:
+            self.reordered += order[0] == 'Yahoo'
+            self.skipped += bool(skip)
+        return StagePlan(order, skip)
+
+    def summary(self):
+        """見積もりの要約 (ログ表示用)"""
+        return " / ".join(f"{stage} {seconds:.1f}秒・{hit_rate:.0%}" for stage, (seconds, hit_rate, _, _) in self.estimates().items())
+
+    def save(self):
+        """estimates_path の実測値を読み直し、前回の save() 以降の今回の計測値を加えて書き出す (estimates_path がなければ何もしない)
+        読み直しから書き出しまではファイルロックで他のプロセスの保存と排他にする"""
+        if not self.estimates_path:
+            return
+        current = self.stage_metrics.totals()
+        with open(f"{self.estimates_path}.lock", 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX) # ファイルを閉じると解放される
+            saved = _recent_totals(load_stage_estimates(self.estimates_path))
+            stages = {}
+            for stage in DEFAULT_ESTIMATES:
+                saved_count, saved_found, saved_seconds = saved.get(stage, (0, 0, 0.0))
+                count, found, seconds = current.get(stage, (0, 0, 0.0))
+                persisted_count, persisted_found, persisted_seconds = self._persisted.get(stage, (0, 0, 0.0))
+                stages[stage] = {'count': round(saved_count + count - persisted_count, 3), 'found': round(saved_found + found - persisted_found, 3),
+                                 'seconds': round(saved_seconds + seconds - persisted_seconds, 3)}
+            # 一時ファイルはプロセスごとに別の名前にする (同じディレクトリに作り、os.replace で置き換える)
+            descriptor, temporary_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.estimates_path)}.",
+                                                          suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.estimates_path)))
+            try:
+                with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                    json.dump({'updated_at': round(time.time(), 3), 'stages': stages}, f, ensure_ascii=False, indent=2)
+                os.replace(temporary_path, self.estimates_path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+        self._persisted = current
@@ -0,0 +1,138 @@
+# streaming_io.py
+# 大きなファイル用のストリーミング入出力
+# 入力は一定行数ずつ読み込み、結果は処理が終わった分から順に書き出す (ファイル全体をメモリに載せない)
+# 出力形式は拡張子で決める: .csv / .parquet / .xlsx (openpyxl の write_only モード)
+import codecs
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_CHUNK_SIZE = 2000
+ROW_NUMBER_COLUMN = '行番号' # 入力ファイルのデータ行の番号 (0始まり, 見出し行を除く)
+_DETECT_BLOCK_SIZE = 1024 * 1024
+
+
+def detect_csv_encoding(path, encodings=('utf-8-sig', 'cp932')):
+    """CSVの文字コードをファイル全体を少しずつ読んで判定する (読み込めなかった場合は最後の候補)"""
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as f:
+                while block := f.read(_DETECT_BLOCK_SIZE):
+                    decoder.decode(block)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return encodings[-1]
+
+
+def iter_input_chunks(path, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """CSV / XLSX を chunk_size 行ずつの DataFrame (全列 str, 列名は前後の空白を除去) で返す
+    columns を指定した場合はその列だけを読み込む。インデックスはファイル全体での行番号になる"""
+    wanted = set(columns) if columns else None
+    lower_path = path.lower()
+    if lower_path.endswith('.csv'):
+        usecols = (lambda column: column.strip() in wanted) if wanted else None
+        reader = pd.read_csv(path, dtype=str, encoding=detect_csv_encoding(path), usecols=usecols, chunksize=chunk_size)
+        with reader:
+            for chunk in reader:
+                chunk.columns = chunk.columns.str.strip()
+                yield chunk
+    elif lower_path.endswith('.xlsx'):
+        yield from _iter_xlsx_chunks(path, wanted, chunk_size)
+    else:
+        raise ValueError("ストリーミング処理で読み込めるのは CSV / XLSX ファイルのみです。")
+
+
+def _iter_xlsx_chunks(path, wanted, chunk_size):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        positions = [i for i, name in enumerate(header) if wanted is None or name in wanted]
+        columns = [header[i] for i in positions]
+        start, records = 0, []
+        for values in rows:
+            records.append([_cell_text(values[i]) if i < len(values) else None for i in positions])
+            if len(records) >= chunk_size:
+                yield pd.DataFrame(records, columns=columns, index=pd.RangeIndex(start, start + len(records)))
+                start, records = start + len(records), []
+        if records:
+            yield pd.DataFrame(records, columns=columns, index=pd.RangeIndex(start, start + len(records)))
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    return None if value is None else str(value)
+
+
+# --- ★★★ 出力 (追記していく形式) ★★★ ---
+class CsvResultWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._header_written = False
+
+    def write(self, df):
+        df.to_csv(self._file, header=not self._header_written, index=False)
+        self._header_written = True
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """全列を文字列として書き出す (列構成は最初のチャンクで決まる)"""
+    def __init__(self, path):
+        if pq is None:
+            raise ValueError("Parquet形式で出力するには pyarrow が必要です。")
+        self._path = path
+        self._writer = None
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df.astype(object).where(df.notna(), None), preserve_index=False,
+                                     schema=pa.schema([(str(column), pa.string()) for column in df.columns]))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class XlsxResultWriter:
+    """openpyxl の write_only モードで1行ずつ書き出す (メモリ使用量は行数によらずほぼ一定)"""
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self._path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet('Sheet1')
+        self._header_written = False
+
+    def write(self, df):
+        if not self._header_written:
+            self._sheet.append([str(column) for column in df.columns])
+            self._header_written = True
+        for values in df.itertuples(index=False, name=None):
+            self._sheet.append([None if pd.isna(value) else value for value in values])
+
+    def close(self):
+        self._workbook.save(self._path)
+
+
+RESULT_WRITERS = {'.csv': CsvResultWriter, '.parquet': ParquetResultWriter, '.xlsx': XlsxResultWriter}
+
+
+def open_result_writer(path):
+    """出力先の拡張子に応じたライターを返す"""
+    for extension, writer_class in RESULT_WRITERS.items():
+        if path.lower().endswith(extension):
+            return writer_class(path)
+    raise ValueError(f"サポートされていない出力形式です ({', '.join(RESULT_WRITERS)} のいずれかを指定してください): {path}")
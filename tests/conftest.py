@@ -0,0 +1,6 @@
+# conftest.py
+# tests/ からリポジトリ直下のモジュール (scraper_engine.py 等) を import できるようにする
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
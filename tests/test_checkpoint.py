@@ -0,0 +1,73 @@
+# test_checkpoint.py
+# チェックポイント (checkpoint.RunCheckpoint): タイムアウト・エラーは処理済みにせず、再開時にもう一度処理した結果で置き換える
+import time
+import pytest
+from checkpoint import RunCheckpoint, is_final_value
+from job_queue import LEASE_FAILED_VALUE
+from time_budget import ROW_TIMEOUT_VALUE
+
+FILE_HASH = 'file1'
+ROWS = [0, 1, 2]
+
+
+@pytest.fixture
+def checkpoint_path(tmp_path):
+    return str(tmp_path / 'checkpoint.sqlite3')
+
+
+@pytest.fixture
+def checkpoint(checkpoint_path):
+    checkpoint = RunCheckpoint(FILE_HASH, checkpoint_path)
+    yield checkpoint
+    checkpoint.close()
+
+
+@pytest.mark.parametrize('value, final', [
+    ('0312345678', True), ('N/A', True), ('', True),
+    (ROW_TIMEOUT_VALUE, False), ('エラー(HP)', False), (LEASE_FAILED_VALUE, False),
+])
+def test_is_final_value(value, final):
+    assert is_final_value(value) is final
+
+
+def test_timeout_is_not_resumed_and_is_replaced_by_a_real_result(checkpoint, checkpoint_path):
+    checkpoint.record(0, '0312345678')
+    checkpoint.record(1, ROW_TIMEOUT_VALUE)
+    checkpoint.record(2, 'エラー(HP)')
+    assert checkpoint.count() == 1
+    assert checkpoint.load(ROWS) == {0: '0312345678'} # 再開時は 1, 2 行目をもう一度処理する
+
+    checkpoint.record(1, '0612345678')
+    resumed = RunCheckpoint(FILE_HASH, checkpoint_path)
+    try:
+        assert resumed.count() == 2
+        assert resumed.load(ROWS) == {0: '0312345678', 1: '0612345678'}
+    finally:
+        resumed.close()
+
+
+def test_recorded_timeout_from_an_older_run_is_overwritten(checkpoint):
+    # 以前の版は タイムアウト も記録していた
+    with checkpoint._conn:
+        checkpoint._conn.execute("INSERT INTO results VALUES (?, ?, ?, ?)", (FILE_HASH, '1', ROW_TIMEOUT_VALUE, time.time()))
+    assert checkpoint.count() == 0
+    checkpoint.record(1, '0612345678')
+    assert checkpoint.load(ROWS) == {1: '0612345678'}
+
+
+def test_final_result_is_kept(checkpoint):
+    checkpoint.record(0, '0312345678')
+    checkpoint.record(0, '0612345678')
+    checkpoint.record(0, ROW_TIMEOUT_VALUE)
+    assert checkpoint.load(ROWS) == {0: '0312345678'}
+
+
+def test_clear_and_other_files(checkpoint, checkpoint_path):
+    checkpoint.record(0, '0312345678')
+    other = RunCheckpoint('file2', checkpoint_path)
+    try:
+        assert other.count() == 0
+        checkpoint.clear()
+        assert checkpoint.load(ROWS) == {}
+    finally:
+        other.close()
@@ -0,0 +1,122 @@
+# test_job_queue.py
+# ジョブキュー (job_queue.py) のリース: 借りる・期限切れで割り当て直す・延長する・MAX_ATTEMPTS 回で失敗にする・続きから再開する
+import queue
+import time
+import pytest
+from job_queue import LEASE_FAILED_VALUE, MAX_ATTEMPTS, LeasedUnitSource, RedisJobQueue, SqliteJobQueue
+from time_budget import Deadline
+
+JOB = 'job1'
+UNITS = [((0,), 'https://a.example.jp/', '株式会社A', '東京都千代田区1-1'),
+         ((1, 2), 'https://b.example.jp/', '株式会社B', '大阪府大阪市北区2-2')]
+SHORT_LEASE = 0.2
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def job_queue(request, tmp_path):
+    if request.param == 'sqlite':
+        job_queue = SqliteJobQueue(str(tmp_path / 'queue.sqlite3'))
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa') # Lua スクリプトの実行に必要
+        job_queue = RedisJobQueue(client=fakeredis.FakeRedis(decode_responses=True))
+    yield job_queue
+    job_queue.close()
+
+
+def wait_for_expiry():
+    time.sleep(SHORT_LEASE * 1.5)
+
+
+def test_claim_hands_out_each_unit_once(job_queue):
+    job_queue.enqueue(JOB, UNITS)
+    first = job_queue.claim(JOB, 'w1')
+    second = job_queue.claim(JOB, 'w2')
+    assert (first[0], second[0]) == (0, 1)
+    assert first[1].company_name == '株式会社A'
+    assert second[1].row_indices == ('1', '2') # 行インデックスは文字列で戻る
+    assert job_queue.claim(JOB, 'w3') is None
+    progress = job_queue.progress(JOB)
+    assert (progress.total, progress.pending, progress.leased, progress.done) == (2, 0, 2, 0)
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(job_queue):
+    job_queue.enqueue(JOB, UNITS[:1])
+    unit_id, _ = job_queue.claim(JOB, 'w1', SHORT_LEASE)
+    assert job_queue.claim(JOB, 'w2', SHORT_LEASE) is None
+    wait_for_expiry()
+    assert job_queue.progress(JOB).pending == 1
+    reclaimed = job_queue.claim(JOB, 'w2', SHORT_LEASE)
+    assert reclaimed[0] == unit_id
+    assert job_queue.complete(JOB, 'w2', unit_id, '03-1234-5678')
+    assert not job_queue.complete(JOB, 'w1', unit_id, '06-1234-5678') # 期限切れ後に遅れて届いた結果は記録しない
+    _, results = job_queue.results_after(JOB)
+    assert [value for _, value in results] == ['03-1234-5678']
+
+
+def test_extend_keeps_the_lease(job_queue):
+    job_queue.enqueue(JOB, UNITS[:1])
+    unit_id, _ = job_queue.claim(JOB, 'w1', SHORT_LEASE)
+    job_queue.extend(JOB, 'w2', [unit_id], 60) # 借りていないワーカーは延長できない
+    job_queue.extend(JOB, 'w1', [unit_id], 60)
+    wait_for_expiry()
+    assert job_queue.claim(JOB, 'w2', SHORT_LEASE) is None
+    assert job_queue.progress(JOB).leased == 1
+
+
+def test_heartbeat_extends_held_units(job_queue):
+    job_queue.enqueue(JOB, UNITS[:1])
+    source = LeasedUnitSource(job_queue, JOB, 'w1', lease_seconds=SHORT_LEASE, poll_interval=0.05)
+    try:
+        unit = source.get_nowait()
+        time.sleep(SHORT_LEASE * 3)
+        assert job_queue.claim(JOB, 'w2', SHORT_LEASE) is None
+        source.complete_row(unit.row_indices[0], '03-1234-5678')
+        assert source.completed == 1
+        assert job_queue.progress(JOB).done == 1
+    finally:
+        source.close()
+
+
+def test_unit_fails_after_max_attempts(job_queue):
+    job_queue.enqueue(JOB, UNITS[:1])
+    for _ in range(MAX_ATTEMPTS):
+        assert job_queue.claim(JOB, 'w1', SHORT_LEASE) is not None
+        wait_for_expiry()
+    assert job_queue.claim(JOB, 'w1', SHORT_LEASE) is None
+    _, results = job_queue.results_after(JOB)
+    assert [value for _, value in results] == [LEASE_FAILED_VALUE]
+    assert job_queue.progress(JOB).done == 1
+
+
+def test_release_does_not_count_as_an_attempt(job_queue):
+    job_queue.enqueue(JOB, UNITS[:1])
+    for _ in range(MAX_ATTEMPTS + 1):
+        unit_id, _ = job_queue.claim(JOB, 'w1', SHORT_LEASE)
+        job_queue.release(JOB, 'w1', unit_id)
+    assert job_queue.claim(JOB, 'w2', SHORT_LEASE)[0] == unit_id
+
+
+def test_resume_keeps_results_until_clear(job_queue):
+    job_queue.enqueue(JOB, UNITS)
+    unit_id, _ = job_queue.claim(JOB, 'w1')
+    job_queue.complete(JOB, 'w1', unit_id, '03-1234-5678')
+    job_queue.enqueue(JOB, UNITS) # 同じジョブの再実行は続きから
+    assert job_queue.progress(JOB).done == 1
+    assert job_queue.claim(JOB, 'w1')[0] == 1
+    job_queue.clear(JOB)
+    job_queue.enqueue(JOB, UNITS)
+    progress = job_queue.progress(JOB)
+    assert (progress.total, progress.pending, progress.done) == (2, 2, 0)
+    assert job_queue.results_after(JOB) == (0, [])
+
+
+def test_source_stops_claiming_after_the_deadline(job_queue):
+    job_queue.enqueue(JOB, UNITS)
+    source = LeasedUnitSource(job_queue, JOB, 'w1', deadline=Deadline(time.monotonic() - 1)) # 締め切りを過ぎている
+    try:
+        with pytest.raises(queue.Empty):
+            source.get_nowait()
+    finally:
+        source.close()
+    assert job_queue.progress(JOB).pending == 2
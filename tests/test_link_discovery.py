@@ -0,0 +1,42 @@
+# test_link_discovery.py
+# 概要ページの候補リンク (link_discovery.py): 同じサイトのリンクだけを候補にする
+import pytest
+from link_discovery import is_same_site, rank_link_candidates, resolve_overview_link
+
+SITE = 'https://example.co.jp/'
+
+
+@pytest.mark.parametrize('href, expected', [
+    ('/company/', 'https://example.co.jp/company/'),
+    ('about.html', 'https://example.co.jp/about.html'),
+    ('https://www.example.co.jp/company/', 'https://www.example.co.jp/company/'), # www. の有無は同じサイト
+    ('http://example.co.jp/company/', 'http://example.co.jp/company/'),
+    ('https://recruit.example.co.jp/', 'https://recruit.example.co.jp/'), # サブドメイン
+    ('https://EXAMPLE.co.jp:8443/a', 'https://EXAMPLE.co.jp:8443/a'),
+    ('https://evil.example/?r=example.co.jp', None), # クエリにドメインを含む別サイト
+    ('https://example.co.jp.attacker.net/', None),
+    ('https://attacker.net/example.co.jp/', None),
+    ('https://notexample.co.jp/', None),
+    ('//evil.example/company', None),
+    ('ftp://example.co.jp/company', None),
+    ('mailto:info@example.co.jp', None),
+    ('tel:0312345678', None),
+    ('javascript:void(0)', None),
+    ('#top', None),
+    ('', None),
+])
+def test_resolve_overview_link_keeps_same_site_links(href, expected):
+    assert resolve_overview_link(href, SITE, SITE) == expected
+
+
+def test_www_site_accepts_bare_host():
+    assert is_same_site('https://example.co.jp/company/', 'https://www.example.co.jp/')
+    assert not is_same_site('https://example.co.jp/company/', 'https://shop.example.co.jp/') # 親ドメインは別サイト
+    assert not is_same_site('https://example.co.jp/', 'example.co.jp') # スキームのないURL
+
+
+def test_rank_link_candidates_drops_off_site_links():
+    links = [('https://example.co.jp.attacker.net/company/', '会社概要', SITE),
+             ('https://evil.example/?r=example.co.jp', '会社概要', SITE),
+             ('/company/', '会社概要', SITE)]
+    assert rank_link_candidates(links, SITE, ['会社概要'], ['company']) == ['https://example.co.jp/company/']
@@ -0,0 +1,101 @@
+# test_phone_extractor.py
+# 電話番号抽出エンジン (phone_extractor.py): 番号計画上の桁数・市外局番の前方一致・全角/区切りの表記ゆれ・従来の実装との一致
+import os
+import random
+import sys
+import pytest
+from phone_extractor import (HP_TRANSLATION_TABLE, YAHOO_TRANSLATION_TABLE, AreaCodeIndex, extract_phone_from_blocks,
+                             extract_phone_from_text, is_valid_phone)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from bench_phone_extraction import legacy_extract, load_area_codes, make_text
+
+
+@pytest.fixture(scope='module')
+def sorted_area_codes():
+    return load_area_codes() # 市外局番リスト.csv (長い順)
+
+
+@pytest.fixture(scope='module')
+def area_code_index(sorted_area_codes):
+    return AreaCodeIndex(sorted_area_codes)
+
+
+@pytest.mark.parametrize('phone_digits, valid', [
+    ('0312345678', True), # 03 + 8桁 = 10桁
+    ('0476123456', True),
+    ('031234567', False), # 9桁
+    ('03123456789', False), # 固定電話の11桁
+    ('0001234567', False), # 市外局番にない
+    ('0120123456', False), # フリーダイヤル
+    ('08001234567', False),
+])
+def test_geographic_numbers_need_ten_digits_and_a_known_area_code(phone_digits, valid, area_code_index):
+    assert is_valid_phone(phone_digits, area_code_index) is valid
+
+
+@pytest.mark.parametrize('phone_digits, valid', [
+    ('09012345678', True),
+    ('08012345678', True),
+    ('07012345678', True),
+    ('05012345678', True),
+    ('0901234567', False), # 10桁 (090 は市外局番として扱わない)
+    ('090123456789', False),
+    ('0501234567', False),
+])
+def test_mobile_and_ip_numbers_need_eleven_digits(phone_digits, valid, area_code_index):
+    assert is_valid_phone(phone_digits, area_code_index) is valid
+
+
+def test_area_code_match_is_longest_prefix(area_code_index):
+    assert area_code_index.match('0476123456') == '0476' # 047 も市外局番
+    assert area_code_index.match('0471123456') == '047'
+    assert area_code_index.match('0312345678') == '03'
+    assert area_code_index.match('0001234567') is None
+
+
+def test_area_code_index_from_codes():
+    index = AreaCodeIndex(['03', ' 047 ', '0476', ''])
+    assert len(index) == 3
+    assert index.codes() == ['03', '047', '0476']
+    assert index.match('0476') == '0476'
+    assert index.match('047') == '047'
+    assert index.match('04') is None
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('TEL：０３－１２３４－５６７８', '0312345678'), # 全角の数字・記号
+    ('電話番号 03‐1234‐5678', '0312345678'), # U+2010 のハイフン
+    ('(03)1234-5678', '0312345678'),
+    ('（０３）１２３４－５６７８', '0312345678'),
+    ('03 1234 5678', '0312345678'),
+    ('代表0312345678まで', '0312345678'), # 区切りなし
+    ('03-1234-5678 / 携帯 090-1234-5678', '09012345678'), # 携帯番号を優先する
+    ('フリーダイヤル 0120-123-456 / TEL 0476-12-3456', '0476123456'),
+    ('03-1234-567', None), # 9桁の固定電話
+    ('090-1234-567', None), # 10桁の携帯番号
+    ('TEL 012345678901', None),
+])
+def test_extract_phone_from_text_variants(text, expected, area_code_index):
+    assert extract_phone_from_text(text, area_code_index) == expected
+
+
+def test_yahoo_table_treats_s_as_separator(area_code_index):
+    assert extract_phone_from_text('03S1234S5678', area_code_index, YAHOO_TRANSLATION_TABLE) == '0312345678'
+    assert extract_phone_from_text('03S1234S5678', area_code_index, HP_TRANSLATION_TABLE) is None
+    assert extract_phone_from_blocks(['住所のみ', '電話 03S1234S5678'], area_code_index) == '0312345678'
+
+
+def test_numbering_plan_rejects_what_the_legacy_extractor_accepted(sorted_area_codes, area_code_index):
+    text = '代表 03123456789'
+    assert legacy_extract(text, sorted_area_codes, numbering_plan=False) == '03123456789'
+    assert extract_phone_from_text(text, area_code_index) is None
+
+
+@pytest.mark.parametrize('yahoo, table', [(False, HP_TRANSLATION_TABLE), (True, YAHOO_TRANSLATION_TABLE)])
+def test_matches_legacy_extractor_on_corpus(yahoo, table, sorted_area_codes, area_code_index):
+    rng = random.Random(0)
+    texts = [make_text(rng, list(sorted_area_codes), rng.randint(5, 300)) for _ in range(500)]
+    results = [extract_phone_from_text(text, area_code_index, table) for text in texts]
+    assert results == [legacy_extract(text, sorted_area_codes, yahoo) for text in texts]
+    assert sum(map(bool, results)) > 100 # 番号を含むテキストが十分にある
@@ -0,0 +1,72 @@
+# test_time_budget.py
+# 行の予算 (time_budget.RowBudget) のステージへの配分と、実行全体の締め切り
+import math
+import pytest
+import time_budget
+from time_budget import STAGE_BUDGET_SHARES, Deadline, DeadlineExceeded, RowBudget
+
+ROW_SECONDS = 90
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time_budget.time, 'monotonic', clock)
+    return clock
+
+
+def use_whole_allocation(budget, stages, clock):
+    """各ステージが配分を使い切ったとして、ステージごとの配分 (秒) を返す"""
+    allocations = []
+    for stage in stages:
+        deadline = budget.stage(stage)
+        allocations.append(deadline.expires_at - clock.now)
+        clock.now = deadline.expires_at
+    return allocations
+
+
+def test_stage_shares_sum_to_one():
+    assert math.isclose(sum(STAGE_BUDGET_SHARES.values()), 1.0)
+
+
+def test_allocations_sum_to_the_row_budget(clock):
+    budget = RowBudget(ROW_SECONDS)
+    allocations = use_whole_allocation(budget, STAGE_BUDGET_SHARES, clock)
+    assert allocations == pytest.approx([ROW_SECONDS * share for share in STAGE_BUDGET_SHARES.values()])
+    assert math.isclose(sum(allocations), ROW_SECONDS)
+    with pytest.raises(DeadlineExceeded):
+        budget.stage('HP')
+
+
+def test_discarded_stages_are_given_to_the_remaining_ones(clock):
+    budget = RowBudget(ROW_SECONDS)
+    budget.discard(('概要1', '概要2'))
+    allocations = use_whole_allocation(budget, ('HP', 'Yahoo(ダイレクト)', 'Yahoo(一覧)'), clock)
+    assert allocations == pytest.approx([ROW_SECONDS * 0.25 / 0.6, ROW_SECONDS * 0.2 / 0.6, ROW_SECONDS * 0.15 / 0.6])
+    assert math.isclose(sum(allocations), ROW_SECONDS)
+
+
+def test_time_left_by_a_fast_stage_goes_to_later_stages(clock):
+    budget = RowBudget(ROW_SECONDS)
+    budget.stage('HP')
+    clock.now += 1 # HP は配分 (22.5秒) より早く終わった
+    assert budget.stage('概要1').expires_at - clock.now == pytest.approx((ROW_SECONDS - 1) * 0.25 / 0.75)
+
+
+def test_row_budget_does_not_outlive_the_run_deadline(clock):
+    budget = RowBudget(ROW_SECONDS, run_deadline=Deadline.after(10))
+    assert budget.deadline.remaining() == 10
+    assert RowBudget(ROW_SECONDS, run_deadline=Deadline.after(0)).deadline.remaining() == ROW_SECONDS # 0 は締め切りなし
+
+
+def test_unlimited_budget_has_no_stage_deadline():
+    budget = RowBudget(0)
+    assert budget.stage('HP').expires_at is None
@@ -0,0 +1,68 @@
+# test_work_units.py
+# ステージ結果の共有 (work_units.SharedStageResults): 時間切れの結果は共有しない・処理中の結果を待つのは締め切りまで
+import threading
+import time
+import pytest
+from time_budget import Deadline, DeadlineExceeded
+from work_units import SharedStageResults, StageResult
+
+KEY = ('HP', 'https://a.example.jp/', frozenset())
+
+
+def blocking_resolver(started, release, result):
+    def resolve():
+        started.set()
+        release.wait(5)
+        return result
+    return resolve
+
+
+def test_finished_result_is_reused():
+    results = SharedStageResults()
+    results.run(KEY, lambda: StageResult('0312345678', 3, False))
+    result, reused = results.run(KEY, lambda: pytest.fail('再利用されていない'))
+    assert reused and result.phone == '0312345678'
+    assert (results.reused, results.saved_fetches) == (1, 3)
+
+
+def test_timed_out_result_is_not_shared():
+    results = SharedStageResults()
+    partial, reused = results.run(KEY, lambda: StageResult(None, 2, False, timed_out=True))
+    assert not reused and partial.timed_out
+    result, reused = results.run(KEY, lambda: StageResult('0312345678', 1, False))
+    assert not reused and result.phone == '0312345678' # もう一度実行した
+    assert results.run(KEY, lambda: pytest.fail('再利用されていない'))[1]
+
+
+def test_wait_for_running_result_is_bounded_by_the_deadline():
+    results = SharedStageResults()
+    started, release = threading.Event(), threading.Event()
+    owner = threading.Thread(target=results.run, args=(KEY, blocking_resolver(started, release, StageResult('0312345678', 1, False))))
+    owner.start()
+    try:
+        assert started.wait(5)
+        begin = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            results.run(KEY, lambda: pytest.fail('処理中のキーを二重に実行した'), Deadline.after(0.2))
+        assert 0.15 <= time.monotonic() - begin < 2
+    finally:
+        release.set()
+        owner.join()
+    result, reused = results.run(KEY, lambda: pytest.fail('再利用されていない'), Deadline.after(0.2))
+    assert reused and result.phone == '0312345678'
+
+
+def test_waiter_runs_the_stage_itself_when_the_running_result_timed_out():
+    results = SharedStageResults()
+    started, release = threading.Event(), threading.Event()
+    owner = threading.Thread(target=results.run, args=(KEY, blocking_resolver(started, release, StageResult(None, 1, False, timed_out=True))))
+    owner.start()
+    waiter_result = []
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: waiter_result.append(results.run(KEY, lambda: StageResult('0312345678', 1, False), Deadline.after(5))))
+    waiter.start()
+    release.set()
+    owner.join()
+    waiter.join()
+    result, reused = waiter_result[0]
+    assert not reused and result.phone == '0312345678'
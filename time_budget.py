@@ -0,0 +1,91 @@
+# time_budget.py
+# 1行あたりの処理時間の上限 (行の予算) と、実行全体の締め切り
+# 行の予算は検索ステージに配分し、ステージが配分を使い切ったらそのステージを打ち切って次のステージに進む
+# 行の予算を使い切ったら残りのステージを実行せず、その行は「タイムアウト」として記録する
+import math
+import time
+
+DEFAULT_ROW_BUDGET_SECONDS = 90 # 1行 (作業単位) あたりの処理時間の上限 (0 / None で無制限)
+ROW_TIMEOUT_VALUE = 'タイムアウト'
+MIN_TIMEOUT_SECONDS = 1.0 # ページ読み込み・HTTP取得のタイムアウトに渡す最小秒数
+
+# ステージごとの配分の比率 (まだ実行していないステージの比率で、残り時間を分け合う)
+STAGE_BUDGET_SHARES = {
+    'HP': 0.25,
+    '概要1': 0.25,
+    '概要2': 0.15,
+    'Yahoo(ダイレクト)': 0.2,
+    'Yahoo(一覧)': 0.15,
+}
+
+
+class DeadlineExceeded(Exception):
+    """行の予算・ステージへの配分・実行全体の締め切りを超えた"""
+
+
+class Deadline:
+    """締め切り (time.monotonic() の値。None は無制限)"""
+    __slots__ = ('expires_at',)
+
+    def __init__(self, expires_at=None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds):
+        """今から seconds 秒後の締め切り (0 / None は無制限)"""
+        return cls(time.monotonic() + seconds if seconds else None)
+
+    def remaining(self):
+        """残り秒数 (無制限は math.inf)"""
+        return math.inf if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, step=''):
+        """締め切りを過ぎていれば DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(step)
+
+    def timeout(self, seconds):
+        """タイムアウトの秒数 (requests の (接続, 読み込み) のタプルも可) を残り時間までに縮める"""
+        remaining = max(self.remaining(), MIN_TIMEOUT_SECONDS)
+        if isinstance(seconds, tuple):
+            return tuple(min(value, remaining) for value in seconds)
+        return min(seconds, remaining)
+
+    def earliest(self, other):
+        """self と other の早い方"""
+        if other is None or other.expires_at is None:
+            return self
+        if self.expires_at is None or other.expires_at < self.expires_at:
+            return other
+        return self
+
+
+NO_DEADLINE = Deadline()
+
+
+class RowBudget:
+    """1行 (作業単位) の予算。stage() でステージごとの締め切りを配分する (ワーカーのスレッド内でのみ使う)
+    行の締め切りは実行全体の締め切り (run_deadline) を超えない"""
+    __slots__ = ('deadline', '_pending')
+
+    def __init__(self, seconds=DEFAULT_ROW_BUDGET_SECONDS, run_deadline=None):
+        self.deadline = Deadline.after(seconds).earliest(run_deadline)
+        self._pending = dict(STAGE_BUDGET_SHARES)
+
+    def stage(self, stage):
+        """ステージ stage の締め切り (残り時間を、まだ実行していないステージの比率で分ける)
+        行の予算を使い切っていれば DeadlineExceeded (残りのステージは実行しない)"""
+        self.deadline.check(stage)
+        share = self._pending.pop(stage, None)
+        remaining = self.deadline.remaining()
+        if share is None or remaining == math.inf:
+            return self.deadline
+        return Deadline(time.monotonic() + remaining * share / (share + sum(self._pending.values())))
+
+    def discard(self, stages):
+        """実行しなかったステージを配分から外す (残り時間を後のステージに回す)"""
+        for stage in stages:
+            self._pending.pop(stage, None)
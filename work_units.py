@@ -0,0 +1,103 @@
+# work_units.py
+# 同じHP / 同じ屋号+住所を持つ行の重複処理をなくす
+# HPと屋号+住所が両方同じ行は1件の作業単位にまとめて1回だけ処理し、結果を全ての行に書き込む
+# どちらか一方だけが同じ行は、ステージ(HP / Yahoo)の結果をワーカー間で共有する
+import math
+import re
+import threading
+import unicodedata
+from page_cache import normalize_url
+from time_budget import DeadlineExceeded
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_text_key(text):
+    """屋号・住所の比較用キー (全角/半角・大文字/小文字・空白の違いを無視する)"""
+    return _WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', text or '')).lower()
+
+
+def hp_unit_key(company_hp_url):
+    """HP単位のキー (HPのURLが無効なら None)"""
+    if not company_hp_url or not company_hp_url.startswith('http'):
+        return None
+    return normalize_url(company_hp_url)
+
+
+def yahoo_unit_key(company_name, address):
+    """屋号+住所単位のキー (どちらかが空なら None)"""
+    if not company_name or not address:
+        return None
+    return normalize_text_key(company_name), normalize_text_key(address)
+
+
+def group_work_units(jobs):
+    """1行ずつの RowJob (row_jobs.build_row_jobs) をHPキーと屋号+住所キーでまとめ、
+    複数行の作業単位 (RowJob) を出現順に返す (値は最初の行のものを使う)"""
+    units = {}
+    for job in jobs:
+        key = (hp_unit_key(job.company_hp_url), yahoo_unit_key(job.company_name, job.address))
+        unit = units.get(key)
+        if unit is None:
+            units[key] = (list(job.row_indices), job)
+        else:
+            unit[0].extend(job.row_indices)
+    return [job.with_rows(tuple(indices)) for indices, job in units.values()]
+
+
+class StageResult:
+    """1ステージ (HP → 概要1 → 概要2 / Yahoo検索) の結果"""
+    __slots__ = ('phone', 'fetch_count', 'used_browser', 'timed_out')
+
+    def __init__(self, phone, fetch_count, used_browser, timed_out=False):
+        self.phone = phone
+        self.fetch_count = fetch_count
+        self.used_browser = used_browser
+        self.timed_out = timed_out # 配分した時間を超えて打ち切ったステージがある (途中までの結果)
+
+
+class SharedStageResults:
+    """ステージの結果をキーごとにワーカー間で共有する (スレッドセーフ)
+    同じキーを別のワーカーが処理中の場合は、その完了を待って結果を再利用する
+    時間切れで打ち切った途中までの結果は保存しない (予算の多い行・次の行ではもう一度実行する)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._running = {}
+        self.reused = 0 # 結果を再利用した回数 (ステージ単位 + 重複行)
+        self.saved_fetches = 0 # 再利用によって省略したページ取得の回数
+
+    def run(self, key, resolve, deadline=None):
+        """key の結果があれば再利用し、なければ resolve() を実行して保存する。(StageResult, 再利用したか) を返す
+        処理中のワーカーの完了は deadline (time_budget.Deadline) まで待ち、過ぎたら DeadlineExceeded"""
+        while True:
+            with self._lock:
+                result = self._results.get(key)
+                if result is not None:
+                    self.reused += 1
+                    self.saved_fetches += result.fetch_count
+                    return result, True
+                done = self._running.get(key)
+                if done is None:
+                    done = self._running[key] = threading.Event()
+                    break
+            # 処理中のワーカーが失敗した・途中で打ち切った場合は、次のループで自分が処理する
+            remaining = deadline.remaining() if deadline else math.inf
+            if not done.wait(None if remaining == math.inf else remaining):
+                raise DeadlineExceeded(key[0])
+        try:
+            result = resolve()
+            if not result.timed_out:
+                with self._lock:
+                    self._results[key] = result
+            return result, False
+        finally:
+            with self._lock:
+                del self._running[key]
+            done.set()
+
+    def record_fan_out(self, row_count, fetch_count):
+        """1回の処理結果を row_count 行に書き込んだことを記録する"""
+        with self._lock:
+            self.reused += row_count - 1
+            self.saved_fetches += fetch_count * (row_count - 1)